@@ -2,10 +2,59 @@ import os
 import cv2
 import hashlib
 import imagehash
+import scipy.fftpack
 from PIL import Image
 from PIL.ExifTags import TAGS
 import numpy as np
 
+# Lato minimo dell'immagine decodificata per gli hash percettivi: pHash lavora su 32x32,
+# 256 px lasciano margine al ridimensionamento antialias senza decodificare foto da 24-50 MP
+HASH_DECODE_SIZE = 256
+
+_REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+# wHash su 64x64 (Haar): sufficiente per 8x8 bit e molto più economico della scala piena
+WHASH_SCALE = 64
+CASCADE_HASHES = ("ahash", "dhash", "phash", "whash")
+# Hash richiesti in un record del catalogo perché non serva ridecodificare l'immagine;
+# aHash/dHash/wHash si calcolano solo per le immagini delle coppie candidate (`get_cascade_hashes`)
+RECORD_HASHES = ("phash", "phash_dihedral")
+_CASCADE_FUNCS = {
+    "ahash": imagehash.average_hash,
+    "dhash": imagehash.dhash,
+    "whash": lambda image: imagehash.whash(image, image_scale=WHASH_SCALE),
+}
+
+# Gruppo diedrale del quadrato: per ogni variante (trasposizione, segno righe, segno colonne)
+# applicati al blocco DCT 8x8. Ribaltare l'immagine lungo un asse moltiplica il coefficiente
+# k-esimo della DCT per (-1)^k, trasporla traspone il blocco: le 8 varianti del pHash si
+# ottengono senza ridecodificare né ruotare l'immagine (nomi come `Image.Transpose`, rotazioni antiorarie).
+DIHEDRAL_VARIANTS = (
+    ("identity", False, False, False),
+    ("flip_h", False, False, True),
+    ("flip_v", False, True, False),
+    ("rot180", False, True, True),
+    ("transpose", True, False, False),
+    ("rot270", True, False, True),
+    ("rot90", True, True, False),
+    ("transverse", True, True, True),
+)
+
+# Orientamento EXIF (tag 274) -> trasformazione PIL che porta i pixel nell'orientamento visualizzato
+_EXIF_ORIENTATION = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
 class AnalyzerEngine:
     """
     Il cuore pulsante del programma: implementa i 4 livelli di analisi.
@@ -19,11 +68,98 @@ class AnalyzerEngine:
             return hashlib.md5(f.read(65536)).hexdigest()
 
     @staticmethod
-    def get_perceptual_data(path):
-        """Livello 1: pHash (Similitudine Strutturale)."""
-        # Basato sulla DCT, ignora compressione e piccoli ridimensionamenti [cite: 17, 31]
-        img = Image.open(path)
-        return imagehash.phash(img)
+    def load_hash_image(img, path, min_side=HASH_DECODE_SIZE):
+        """Decodifica ridotta in scala di grigi per gli hash percettivi.
+
+        `img` è l'immagine PIL già aperta (solo header letto). Per i JPEG si usa
+        `draft()`, che scala nel dominio DCT (1/2, 1/4, 1/8) senza decodificare
+        l'immagine intera; per gli altri formati OpenCV con `IMREAD_REDUCED_GRAYSCALE_*`.
+        """
+        width, height = img.size
+        if img.format == "JPEG":
+            img.draft("L", (min_side, min_side))
+            return img.convert("L")
+        for factor, flag in _REDUCED_FLAGS:
+            if min(width, height) // factor >= min_side:
+                # np.fromfile + imdecode: supporta anche i percorsi non ASCII su Windows
+                gray = cv2.imdecode(np.fromfile(path, dtype=np.uint8), flag)
+                if gray is not None:
+                    return Image.fromarray(gray)
+                break
+        # Immagini già piccole o formati non gestiti da OpenCV (GIF, ...): decodifica PIL
+        return img.convert("L")
+
+    @staticmethod
+    def load_oriented_hash_image(img, path, min_side=HASH_DECODE_SIZE):
+        """Come `load_hash_image`, ma nell'orientamento visualizzato (tag EXIF Orientation).
+
+        La rotazione si applica all'immagine già ridotta, quindi costa poco anche per
+        le foto da smartphone salvate in verticale con Orientation=6/8.
+        """
+        small = AnalyzerEngine.load_hash_image(img, path, min_side)
+        try:
+            orientation = img.getexif().get(0x0112)
+        except Exception:
+            orientation = None
+        method = _EXIF_ORIENTATION.get(orientation)
+        return small.transpose(method) if method is not None else small
+
+    @staticmethod
+    def get_cascade_hashes(path, names=("ahash", "dhash", "whash")):
+        """Hash di verifica della cascata (esadecimali) dalla stessa decodifica ridotta del pHash."""
+        with Image.open(path) as img:
+            small = AnalyzerEngine.load_oriented_hash_image(img, path)
+            return {name: str(_CASCADE_FUNCS[name](small)) for name in names}
+
+    @staticmethod
+    def get_dihedral_phashes(image, hash_size=8, highfreq_factor=4):
+        """Le 8 varianti del pHash (rotazioni di 90° e ribaltamenti) da una sola DCT.
+
+        La variante 0 coincide con `imagehash.phash`; l'ordine segue `DIHEDRAL_VARIANTS`.
+        Restituisce stringhe esadecimali come `str(ImageHash)`.
+        """
+        img_size = hash_size * highfreq_factor
+        pixels = np.asarray(image.convert("L").resize((img_size, img_size), Image.Resampling.LANCZOS))
+        dct = scipy.fftpack.dct(scipy.fftpack.dct(pixels, axis=0), axis=1)
+        low = dct[:hash_size, :hash_size]
+        signs = np.where(np.arange(hash_size) % 2, -1.0, 1.0)
+        weights = 1 << np.arange(hash_size * hash_size - 1, -1, -1, dtype=np.uint64)
+        variants = []
+        for _, transpose, flip_rows, flip_cols in DIHEDRAL_VARIANTS:
+            block = low.T if transpose else low
+            if flip_rows: block = block * signs[:, None]
+            if flip_cols: block = block * signs[None, :]
+            bits = (block > np.median(block)).flatten()
+            variants.append(f"{int(weights[bits].sum()):0{hash_size * hash_size // 4}x}")
+        return variants
+
+    @staticmethod
+    def get_image_record(path):
+        """pHash (8 varianti) + dimensioni + EXIF essenziali con una sola apertura del file (per il catalogo)."""
+        record = {"width": 0, "height": 0, "exif_datetime": None, "exif_model": None}
+        with Image.open(path) as img:
+            record["width"], record["height"] = img.width, img.height
+            try:
+                exif = img._getexif() if hasattr(img, "_getexif") else None
+            except Exception:
+                exif = None
+            if exif:
+                for tag, value in exif.items():
+                    decoded = TAGS.get(tag, tag)
+                    if decoded == "DateTimeOriginal": record["exif_datetime"] = str(value)
+                    if decoded == "Model": record["exif_model"] = str(value)
+            dihedral = AnalyzerEngine.get_dihedral_phashes(AnalyzerEngine.load_oriented_hash_image(img, path))
+            record["phash"] = dihedral[0]
+            record["phash_dihedral"] = ",".join(dihedral)
+        return record
+
+    @staticmethod
+    def hash_codes(record):
+        """Hash esadecimali di un record immagine convertiti in interi a 64 bit (per la cascata)."""
+        codes = {k: int(record[k], 16) for k in CASCADE_HASHES if record.get(k)}
+        if record.get("phash_dihedral"):
+            codes["dihedral"] = [int(h, 16) for h in record["phash_dihedral"].split(",")]
+        return codes
 
     @staticmethod
     def compute_diff_map(img_a, img_b):
@@ -63,4 +199,126 @@ class AnalyzerEngine:
                         if decoded == "Model": info["Model"] = value
         except Exception:
             pass
-        return info
\ No newline at end of file
+        return info
+
+
+def hash_images_chunk(paths):
+    """Worker per il ProcessPoolExecutor di Fase 2: un blocco di immagini per processo.
+
+    Restituisce (path, record, errore) per ogni immagine; gli errori di decodifica
+    non interrompono il blocco (blindatura pHash).
+    """
+    results = []
+    for path in paths:
+        try:
+            results.append((path, AnalyzerEngine.get_image_record(path), None))
+        except Exception as e:
+            results.append((path, None, str(e)))
+    return results
+
+
+class HashCascade:
+    """Verifica a posteriori delle coppie che l'indice pHash ha già trovato entro soglia.
+
+    La cascata non genera candidati e non riduce le query sull'indice: filtra le coppie
+    pHash, dagli hash più economici ai più costosi, per togliere i falsi positivi.
+
+    1. prefiltro aHash/dHash con soglia larga: scarta le coppie strutturalmente diverse
+    2. wHash solo per le coppie "di confine", cioè con distanza pHash nelle ultime
+       `whash_band` unità sotto `phash_threshold`
+    3. opzionale: punti chiave ORB (`verifier`, vedi orb_verifier.py) per le coppie con
+       distanza pHash nella zona grigia `orb_zone` (estremi inclusi)
+
+    In `filter_pairs` gli hash di verifica mancanti nell'archivio si chiedono a
+    `hash_loader(path, nomi)` solo per le immagini delle coppie candidate.
+    `stats` conta le coppie esaminate, quelle scartate da ciascuno stadio e quelle accettate.
+    """
+
+    PREFILTERS = ("dhash", "ahash", "none")
+
+    def __init__(self, phash_threshold=12, prefilter="dhash", prefilter_threshold=20,
+                 whash_band=3, whash_threshold=12, verifier=None, orb_zone=(8, 11), hash_loader=None):
+        if prefilter not in self.PREFILTERS:
+            raise ValueError(f"Prefiltro non supportato: {prefilter}")
+        self.phash_threshold = phash_threshold
+        self.prefilter = prefilter
+        self.prefilter_threshold = prefilter_threshold
+        self.whash_band = whash_band
+        self.whash_threshold = whash_threshold
+        self.verifier = verifier
+        self.orb_zone = orb_zone
+        self.hash_loader = hash_loader
+        self.hash_loads = 0
+        self.stats = {"candidates": 0, "pruned_prefilter": 0, "pruned_whash": 0, "pruned_orb": 0, "accepted": 0}
+
+    def accept(self, codes_a, codes_b, phash_dist=None, paths=None):
+        """True se la coppia supera tutti gli stadi; `codes_*` come da `AnalyzerEngine.hash_codes`.
+
+        La coppia deve essere già entro la soglia pHash (la garantisce l'indice di Hamming);
+        se la distanza pHash è nota non viene ricalcolata.
+        Gli hash mancanti (es. catalogo di una versione precedente) saltano il relativo stadio;
+        lo stadio ORB richiede i percorsi `paths` = (path_a, path_b).
+        """
+        stats = self.stats
+        stats["candidates"] += 1
+        if self.prefilter != "none":
+            a, b = codes_a.get(self.prefilter), codes_b.get(self.prefilter)
+            if a is not None and b is not None and (a ^ b).bit_count() > self.prefilter_threshold:
+                stats["pruned_prefilter"] += 1
+                return False
+        if phash_dist is None:
+            phash_dist = (codes_a["phash"] ^ codes_b["phash"]).bit_count()
+        if phash_dist >= self.phash_threshold - self.whash_band:
+            a, b = codes_a.get("whash"), codes_b.get("whash")
+            if a is not None and b is not None and (a ^ b).bit_count() > self.whash_threshold:
+                stats["pruned_whash"] += 1
+                return False
+        if self.verifier is not None and paths is not None and self.orb_zone[0] <= phash_dist <= self.orb_zone[1]:
+            # None = ORB non può decidere (immagini senza punti chiave): la coppia resta
+            if self.verifier.verify(*paths) is False:
+                stats["pruned_orb"] += 1
+                return False
+        stats["accepted"] += 1
+        return True
+
+    def needed_hashes(self, phash_dist):
+        """Hash di verifica consultati per una coppia a distanza pHash `phash_dist`."""
+        names = [self.prefilter] if self.prefilter != "none" else []
+        if phash_dist >= self.phash_threshold - self.whash_band:
+            names.append("whash")
+        return names
+
+    def _codes(self, store, idx, phash_dist):
+        codes = store.codes(idx)
+        missing = [name for name in self.needed_hashes(phash_dist) if name not in codes]
+        if missing and self.hash_loader is not None:
+            # Gli hash calcolati restano nell'archivio: le altre coppie della stessa immagine non ridecodificano
+            loaded = self.hash_loader(store.path(idx), missing)
+            store.put_cascade(idx, loaded)
+            codes.update(loaded)
+            self.hash_loads += 1
+        return codes
+
+    def filter_pairs(self, store, candidates):
+        """Coppie (idx_a, idx_b, dist, variante) dell'indice pHash che superano la cascata.
+
+        `store` è un `HashStore` (codici e percorsi per posizione); `candidates` come da
+        `DihedralIndex.oriented_pairs`, con la variante applicata al secondo indice.
+        """
+        for idx_a, idx_b, dist, variant in candidates:
+            if variant:
+                # Orientamenti diversi: aHash/dHash/wHash non sono confrontabili, resta il solo pHash
+                codes_a, codes_b = {"phash": int(store.phash[idx_a])}, {"phash": store.codes(idx_b)["dihedral"][variant]}
+            else:
+                codes_a, codes_b = self._codes(store, idx_a, dist), self._codes(store, idx_b, dist)
+            # ORB è invariante alle rotazioni ma non agli specchiamenti: le copie specchiate saltano lo stadio
+            mirrored = DIHEDRAL_VARIANTS[variant][0] in ("flip_h", "flip_v", "transpose", "transverse")
+            paths = None if mirrored else (store.path(idx_a), store.path(idx_b))
+            if self.accept(codes_a, codes_b, dist, paths=paths):
+                yield idx_a, idx_b, dist, variant
+
+    def summary(self):
+        s = self.stats
+        return (f"coppie pHash verificate={s['candidates']}, scartate prefiltro {self.prefilter}={s['pruned_prefilter']}, "
+                f"wHash={s['pruned_whash']}, ORB={s['pruned_orb']}, accettate={s['accepted']}, "
+                f"decodifiche per hash di verifica={self.hash_loads}")
@@ -0,0 +1,135 @@
+"""file_catalog.py
+
+Catalogo persistente dei file analizzati (SQLite) per le scansioni incrementali.
+
+Ogni riga è indicizzata dal percorso e convalidata da dimensione, mtime e inode:
+finché il file non cambia, digest, pHash, EXIF/dimensioni e metadati video già
+calcolati vengono riutilizzati e una nuova scansione si limita a fare `stat`.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+from typing import Dict, Optional, Tuple
+
+CATALOG_FILENAME = ".similarity_catalog.sqlite"
+
+
+class FileCatalog:
+    """Archivio SQLite dei dati per-file; da usare da un solo thread (l'AnalysisWorker)."""
+
+    # Colonne di dati (oltre all'identità del file): nome -> tipo SQLite
+    COLUMNS = {
+        "digest": "TEXT",
+        "digest_algo": "TEXT",
+        "partial": "TEXT",
+        "phash": "TEXT",
+        "ahash": "TEXT",
+        "dhash": "TEXT",
+        "whash": "TEXT",
+        "phash_dihedral": "TEXT",
+        "orb": "BLOB",
+        "width": "INTEGER",
+        "height": "INTEGER",
+        "exif_datetime": "TEXT",
+        "exif_model": "TEXT",
+        "duration": "REAL",
+        "fps": "REAL",
+        "video_width": "INTEGER",
+        "video_height": "INTEGER",
+    }
+    COMMIT_EVERY = 1000
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER)"
+        )
+        # Migrazione: aggiunge le colonne mancanti ai cataloghi creati da versioni precedenti
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(files)")}
+        for name, sql_type in self.COLUMNS.items():
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE files ADD COLUMN {name} {sql_type}")
+        self._conn.commit()
+        self._pending = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    @staticmethod
+    def identity(st: os.stat_result) -> Tuple[int, int, int]:
+        """Chiave di validità di una riga: (size, mtime_ns, inode)."""
+        return st.st_size, st.st_mtime_ns, st.st_ino
+
+    def lookup(self, path: str, st: Optional[os.stat_result] = None) -> Optional[Dict]:
+        """Restituisce i dati memorizzati per `path`, o None se assenti o non più validi."""
+        if st is None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+        cols = ", ".join(self.COLUMNS)
+        row = self._conn.execute(
+            f"SELECT size, mtime_ns, inode, {cols} FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        if row is None or tuple(row[:3]) != self.identity(st):
+            return None
+        return dict(zip(self.COLUMNS, row[3:]))
+
+    def update(self, path: str, st: Optional[os.stat_result] = None, **fields) -> None:
+        """Memorizza `fields` per `path`; se il file è cambiato i vecchi dati vengono scartati."""
+        unknown = set(fields) - set(self.COLUMNS)
+        if unknown:
+            raise ValueError(f"Colonne catalogo sconosciute: {sorted(unknown)}")
+        if st is None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return
+        if self.lookup(path, st) is None:
+            names = ["path", "size", "mtime_ns", "inode"] + list(fields)
+            values = [path, *self.identity(st)] + list(fields.values())
+            marks = ", ".join("?" for _ in names)
+            self._conn.execute(f"INSERT OR REPLACE INTO files ({', '.join(names)}) VALUES ({marks})", values)
+        elif fields:
+            assignments = ", ".join(f"{k} = ?" for k in fields)
+            self._conn.execute(f"UPDATE files SET {assignments} WHERE path = ?", [*fields.values(), path])
+        self._pending += 1
+        if self._pending >= self.COMMIT_EVERY:
+            self.commit()
+
+    def forget(self, path: str) -> None:
+        """Rimuove la riga di un file spostato o eliminato."""
+        self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+        self._pending += 1
+
+    def commit(self) -> None:
+        self._conn.commit()
+        self._pending = 0
+
+    def close(self) -> None:
+        try:
+            self.commit()
+        finally:
+            self._conn.close()
+
+
+def open_catalog(folder_path: str) -> FileCatalog:
+    """Apre il catalogo della cartella analizzata.
+
+    Blindatura: se la cartella non è scrivibile si usa un catalogo in memoria,
+    così l'analisi procede senza cache persistente.
+    """
+    try:
+        return FileCatalog(os.path.join(folder_path, CATALOG_FILENAME))
+    except sqlite3.Error:
+        return FileCatalog(":memory:")
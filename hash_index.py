@@ -0,0 +1,671 @@
+"""hash_index.py
+
+Indici nello spazio di Hamming per hash percettivi a 64 bit (Fase 2).
+
+Il confronto di ogni nuova immagine con tutte le precedenti è O(N^2); questi
+indici restituiscono tutti i vicini entro una distanza massima esplorando solo
+una piccola parte della collezione:
+- `BKTree`: albero metrico di Burkhard-Keller sulla distanza di Hamming
+- `MultiIndexHashTable`: tabelle "pigeonhole" su blocchi da 16 bit; se due hash
+  distano al più r, almeno un blocco dista al più r // numero_blocchi
+- `PackedHashIndex`: array NumPy `uint64` contiguo con kernel vettoriale a blocchi
+  (XOR + popcount) che emette tutte le coppie sotto soglia a memoria limitata;
+  il kernel accetta qualsiasi hash a 64 bit, compresi i keyframe video (aHash 8x8)
+- `LSHIndex`: locality-sensitive hashing a bande (approssimato) per archivi da milioni
+  di immagini; il richiamo si misura con `estimate_recall`
+- `PackedBandIndex`: multi-index hashing o LSH in sola lettura su un array NumPy
+  (anche mappato in memoria), con tabelle compatte per banda invece di dizionari
+- `DihedralIndex`: involucro che indicizza le 8 varianti ruotate/ribaltate di ogni
+  pHash, così le copie ruotate o specchiate si trovano con una sola query
+
+Tutti gli indici condividono l'interfaccia `add(key, h)` / `query(h, max_dist)`
+e restituiscono coppie (key, distanza) nell'ordine di inserimento.
+"""
+
+from __future__ import annotations
+
+import itertools
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+def hamming_distance(h1: int, h2: int) -> int:
+    return (h1 ^ h2).bit_count()
+
+
+class HammingIndex:
+    """Interfaccia comune degli indici di Hamming."""
+
+    def __init__(self):
+        self.keys: List = []
+        self.hashes: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key, h: int) -> int:
+        """Inserisce `h` associato a `key`; restituisce l'id interno (ordine di inserimento)."""
+        idx = len(self.keys)
+        self.keys.append(key)
+        self.hashes.append(h)
+        self._insert(idx, h)
+        return idx
+
+    def query(self, h: int, max_dist: int) -> List[Tuple[object, int]]:
+        """Tutte le chiavi con distanza di Hamming <= max_dist da `h`."""
+        found = sorted(self._search(h, max_dist))
+        return [(self.keys[idx], dist) for idx, dist in found]
+
+    def pairs(self, max_dist: int) -> Iterator[Tuple[object, object, int]]:
+        """Tutte le coppie (key_a, key_b, dist) entro soglia, con key_a inserita prima di key_b."""
+        for idx in range(len(self.keys)):
+            for ref, dist in sorted(self._search(self.hashes[idx], max_dist)):
+                if ref < idx:
+                    yield self.keys[ref], self.keys[idx], dist
+
+    def _insert(self, idx: int, h: int) -> None:
+        raise NotImplementedError
+
+    def _search(self, h: int, max_dist: int) -> List[Tuple[int, int]]:
+        raise NotImplementedError
+
+
+class LinearIndex(HammingIndex):
+    """Scansione esaustiva (comportamento storico), utile come riferimento nei benchmark."""
+
+    def _insert(self, idx, h):
+        pass
+
+    def _search(self, h, max_dist):
+        return [(i, d) for i, ref in enumerate(self.hashes) if (d := (h ^ ref).bit_count()) <= max_dist]
+
+
+class BKTree(HammingIndex):
+    """Albero BK: ogni nodo tiene i figli indicizzati per distanza dal nodo stesso."""
+
+    def __init__(self):
+        super().__init__()
+        self._root = None  # nodo = [idx, {distanza: nodo_figlio}]
+
+    def _insert(self, idx, h):
+        if self._root is None:
+            self._root = [idx, {}]
+            return
+        node = self._root
+        while True:
+            d = (h ^ self.hashes[node[0]]).bit_count()
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = [idx, {}]
+                return
+            node = child
+
+    def _search(self, h, max_dist):
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        hashes = self.hashes
+        while stack:
+            idx, children = stack.pop()
+            d = (h ^ hashes[idx]).bit_count()
+            if d <= max_dist:
+                found.append((idx, d))
+            # Disuguaglianza triangolare: solo i figli con |k - d| <= max_dist possono contenere match
+            lo, hi = d - max_dist, d + max_dist
+            for k, child in children.items():
+                if lo <= k <= hi:
+                    stack.append(child)
+        return found
+
+
+class MultiIndexHashTable(HammingIndex):
+    """Multi-index hashing: una tabella hash per ciascun blocco di `chunk_bits` bit."""
+
+    def __init__(self, bits: int = 64, chunk_bits: int = 16):
+        super().__init__()
+        if bits % chunk_bits:
+            raise ValueError("bits deve essere multiplo di chunk_bits")
+        self.bits = bits
+        self.chunk_bits = chunk_bits
+        self.n_chunks = bits // chunk_bits
+        self._mask = (1 << chunk_bits) - 1
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(self.n_chunks)]
+        self._flip_cache: Dict[int, List[int]] = {}
+
+    def _chunks(self, h: int) -> List[int]:
+        return [(h >> (i * self.chunk_bits)) & self._mask for i in range(self.n_chunks)]
+
+    def _flip_masks(self, radius: int) -> List[int]:
+        # Tutte le maschere di al più `radius` bit su un blocco (0 incluso)
+        masks = self._flip_cache.get(radius)
+        if masks is None:
+            masks = [0]
+            for r in range(1, radius + 1):
+                for bits in itertools.combinations(range(self.chunk_bits), r):
+                    m = 0
+                    for b in bits:
+                        m |= 1 << b
+                    masks.append(m)
+            self._flip_cache[radius] = masks
+        return masks
+
+    def _insert(self, idx, h):
+        for table, chunk in zip(self._tables, self._chunks(h)):
+            table.setdefault(chunk, []).append(idx)
+
+    def _search(self, h, max_dist):
+        sub_radius = min(max_dist // self.n_chunks, self.chunk_bits)
+        masks = self._flip_masks(sub_radius)
+        candidates = set()
+        for table, chunk in zip(self._tables, self._chunks(h)):
+            for m in masks:
+                bucket = table.get(chunk ^ m)
+                if bucket:
+                    candidates.update(bucket)
+        hashes = self.hashes
+        return [(idx, d) for idx in candidates if (d := (h ^ hashes[idx]).bit_count()) <= max_dist]
+
+
+class LSHIndex(HammingIndex):
+    """Locality-sensitive hashing a bande: modalità approssimata per archivi enormi.
+
+    L'hash viene diviso in `bands` bande di `rows` bit; due hash sono candidati se
+    coincidono esattamente su almeno una banda, e solo i candidati vengono verificati.
+    Per il principio dei cassetti il richiamo è esatto fino a distanza `bands - 1`;
+    oltre diventa probabilistico (vedi `estimate_recall`).
+    """
+
+    def __init__(self, bands: int = 5, rows: int = 12, bits: int = 64):
+        super().__init__()
+        if bands < 1 or rows < 1 or bands * rows > bits:
+            raise ValueError("bands x rows deve essere compreso tra 1 e il numero di bit dell'hash")
+        self.bands = bands
+        self.rows = rows
+        self._mask = (1 << rows) - 1
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in range(bands)]
+
+    def _band_values(self, h: int) -> List[int]:
+        return [(h >> (b * self.rows)) & self._mask for b in range(self.bands)]
+
+    def _insert(self, idx, h):
+        for buckets, value in zip(self._buckets, self._band_values(h)):
+            buckets.setdefault(value, []).append(idx)
+
+    def _search(self, h, max_dist):
+        candidates = set()
+        for buckets, value in zip(self._buckets, self._band_values(h)):
+            bucket = buckets.get(value)
+            if bucket:
+                candidates.update(bucket)
+        hashes = self.hashes
+        return [(idx, d) for idx in candidates if (d := (h ^ hashes[idx]).bit_count()) <= max_dist]
+
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount64(x: np.ndarray) -> np.ndarray:
+    """Popcount vettoriale su un array `uint64` (np.bitwise_count con NumPy >= 2.0)."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x)
+    return _POPCOUNT8[x.view(np.uint8)].reshape(x.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+def pack_hashes(hashes) -> np.ndarray:
+    """Converte una sequenza di hash interi (<= 64 bit) in un array contiguo `uint64`."""
+    return np.fromiter(hashes, dtype=np.uint64)
+
+
+def hamming_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Matrice delle distanze di Hamming len(a) x len(b) tra due array `uint64`."""
+    return popcount64(np.bitwise_xor(a[:, None], b[None, :]))
+
+
+def hamming_pairs_blocked(a: np.ndarray, max_dist: int, b: Optional[np.ndarray] = None,
+                          tile: int = 1024) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Kernel a blocchi: restituisce per ogni tile gli array (i, j, dist) con dist <= max_dist.
+
+    Senza `b` confronta `a` con sé stesso ed emette solo le coppie i < j.
+    Se `b` è bidimensionale (N, k), ad es. le varianti diedrali di `HashStore`, viene
+    trattato come il vettore appiattito di N*k hash: j = riga * k + colonna.
+    La memoria di lavoro è limitata a tile x tile distanze indipendentemente da N.
+    """
+    self_join = b is None
+    if self_join:
+        b = a
+    n, m = len(a), len(b)
+    width = b.shape[1] if b.ndim == 2 else 1
+    b_tile = max(1, tile // width)  # stesso numero di hash per tile anche con b bidimensionale
+    for i0 in range(0, n, tile):
+        block_a = np.asarray(a[i0:i0 + tile])
+        for j0 in range(i0 if self_join else 0, m, b_tile):
+            block_b = np.asarray(b[j0:j0 + b_tile]).reshape(-1)
+            dist = hamming_matrix(block_a, block_b)
+            mask = dist <= max_dist
+            if self_join and j0 == i0:
+                mask &= np.triu(np.ones(mask.shape, dtype=bool), k=1)
+            ii, jj = np.nonzero(mask)
+            if len(ii):
+                yield ii + i0, jj + j0 * width, dist[ii, jj]
+
+
+def hamming_nearest_blocked(a: np.ndarray, b: np.ndarray, k: int, max_dist: int,
+                            cells: int = 1 << 20) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per ogni hash di `a` i `k` hash di `b` più vicini entro `max_dist`; a parità di distanza i primi in `b`.
+
+    Restituisce gli array (i, j, dist) ordinati per (i, dist, j). Le coppie sono al più
+    len(a) * k anche quando gli hash coincidono tutti (es. riprese statiche), dove
+    `hamming_pairs_blocked` ne emetterebbe len(a) * len(b); la memoria di lavoro è
+    limitata a `cells` distanze per blocco di righe.
+    """
+    n, m = len(a), len(b)
+    empty = np.empty(0, dtype=np.int64)
+    if not n or not m or k < 1:
+        return empty, empty, empty
+    k = min(k, m)
+    rows = max(1, cells // m)
+    columns = np.arange(m, dtype=np.int64)
+    out_i, out_j, out_d = [], [], []
+    for i0 in range(0, n, rows):
+        # Chiave distanza * m + j: un solo ordinamento per distanza e, a parità, per posizione in b
+        key = hamming_matrix(np.asarray(a[i0:i0 + rows]), np.asarray(b)).astype(np.int64) * m + columns
+        if k < m:
+            key = np.partition(key, k - 1, axis=1)[:, :k]
+        key.sort(axis=1)
+        dist, jj = key // m, key % m
+        keep = dist <= max_dist
+        out_i.append(np.nonzero(keep)[0] + i0)
+        out_j.append(jj[keep])
+        out_d.append(dist[keep])
+    return np.concatenate(out_i), np.concatenate(out_j), np.concatenate(out_d)
+
+
+class PackedHashIndex(HammingIndex):
+    """Hash in un array `uint64` contiguo; query e coppie calcolate con il kernel vettoriale."""
+
+    def __init__(self, tile: int = 1024):
+        super().__init__()
+        self.tile = tile
+        self._array = np.empty(1024, dtype=np.uint64)
+
+    @classmethod
+    def over(cls, array: np.ndarray, tile: int = 1024) -> "PackedHashIndex":
+        """Indice in sola lettura su un array `uint64` esterno, senza copie.
+
+        Usato sulle colonne mappate in memoria di `HashStore`: le chiavi sono le
+        posizioni nell'array.
+        """
+        index = cls(tile)
+        index._array = array
+        index.keys = range(len(array))
+        index.hashes = array
+        return index
+
+    @property
+    def array(self) -> np.ndarray:
+        return self._array[:len(self.keys)]
+
+    def _insert(self, idx, h):
+        if idx >= len(self._array):
+            grown = np.empty(len(self._array) * 2, dtype=np.uint64)
+            grown[:idx] = self._array[:idx]
+            self._array = grown
+        self._array[idx] = h
+
+    def _search(self, h, max_dist):
+        query = np.array([h], dtype=np.uint64)
+        found = []
+        for _, jj, dd in hamming_pairs_blocked(query, max_dist, b=self.array, tile=self.tile * self.tile):
+            found.extend(zip(jj.tolist(), dd.tolist()))
+        return found
+
+    def pairs(self, max_dist):
+        for ii, jj, dd in hamming_pairs_blocked(self.array, max_dist, tile=self.tile):
+            for i, j, d in zip(ii.tolist(), jj.tolist(), dd.tolist()):
+                yield self.keys[i], self.keys[j], d
+
+
+# Bit massimi per banda di `PackedBandIndex` (e quindi di `lsh_rows` sull'archivio hash)
+MAX_BAND_BITS = 24
+
+
+class PackedBandIndex(HammingIndex):
+    """Tabelle per banda su array NumPy, in sola lettura: multi-index hashing o LSH senza oggetti Python.
+
+    Per ogni banda di `band_bits` bit si tengono solo gli id degli hash ordinati per valore
+    della banda (`uint32`) e gli offset dei 2**band_bits valori possibili: circa 4 byte per
+    hash e banda, contro le liste nei dizionari di `MultiIndexHashTable` e `LSHIndex`.
+    Oltre `OFFSET_TABLE_BITS` bit la tabella degli offset peserebbe più degli hash: si tengono
+    invece i valori ordinati della banda e i bucket si trovano con `np.searchsorted`.
+    Con `exact=True` la ricerca è esatta come `MultiIndexHashTable` (principio dei cassetti,
+    raggio `max_dist // bands` su ogni banda); con `exact=False` è la modalità LSH: un hash
+    è candidato solo se coincide con la query su almeno una banda.
+
+    Se l'array è bidimensionale (N, k), ad es. `HashStore.dihedral`, gli id sono quelli del
+    vettore appiattito (j = riga * k + colonna), come in `hamming_pairs_blocked`.
+    """
+
+    # Candidati verificati per blocco di query: memoria di lavoro limitata anche su bucket affollati
+    CANDIDATE_BUDGET = 1 << 21
+    OFFSET_TABLE_BITS = 16
+
+    def __init__(self, bands: int = 4, band_bits: int = 16, exact: bool = True, tile: int = 1024):
+        super().__init__()
+        if bands < 1 or band_bits < 1 or bands * band_bits > 64 or band_bits > MAX_BAND_BITS:
+            raise ValueError(f"bande x bit per banda deve stare in 64 bit (al più {MAX_BAND_BITS} bit per banda)")
+        self.bands = bands
+        self.band_bits = band_bits
+        self.exact = exact
+        self.tile = tile
+        self._mask = np.uint64((1 << band_bits) - 1)
+        self._tables: List[Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]] = []
+        self._flip_cache: Dict[int, np.ndarray] = {}
+        self._array = np.empty((0, 1), dtype=np.uint64)
+
+    @classmethod
+    def over(cls, array: np.ndarray, bands: int = 4, band_bits: int = 16, exact: bool = True,
+             tile: int = 1024, chunk: int = 65536) -> "PackedBandIndex":
+        """Costruisce le tabelle leggendo `array` (anche mappato in memoria) a blocchi di righe."""
+        index = cls(bands, band_bits, exact, tile)
+        array2d = array if array.ndim == 2 else array.reshape(-1, 1)
+        n, width = array2d.shape
+        index._array = array2d
+        index.keys = range(n * width)
+        index.hashes = array
+        for band in range(bands):
+            shift = np.uint64(band * band_bits)
+            values = np.empty(n * width, dtype=np.uint32)
+            for start in range(0, n, chunk):
+                block = np.asarray(array2d[start:start + chunk], dtype=np.uint64).reshape(-1)
+                values[start * width:start * width + len(block)] = (block >> shift) & index._mask
+            order = np.argsort(values, kind="stable").astype(np.uint32)
+            if band_bits <= cls.OFFSET_TABLE_BITS:
+                offsets = np.zeros((1 << band_bits) + 1, dtype=np.int64)
+                np.cumsum(np.bincount(values, minlength=1 << band_bits), out=offsets[1:])
+                index._tables.append((order, offsets, None))
+            else:
+                index._tables.append((order, None, values[order]))
+            del values
+        return index
+
+    @property
+    def array(self) -> np.ndarray:
+        return self._array
+
+    def _hash_at(self, ids: np.ndarray) -> np.ndarray:
+        width = self._array.shape[1]
+        return np.asarray(self._array[ids // width, ids % width], dtype=np.uint64)
+
+    def _flip_masks(self, radius: int) -> np.ndarray:
+        masks = self._flip_cache.get(radius)
+        if masks is None:
+            values = [0]
+            for r in range(1, radius + 1):
+                for bits in itertools.combinations(range(self.band_bits), r):
+                    values.append(sum(1 << b for b in bits))
+            masks = self._flip_cache[radius] = np.array(values, dtype=np.int64)
+        return masks
+
+    def join(self, queries: np.ndarray, max_dist: int) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Per blocchi di `queries` gli array (i, j, dist) con dist <= max_dist, ordinati per (i, j).
+
+        `i` è la posizione in `queries`, `j` l'id nell'indice; la query stessa non viene esclusa.
+        """
+        radius = min(max_dist // self.bands, self.band_bits) if self.exact else 0
+        masks = self._flip_masks(radius)
+        total = len(self.keys)
+        for q0 in range(0, len(queries), self.tile):
+            block = np.asarray(queries[q0:q0 + self.tile], dtype=np.uint64)
+            # Intervalli (inizio, lunghezza) di ogni bucket sondato, banda per banda: forma (bande, Q, sonde)
+            starts, counts = [], []
+            for band, (order, offsets, values) in enumerate(self._tables):
+                probes = (((block >> np.uint64(band * self.band_bits)) & self._mask).astype(np.int64)[:, None]) ^ masks[None, :]
+                if offsets is not None:
+                    lo, hi = offsets[probes], offsets[probes + 1]
+                else:
+                    lo = np.searchsorted(values, probes, side="left")
+                    hi = np.searchsorted(values, probes, side="right")
+                starts.append(lo)
+                counts.append(hi - lo)
+            starts, counts = np.stack(starts), np.stack(counts)
+            per_query = counts.sum(axis=(0, 2))
+            # Sotto-blocchi di query con al più CANDIDATE_BUDGET candidati (almeno una query ciascuno)
+            bounds = np.cumsum(per_query)
+            s = 0
+            while s < len(block):
+                base = bounds[s - 1] if s else 0
+                e = max(s + 1, int(np.searchsorted(bounds, base + self.CANDIDATE_BUDGET, side="right")))
+                yield from self._verify(block, s, e, starts, counts, max_dist, total, q0)
+                s = e
+
+    def _verify(self, block, s, e, starts, counts, max_dist, total, q0):
+        keys = []
+        for band, (order, _, _) in enumerate(self._tables):
+            c = counts[band, s:e].reshape(-1)
+            n_cand = int(c.sum())
+            if not n_cand:
+                continue
+            nonzero = c > 0
+            c, lo = c[nonzero], starts[band, s:e].reshape(-1)[nonzero]
+            query = np.repeat(np.repeat(np.arange(s, e), counts.shape[2])[nonzero], c)
+            pos = np.arange(n_cand) - np.repeat(np.cumsum(c) - c, c) + np.repeat(lo, c)
+            keys.append(query * total + order[pos])
+        if not keys:
+            return
+        keys = np.concatenate(keys)
+        ii, jj = keys // total, keys % total
+        keep = popcount64(np.bitwise_xor(block[ii], self._hash_at(jj))) <= max_dist
+        if keep.any():
+            # Lo stesso hash può arrivare da più bande: coppie uniche, ordinate per (query, id)
+            keys = np.unique(keys[keep])
+            ii, jj = keys // total, keys % total
+            yield ii + q0, jj, popcount64(np.bitwise_xor(block[ii], self._hash_at(jj)))
+
+    def _search(self, h, max_dist):
+        found = []
+        for _, jj, dd in self.join(np.array([h], dtype=np.uint64), max_dist):
+            found.extend(zip(jj.tolist(), dd.tolist()))
+        return found
+
+    def pairs(self, max_dist):
+        # Auto-join sull'array monodimensionale: ogni coppia compare per entrambe le query, si tiene j < i
+        for ii, jj, dd in self.join(self.hashes, max_dist):
+            keep = jj < ii
+            for i, j, d in zip(ii[keep].tolist(), jj[keep].tolist(), dd[keep].tolist()):
+                yield self.keys[j], self.keys[i], d
+
+
+# Variante inversa di ciascuna trasformazione, nell'ordine di `analyzer.DIHEDRAL_VARIANTS`:
+# le rotazioni di 90° e 270° si scambiano, le altre sono involuzioni
+DIHEDRAL_INVERSE = (0, 1, 2, 3, 4, 6, 5, 7)
+
+
+class DihedralIndex:
+    """Indice invariante a rotazioni e ribaltamenti sopra un qualsiasi `HammingIndex`.
+
+    Ogni immagine inserisce le sue varianti del pHash (vedi `analyzer.DIHEDRAL_VARIANTS`)
+    nell'indice sottostante; la ricerca resta una sola query per immagine, con il solo
+    hash nell'orientamento originale, contro tutte le varianti memorizzate.
+    """
+
+    def __init__(self, base: HammingIndex, n_variants: int = 8, inverse: Optional[Tuple[int, ...]] = None):
+        self.base = base
+        self.n_variants = n_variants
+        if inverse is None:
+            inverse = DIHEDRAL_INVERSE if n_variants == len(DIHEDRAL_INVERSE) else tuple(range(n_variants))
+        self.inverse = inverse
+        self.keys: List = []
+
+    @classmethod
+    def over(cls, variants: np.ndarray, tile: int = 1024, base: Optional[HammingIndex] = None) -> "DihedralIndex":
+        """Indice in sola lettura su una matrice (N, 8) di varianti (es. `HashStore.dihedral`).
+
+        `base` è un indice già costruito sulla stessa matrice (`PackedHashIndex` o
+        `PackedBandIndex`); per default il kernel NumPy a blocchi.
+        """
+        index = cls(base if base is not None else PackedHashIndex.over(variants, tile), n_variants=variants.shape[1])
+        index.keys = range(len(variants))
+        return index
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key, variants) -> int:
+        """Inserisce le varianti di `key`; la prima deve essere l'hash nell'orientamento originale."""
+        if len(variants) != self.n_variants:
+            raise ValueError(f"Attese {self.n_variants} varianti, ricevute {len(variants)}")
+        idx = len(self.keys)
+        self.keys.append(key)
+        for k, h in enumerate(variants):
+            self.base.add(idx * self.n_variants + k, h)
+        return idx
+
+    def _raw_matches(self, max_dist: int) -> Iterator[Tuple[int, int, int]]:
+        # (indice immagine interrogata, id variante trovata, distanza)
+        n = self.n_variants
+        base = self.base
+        if isinstance(base, (PackedHashIndex, PackedBandIndex)):
+            # Kernel a blocchi o tabelle per banda: hash originali (una riga ogni n) contro tutte le varianti
+            array = base.array
+            identity = array[:, 0] if array.ndim == 2 else array[::n]
+            if isinstance(base, PackedBandIndex):
+                matches = base.join(identity, max_dist)
+            else:
+                matches = hamming_pairs_blocked(np.ascontiguousarray(identity), max_dist, b=array, tile=base.tile)
+            for ii, jj, dd in matches:
+                yield from zip(ii.tolist(), jj.tolist(), dd.tolist())
+            return
+        for i in range(len(self.keys)):
+            for j, d in base._search(base.hashes[i * n], max_dist):
+                yield i, j, d
+
+    def oriented_pairs(self, max_dist: int) -> Iterator[Tuple[object, object, int, int]]:
+        """Coppie (key_a, key_b, dist, variante) entro soglia, con key_a inserita prima di key_b.
+
+        `variante` è l'indice della trasformazione che, applicata a key_b, la allinea a key_a
+        (0 = stesso orientamento): la variante `variante` del pHash di key_b corrisponde al
+        pHash originale di key_a, qualunque sia l'ordine di inserimento. Ogni coppia compare
+        una volta, con la distanza minima trovata; a parità di distanza si preferisce lo stesso
+        orientamento e poi la corrispondenza trovata direttamente sulla variante di key_b.
+        """
+        n = self.n_variants
+        inverse = self.inverse
+        best: Dict[Tuple[int, int], Tuple[int, int, int]] = {}
+        for i, j, d in self._raw_matches(max_dist):
+            other, variant = divmod(j, n)
+            if other == i:
+                continue
+            if i < other:
+                pair, found = (i, other), (d, variant, 0)
+            else:
+                # Originale di i contro una variante di other (la prima inserita): la trasformazione
+                # inversa porta i sull'orientamento di other
+                pair, found = (other, i), (d, inverse[variant], 1)
+            if pair not in best or found < best[pair]:
+                best[pair] = found
+        for (a, b), (d, variant, _) in sorted(best.items(), key=lambda item: (item[0][1], item[0][0])):
+            yield self.keys[a], self.keys[b], d, variant
+
+    def pairs(self, max_dist: int) -> Iterator[Tuple[object, object, int]]:
+        for a, b, d, _ in self.oriented_pairs(max_dist):
+            yield a, b, d
+
+
+ENGINES = {
+    "mih": MultiIndexHashTable,
+    "bktree": BKTree,
+    "numpy": PackedHashIndex,
+    "linear": LinearIndex,
+    "lsh": LSHIndex,
+}
+
+
+def make_index(name: str = "mih", dihedral: bool = False, **options):
+    """Crea l'indice richiesto dalle impostazioni (default: multi-index hashing).
+
+    `options` vengono passate al costruttore del motore (es. `bands`/`rows` per `lsh`).
+    Con `dihedral=True` l'indice viene avvolto in un `DihedralIndex`.
+    """
+    try:
+        engine = ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Motore di indicizzazione sconosciuto: {name}") from None
+    index = engine(**options)
+    return DihedralIndex(index) if dihedral else index
+
+
+def estimate_recall(index: HammingIndex, max_dist: int, sample: int = 200, seed: int = 0) -> Tuple[float, int, int]:
+    """Richiamo di `index` rispetto alla ricerca esatta su un campione di query.
+
+    Le query sono hash già presenti nell'indice; il riferimento esatto è il kernel
+    NumPy su tutti gli hash. Restituisce (richiamo, vicini esatti, vicini trovati),
+    escludendo la query stessa.
+    """
+    hashes = index.hashes
+    # Indici su array (es. `PackedBandIndex` sulle varianti diedrali): hash nell'ordine degli id appiattiti
+    packed = np.asarray(hashes, dtype=np.uint64).reshape(-1) if isinstance(hashes, np.ndarray) else pack_hashes(hashes)
+    n = len(packed)
+    if n < 2:
+        return 1.0, 0, 0
+    rng = np.random.default_rng(seed)
+    picks = np.sort(rng.choice(n, size=min(sample, n), replace=False))
+    exact = 0
+    for ii, jj, _ in hamming_pairs_blocked(packed[picks], max_dist, b=packed):
+        exact += int(np.count_nonzero(picks[ii] != jj))
+    found = 0
+    for i in picks.tolist():
+        found += sum(1 for j, _ in index._search(int(packed[i]), max_dist) if j != i)
+    return (found / exact if exact else 1.0), exact, found
+
+
+if __name__ == '__main__':
+    import argparse
+    import random
+    import time
+
+    parser = argparse.ArgumentParser(description="Benchmark indici di Hamming (build + query)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--radius", type=int, default=11, help="distanza massima (PHASH_THRESHOLD - 1)")
+    parser.add_argument("--engines", nargs="+", default=["mih", "bktree", "numpy", "lsh", "linear"], choices=sorted(ENGINES))
+    # Stessi valori predefiniti di `lsh_bands`/`lsh_rows` nelle impostazioni e di `LSHIndex`
+    parser.add_argument("--bands", type=int, default=5, help="bande LSH")
+    parser.add_argument("--rows", type=int, default=12, help="bit per banda LSH")
+    parser.add_argument("--pairs", action="store_true", help="misura anche la ricerca di tutte le coppie (N x N)")
+    parser.add_argument("--linear-max", type=int, default=100_000, help="oltre questa taglia la scansione lineare viene saltata")
+    args = parser.parse_args()
+
+    rng = random.Random(1234)
+
+    def near(h, flips):
+        for b in rng.sample(range(64), flips):
+            h ^= 1 << b
+        return h
+
+    print(f"{'engine':8} {'N':>9} {'build s':>9} {'query ms':>9} {'match/q':>8} {'pairs s':>9} {'recall':>7}")
+    for n in args.sizes:
+        # 90% hash casuali + 10% quasi-duplicati (distanza 1-8) per avere match reali
+        data = [rng.getrandbits(64) for _ in range(n - n // 10)]
+        data += [near(rng.choice(data), rng.randint(1, 8)) for _ in range(n // 10)]
+        queries = [near(rng.choice(data), rng.randint(0, 6)) for _ in range(args.queries)]
+        for name in args.engines:
+            if name == "linear" and n > args.linear_max:
+                continue
+            index = make_index(name, **({"bands": args.bands, "rows": args.rows} if name == "lsh" else {}))
+            t0 = time.perf_counter()
+            for i, h in enumerate(data):
+                index.add(i, h)
+            t_build = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            matches = sum(len(index.query(q, args.radius)) for q in queries)
+            t_query = (time.perf_counter() - t0) / len(queries) * 1000
+            t_pairs = float("nan")
+            if args.pairs:
+                t0 = time.perf_counter()
+                for _ in index.pairs(args.radius):
+                    pass
+                t_pairs = time.perf_counter() - t0
+            recall = estimate_recall(index, args.radius)[0] if name == "lsh" else 1.0
+            print(f"{name:8} {n:>9} {t_build:>9.2f} {t_query:>9.3f} {matches / len(queries):>8.2f} {t_pairs:>9.2f} {recall:>7.3f}")
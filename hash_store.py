@@ -0,0 +1,224 @@
+"""hash_store.py
+
+Archivio compatto su disco degli hash di Fase 2.
+
+Invece di un dizionario percorso -> hash in memoria (centinaia di byte per immagine),
+ogni immagine occupa un record a dimensione fissa di 12 parole `uint64` in un file
+mappato in memoria:
+
+    colonne 0-7   pHash nelle 8 varianti diedrali (colonna 0 = orientamento originale)
+    colonne 8-10  aHash, dHash, wHash (cascata di verifica; 0 = non ancora calcolato)
+    colonna 11    offset << 16 | lunghezza del percorso nella tabella dei percorsi
+
+I percorsi (UTF-8) stanno in un secondo file accodato e vengono decodificati solo
+quando servono. I motori di ricerca lavorano direttamente sulle colonne mappate;
+`HashStore.open` riapre un archivio chiuso leggendo solo l'intestazione.
+"""
+
+from __future__ import annotations
+
+import os
+import struct
+from typing import Dict, Optional
+
+import numpy as np
+
+from hash_index import DihedralIndex, PackedBandIndex, PackedHashIndex
+
+STORE_FILENAME = ".similarity_phash"
+RECORD_WORDS = 12
+# Motori di Fase 2 sull'archivio: `mih` esatto su tabelle per banda, `numpy` kernel a blocchi, `lsh` approssimato
+STORE_ENGINES = ("mih", "numpy", "lsh")
+# Motori esatti delle versioni precedenti: sull'archivio darebbero le stesse coppie di `mih`
+LEGACY_ENGINES = {"bktree": "mih", "linear": "mih"}
+DIHEDRAL_COLS = slice(0, 8)
+CASCADE_COLS = {"ahash": 8, "dhash": 9, "whash": 10}
+PATH_COL = 11
+
+_MAGIC = b"SIMHASH1"
+_HEADER = struct.Struct("<8sQ")  # magic, numero di record
+_MAX_PATH_BYTES = (1 << 16) - 1
+
+
+class HashStore:
+    """Record `uint64` mappati in memoria + tabella dei percorsi; un solo thread scrittore."""
+
+    def __init__(self, base_path: str, create: bool = False):
+        self.base_path = base_path
+        self._records_path = base_path + ".rec"
+        self._paths_path = base_path + ".paths"
+        if create or not os.path.exists(self._records_path):
+            with open(self._records_path, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, 0))
+            open(self._paths_path, "wb").close()
+        with open(self._records_path, "rb") as f:
+            magic, count = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError(f"Archivio hash non valido: {self._records_path}")
+        self._count = count
+        self._paths = open(self._paths_path, "r+b")
+        self._paths.seek(0, os.SEEK_END)
+        self._reader = None
+        self._capacity = 0
+        self._map: Optional[np.memmap] = None
+        self._remap(max(count, 1024))
+
+    @classmethod
+    def open(cls, base_path: str) -> "HashStore":
+        """Riapre un archivio esistente (solo intestazione + mappatura)."""
+        return cls(base_path, create=False)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _remap(self, capacity: int) -> None:
+        # La mappa cresce raddoppiando: il file viene esteso e rimappato
+        if self._map is not None:
+            self._map.flush()
+            del self._map
+        size = _HEADER.size + capacity * RECORD_WORDS * 8
+        with open(self._records_path, "r+b") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < size:
+                f.truncate(size)
+        self._map = np.memmap(self._records_path, dtype=np.uint64, mode="r+",
+                              offset=_HEADER.size, shape=(capacity, RECORD_WORDS))
+        self._capacity = capacity
+
+    def reserve(self, n: int) -> None:
+        """Porta l'archivio a `n` record (slot vuoti da riempire con `put`)."""
+        if n > self._capacity:
+            self._remap(max(n, self._capacity * 2))
+        if n > self._count:
+            self._map[self._count:n] = 0
+            self._count = n
+
+    def _intern_path(self, path: str) -> int:
+        data = path.encode("utf-8")
+        if len(data) > _MAX_PATH_BYTES:
+            raise ValueError(f"Percorso troppo lungo per l'archivio hash: {path}")
+        offset = self._paths.tell()
+        self._paths.write(data)
+        return (offset << 16) | len(data)
+
+    def put(self, idx: int, path: str, codes: Dict) -> None:
+        """Scrive il record `idx`; `codes` come da `AnalyzerEngine.hash_codes` (con varianti)."""
+        row = self._map[idx]
+        row[DIHEDRAL_COLS] = codes["dihedral"]
+        for name, col in CASCADE_COLS.items():
+            row[col] = codes.get(name, 0)
+        row[PATH_COL] = self._intern_path(path)
+
+    def put_cascade(self, idx: int, codes: Dict) -> None:
+        """Aggiorna solo gli hash della cascata presenti in `codes` (calcolati dopo `put`)."""
+        for name, value in codes.items():
+            if name in CASCADE_COLS:
+                self._map[idx, CASCADE_COLS[name]] = value
+
+    def compact(self, chunk: int = 65536) -> int:
+        """Elimina gli slot mai scritti (es. immagini non decodificabili) mantenendo l'ordine."""
+        write = 0
+        for start in range(0, self._count, chunk):
+            block = np.array(self._map[start:start + chunk])
+            block = block[block[:, PATH_COL] != 0]
+            self._map[write:write + len(block)] = block
+            write += len(block)
+        self._count = write
+        return write
+
+    @property
+    def records(self) -> np.ndarray:
+        return self._map[:self._count]
+
+    @property
+    def dihedral(self) -> np.ndarray:
+        """Varianti del pHash, vista (N, 8) sulla mappa."""
+        return self._map[:self._count, DIHEDRAL_COLS]
+
+    @property
+    def phash(self) -> np.ndarray:
+        return self._map[:self._count, 0]
+
+    def path(self, idx: int) -> str:
+        ref = int(self._map[idx, PATH_COL])
+        offset, length = ref >> 16, ref & _MAX_PATH_BYTES
+        # Tabella solo in accodamento: un lettore dedicato resta valido mentre si scrive
+        self._paths.flush()
+        if self._reader is None:
+            self._reader = open(self._paths_path, "rb")
+        self._reader.seek(offset)
+        return self._reader.read(length).decode("utf-8")
+
+    def codes(self, idx: int) -> Dict:
+        """Hash del record `idx` nel formato di `AnalyzerEngine.hash_codes` (per la cascata)."""
+        row = [int(v) for v in self._map[idx]]
+        codes = {"phash": row[0], "dihedral": row[DIHEDRAL_COLS]}
+        for name, col in CASCADE_COLS.items():
+            if row[col]:
+                codes[name] = row[col]
+        return codes
+
+    def flush(self) -> None:
+        self._paths.flush()
+        self._map.flush()
+        with open(self._records_path, "r+b") as f:
+            f.write(_HEADER.pack(_MAGIC, self._count))
+
+    def close(self) -> None:
+        if self._map is None:
+            return
+        try:
+            self.flush()
+        finally:
+            del self._map
+            self._map = None
+            self._paths.close()
+            if self._reader is not None:
+                self._reader.close()
+
+
+def store_engine(name: str) -> str:
+    """Nome del motore sull'archivio, con i motori esatti storici (`bktree`, `linear`) ricondotti a `mih`."""
+    engine = LEGACY_ENGINES.get(name, name)
+    if engine not in STORE_ENGINES:
+        raise ValueError(f"Motore di indicizzazione sconosciuto: {name}")
+    return engine
+
+
+def build_index(store: HashStore, engine: str = "mih", dihedral: bool = False, **options):
+    """Indice di Fase 2 sugli hash dell'archivio; le chiavi sono le posizioni dei record.
+
+    Nessun motore copia gli hash in strutture Python: `numpy` usa il kernel a blocchi
+    direttamente sulla mappa, `mih` e `lsh` un `PackedBandIndex` con tabelle compatte per banda.
+    `options` come per `make_index` (`bands`/`rows` per `lsh`).
+    """
+    engine = store_engine(engine)
+    column = store.dihedral if dihedral else store.phash
+    if engine == "numpy":
+        base = PackedHashIndex.over(column)
+    elif engine == "lsh":
+        base = PackedBandIndex.over(column, bands=options.get("bands", 5), band_bits=options.get("rows", 12), exact=False)
+    else:
+        base = PackedBandIndex.over(column)
+    return DihedralIndex.over(column, base=base) if dihedral else base
+
+
+def create_store(folder_path: str) -> HashStore:
+    """Crea (svuotando quello di un'analisi precedente) l'archivio hash della cartella analizzata.
+
+    Gli hash si conservano tra un'analisi e l'altra nel catalogo, non qui: l'archivio viene
+    riscritto a ogni Fase 2 nell'ordine di scansione corrente.
+    Blindatura: se la cartella non è scrivibile si usa una cartella temporanea.
+    """
+    try:
+        return HashStore(os.path.join(folder_path, STORE_FILENAME), create=True)
+    except OSError:
+        import tempfile
+        return HashStore(os.path.join(tempfile.mkdtemp(prefix="similarity_"), STORE_FILENAME), create=True)
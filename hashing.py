@@ -0,0 +1,144 @@
+"""hashing.py
+
+Motore di hashing condiviso per l'identità binaria dei file (Fase 1 e video).
+
+Funzionalità principali:
+- algoritmo selezionabile: MD5 (default, compatibile con le sessioni esistenti) o BLAKE2b
+- lettura con buffer grandi e riutilizzabili (`readinto` + `memoryview`, nessuna copia)
+- pool configurabile di thread lettori: hashlib rilascia il GIL sui buffer grandi,
+  quindi più thread saturano il disco invece di un solo core
+- digest parziale testa/coda per scartare rapidamente i falsi candidati
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterable, Iterator, Optional, Tuple
+
+ALGORITHMS = ("md5", "blake2b")
+DEFAULT_ALGORITHM = "md5"
+DEFAULT_BUFFER_SIZE = 1024 * 1024  # 1 MB per lettura
+PARTIAL_CHUNK = 65536              # 64 KB in testa e 64 KB in coda
+
+_local = threading.local()
+
+
+def new_hasher(algorithm: str = DEFAULT_ALGORITHM):
+    """Restituisce un oggetto hashlib per l'algoritmo richiesto."""
+    if algorithm == "md5":
+        return hashlib.md5()
+    if algorithm == "blake2b":
+        return hashlib.blake2b()
+    raise ValueError(f"Algoritmo di hash non supportato: {algorithm}")
+
+
+def _thread_buffer(size: int) -> bytearray:
+    # Un buffer per thread: riutilizzato tra un file e l'altro senza riallocazioni
+    buf = getattr(_local, "buffer", None)
+    if buf is None or len(buf) != size:
+        buf = bytearray(size)
+        _local.buffer = buf
+    return buf
+
+
+def hash_file(path: str, algorithm: str = DEFAULT_ALGORITHM, buffer_size: int = DEFAULT_BUFFER_SIZE) -> str:
+    """Digest completo del file letto a blocchi di `buffer_size` byte."""
+    h = new_hasher(algorithm)
+    buf = _thread_buffer(buffer_size)
+    view = memoryview(buf)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            h.update(view[:n])
+    return h.hexdigest()
+
+
+def hash_head_tail(path: str, size: int, algorithm: str = DEFAULT_ALGORITHM, chunk: int = PARTIAL_CHUNK) -> str:
+    """Digest parziale su testa e coda del file.
+
+    Se il file è lungo al massimo due blocchi viene letto per intero: il risultato
+    coincide allora con il digest completo (vedi `covers_whole_file`).
+    """
+    h = new_hasher(algorithm)
+    with open(path, "rb") as f:
+        if covers_whole_file(size, chunk):
+            h.update(f.read())
+        else:
+            h.update(f.read(chunk))
+            f.seek(size - chunk)
+            h.update(f.read(chunk))
+    return h.hexdigest()
+
+
+def covers_whole_file(size: int, chunk: int = PARTIAL_CHUNK) -> bool:
+    """True se l'hash parziale di un file di `size` byte equivale al digest completo."""
+    return size <= 2 * chunk
+
+
+class HashEngine:
+    """Pool di thread lettori che calcola digest completi e parziali.
+
+    I risultati vengono restituiti in ordine di completamento; i file non
+    accessibili producono `None` invece di un'eccezione (blindatura Fase 1).
+    """
+
+    def __init__(self, algorithm: str = DEFAULT_ALGORITHM, max_workers: int = 4, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Algoritmo di hash non supportato: {algorithm}")
+        self.algorithm = algorithm
+        self.max_workers = max(1, int(max_workers))
+        self.buffer_size = buffer_size
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="hash-io")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(cancel=exc_type is not None)
+        return False
+
+    def full(self, path: str) -> Optional[str]:
+        try:
+            return hash_file(path, self.algorithm, self.buffer_size)
+        except (PermissionError, OSError):
+            return None
+
+    def partial(self, path: str, size: int) -> Optional[str]:
+        try:
+            return hash_head_tail(path, size, self.algorithm)
+        except (PermissionError, OSError):
+            return None
+
+    def submit_partial(self, path: str, size: int):
+        return self._pool.submit(self.partial, path, size)
+
+    def map_full(self, paths: Iterable[str]) -> Iterator[Tuple[str, Optional[str]]]:
+        """Digest completi di `paths`, restituiti come (path, digest) in ordine di completamento."""
+        return self._map(((p, self.full, (p,)) for p in paths))
+
+    def _map(self, jobs) -> Iterator[Tuple[str, Optional[str]]]:
+        # Finestra limitata di richieste in volo: memoria costante anche su 500k file
+        window = self.max_workers * 4
+        pending = {}
+        jobs = iter(jobs)
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < window:
+                try:
+                    key, fn, args = next(jobs)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[self._pool.submit(fn, *args)] = key
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield pending.pop(fut), fut.result()
+
+    def shutdown(self, cancel: bool = False) -> None:
+        self._pool.shutdown(wait=not cancel, cancel_futures=cancel)
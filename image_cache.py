@@ -0,0 +1,122 @@
+"""image_cache.py
+
+Cache LRU condivisa delle immagini già decodificate.
+
+La stessa foto viene decodificata più volte dall'interfaccia: anteprime delle card e
+dei gruppi, zoom, mappa differenze e pannello tecnico. Qui ogni rappresentazione
+(anteprima, decodifica ridotta per lo zoom, finestra a piena risoluzione, ...) viene tenuta
+in memoria una sola volta per processo, con chiave (percorso, mtime, dimensione
+del file, variante): se il file cambia su disco la voce vecchia non viene più
+trovata e invecchia fino all'espulsione.
+
+Il limite è in byte e non in numero di voci: un'anteprima da 400 pixel e una
+finestra da 2048 pixel pesano in modo molto diverso. Gli originali interi non
+passano di qui (una foto da 40 MP decodificata occupa 160 MB).
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def estimate_nbytes(value: Any) -> int:
+    """Occupazione in memoria (approssimata) di una rappresentazione decodificata."""
+    if value is None:
+        return 0
+    if hasattr(value, "nbytes"):  # numpy.ndarray
+        return int(value.nbytes)
+    if hasattr(value, "sizeInBytes"):  # QImage
+        return int(value.sizeInBytes())
+    if hasattr(value, "getbands"):  # PIL.Image
+        return value.width * value.height * len(value.getbands())
+    if hasattr(value, "depth") and hasattr(value, "width"):  # QPixmap
+        return value.width() * value.height() * max(1, value.depth() // 8)
+    return 64  # tuple di metadati e simili
+
+
+class ImageCache:
+    """LRU con limite in byte, condivisa tra thread (analisi e interfaccia).
+
+    Il caricamento avviene fuori dal lock: due thread che chiedono la stessa voce
+    nello stesso istante possono decodificarla entrambi, ma la cache resta coerente.
+    I valori restituiti sono condivisi e non vanno modificati sul posto.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(path: str, variant: Hashable) -> Optional[tuple]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (path, st.st_mtime_ns, st.st_size, variant)
+
+    def get(self, path: str, variant: Hashable, loader: Callable[[str], Any],
+            sizeof: Callable[[Any], int] = estimate_nbytes) -> Any:
+        """Restituisce la variante `variant` di `path`, chiamando `loader(path)` solo se assente.
+
+        Blindatura: se il file non esiste più il loader viene chiamato senza cache
+        (decide lui se restituire None o sollevare).
+        """
+        key = self.make_key(path, variant)
+        if key is None:
+            return loader(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[0]
+            self.stats["misses"] += 1
+        value = loader(path)
+        size = sizeof(value)
+        # Valori nulli (file illeggibili) o più grandi dell'intera cache non vengono memorizzati
+        if value is None or size > self.max_bytes:
+            return value
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            self._evict()
+        return value
+
+    def _evict(self) -> None:
+        while self.bytes > self.max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.bytes -= size
+            self.stats["evictions"] += 1
+
+    def resize(self, max_bytes: int) -> None:
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"voci={len(self._entries)}, {self.bytes / 1024 / 1024:.1f}/{self.max_bytes / 1024 / 1024:.0f} MB, "
+                f"hit={s['hits']}, miss={s['misses']}, espulse={s['evictions']}")
+
+
+# Istanza di processo usata da ui_components.py (gli hash di Fase 2 si calcolano in altri processi)
+IMAGE_CACHE = ImageCache()
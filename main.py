@@ -1,4 +1,5 @@
-import sys, os, json, shutil, time, hashlib
+import sys, os, json, shutil, time, hashlib, queue, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from PySide6.QtWidgets import (QApplication, QMainWindow, QFileDialog, QVBoxLayout, 
                              QWidget, QPushButton, QScrollArea, QProgressBar, 
                              QHBoxLayout, QLabel, QFrame, QMessageBox, QComboBox, QDialog)
@@ -10,9 +11,15 @@ BATCH_SIZE = 100  # Dimensione lotto per aggiornamento UI e riordinamento
 PHASH_THRESHOLD = 12 # Sensibilità analisi visiva
 
 # Importazioni dai moduli di progetto
-from analyzer import AnalyzerEngine
-from session_manager import MediaPair
-from ui_components import ComparisonCard, VideoComparisonCard 
+from analyzer import AnalyzerEngine, HashCascade, RECORD_HASHES, DIHEDRAL_VARIANTS, hash_images_chunk
+from hashing import HashEngine, covers_whole_file
+from file_catalog import open_catalog
+from scanner import MediaScanner
+from hash_index import MAX_BAND_BITS, estimate_recall
+from hash_store import LEGACY_ENGINES, create_store, build_index
+from orb_verifier import OrbVerifier, OrbLibraryIndex, orb_descriptors_chunk, descriptors_from_bytes
+from session_manager import MediaPair, MediaGroup, group_matches
+from ui_components import ComparisonCard, VideoComparisonCard, GroupComparisonCard, cached_image_size
 
 # Ottimizzazione OpenCV
 import cv2
@@ -58,18 +65,102 @@ class AnalysisWorker(QThread):
         except Exception:
             pass
 
-    def get_md5(self, fname):
-        # Blindatura: Gestione file non accessibili o permessi negati
+    def _iter_image_records(self, paths, workers, worker=hash_images_chunk, chunk_size=None):
+        """(path, risultato, errore) di `worker` su blocchi di `paths`, in ordine di completamento.
+
+        Chiudere il generatore (abort) annulla i blocchi in coda.
+        """
+        if not paths:
+            return
+        if workers <= 1:
+            for path in paths:
+                yield from worker([path])
+            return
+        chunk_size = chunk_size or max(1, min(64, len(paths) // (workers * 8)))
+        chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+        executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            pending = {}
+            next_chunk = 0
+            while pending or next_chunk < len(chunks):
+                while next_chunk < len(chunks) and len(pending) < workers * 2:
+                    pending[executor.submit(worker, chunks[next_chunk])] = chunks[next_chunk]
+                    next_chunk += 1
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    chunk = pending.pop(fut)
+                    try:
+                        results = fut.result()
+                    except Exception as e:
+                        # Blindatura: un processo terminato in modo anomalo invalida solo il suo blocco
+                        results = [(path, None, str(e)) for path in chunk]
+                    yield from results
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _load_cascade_hashes(self, path, names, file_stats):
+        """Hash di verifica di `path` calcolati su richiesta della cascata e salvati nel catalogo."""
         try:
-            hash_md5 = hashlib.md5()
-            with open(fname, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-            return hash_md5.hexdigest()
-        except (PermissionError, OSError):
-            return None
+            record = AnalyzerEngine.get_cascade_hashes(path, names)
+        except Exception as error:
+            # Senza hash lo stadio viene saltato, come per i cataloghi delle versioni precedenti
+            self._log_event("PHASE2_ERROR", f"Hash di verifica non calcolabili per {os.path.basename(path)}: {error}")
+            return {}
+        self.catalog.update(path, file_stats.get(path), **record)
+        return AnalyzerEngine.hash_codes(record)
+
+    def _find_crop_matches(self, store, workers, file_stats, matches):
+        """Coppie (record_a, record_b, dist pHash, voti) trovate dall'indice ORB di libreria.
+
+        I descrittori vengono letti dal catalogo (colonna `orb`, condivisa con la verifica
+        ORB) e calcolati in parallelo solo per le immagini mancanti. Le coppie già trovate
+        dal pHash vengono saltate.
+        """
+        index = OrbLibraryIndex(max_distance=int(self.video_settings.get('orb_crop_max_distance', 40)),
+                                min_votes=int(self.video_settings.get('orb_crop_min_votes', 30)))
+        paths = [store.path(i) for i in range(len(store))]
+        descriptors = {}
+        to_compute = []
+        for f in paths:
+            cached = self.catalog.lookup(f, file_stats.get(f))
+            if cached and cached.get("orb") is not None:
+                descriptors[f] = descriptors_from_bytes(cached["orb"])
+            else:
+                to_compute.append(f)
+        computed = self._iter_image_records(to_compute, workers, worker=orb_descriptors_chunk)
+        for f, data, error in computed:
+            if self._abort:
+                computed.close()
+                return
+            if data is None:
+                self._log_event("PHASE2_ERROR", f"Descrittori ORB non calcolabili per {os.path.basename(f)}: {error}")
+                continue
+            self.catalog.update(f, file_stats.get(f), orb=data)
+            descriptors[f] = descriptors_from_bytes(data)
+        for i, f in enumerate(paths):
+            if f in descriptors:
+                index.add(i, descriptors.pop(f))
+        index.build()
+        self._log_event("PHASE2_CROP_INDEX", f"Indice ORB di libreria: {len(index)} immagini, descrittori calcolati={len(to_compute)}, da catalogo={len(paths) - len(to_compute)}")
+
+        known = {frozenset((a, b)) for a, b, _ in matches}
+        for idx_a, idx_b, votes in index.candidate_pairs():
+            if frozenset((paths[idx_a], paths[idx_b])) in known:
+                continue
+            yield idx_a, idx_b, (int(store.phash[idx_a]) ^ int(store.phash[idx_b])).bit_count(), votes
 
     def run(self):
+        # Catalogo persistente: le scansioni successive rileggono solo i file cambiati
+        self.catalog = open_catalog(self.folder_path)
+        self.hash_store = None
+        try:
+            self._run_analysis()
+        finally:
+            self.catalog.close()
+            if self.hash_store is not None:
+                self.hash_store.close()
+
+    def _run_analysis(self):
         # --- FASE 1: MD5 ---
         self.status_update.emit("Scansione in corso (Fase 1/2)...")
         excluded_folders = {"duplicati_certi", "ELABORATE_SIMILI"}
@@ -84,37 +175,166 @@ class AnalysisWorker(QThread):
         video_exts = ('.mp4', '.mov', '.mkv', '.avi')
         img_exts = ('.png', '.jpg', '.jpeg', '.webp')
 
-        for root, dirs, files in os.walk(self.folder_path):
-            dirs[:] = [d for d in dirs if d not in excluded_folders]
-            for f in files:
-                if f == "sessione_alfa.json": continue
-                if f.lower().endswith(img_exts + video_exts):
-                    all_files.append(os.path.join(root, f))
-        
-        total_files = len(all_files)
-        if total_files == 0:
-            self.finished.emit()
-            return
+        algorithm = self.video_settings.get('hash_algorithm', 'md5')
+        io_workers = int(max(1, min(64, int(self.video_settings.get('max_io_workers', 4)))))
+        self._log_event("PHASE1_CONFIG", f"Hash: algoritmo={algorithm}, max_io_workers={io_workers}")
+
+        # Cascata a livelli: dimensione -> hash parziale testa/coda -> digest completo.
+        # Un file con dimensione unica non può avere duplicati esatti: non viene letto.
+        # La scoperta (produttore os.scandir su coda limitata) procede in parallelo all'hashing:
+        # un file entra in coda di hash appena compare un secondo file con la stessa dimensione.
+        file_stats = {}
+        size_groups = {}
+        partial_groups = {}
+        cached_full = {}
+        unreadable = set()
+        file_md5 = {}
+        ready = queue.SimpleQueue()
+        submitted = 0
+        received = 0
+        cached_count = 0
+        # Hardlink/stesso inode: ogni inode viene letto una sola volta e i link
+        # aggiuntivi vengono riportati a parte (spostarli non libera spazio)
+        inode_owner = {}
+        hardlink_groups = {}
+
+        def on_partial_done(fut, f_path):
+            # Blindatura: la callback consegna sempre un risultato, anche l'eccezione,
+            # altrimenti l'attesa dei digest in volo non terminerebbe mai
+            try:
+                result = None if fut.cancelled() else fut.result()
+            except BaseException as e:
+                result = e
+            ready.put((f_path, result))
+
+        def record_partial(f_path, partial):
+            if isinstance(partial, BaseException):
+                raise partial
+            if partial is None:
+                unreadable.add(f_path)
+                return
+            partial_groups.setdefault((file_stats[f_path].st_size, partial), []).append(f_path)
+            self.catalog.update(f_path, file_stats[f_path], partial=partial, digest=cached_full.get(f_path), digest_algo=algorithm)
+
+        scanner = MediaScanner(self.folder_path, img_exts + video_exts, excluded_dirs=excluded_folders,
+                               excluded_files={"sessione_alfa.json"}).start()
+        engine = HashEngine(algorithm=algorithm, max_workers=io_workers)
+        try:
+            for entry in scanner:
+                if self._abort:
+                    scanner.stop()
+                    engine.shutdown(cancel=True)
+                    return
+                inode_key = (entry.stat.st_dev, entry.stat.st_ino)
+                if entry.stat.st_ino and inode_key in inode_owner:
+                    hardlink_groups.setdefault(inode_owner[inode_key], []).append(entry.path)
+                    continue
+                inode_owner[inode_key] = entry.path
+                all_files.append(entry.path)
+                file_stats[entry.path] = entry.stat
+                group = size_groups.setdefault(entry.stat.st_size, [])
+                group.append(entry.path)
+                # Il primo file di una dimensione viene accodato solo quando ne arriva un secondo
+                to_queue = group if len(group) == 2 else (group[-1:] if len(group) > 2 else [])
+                for f_path in to_queue:
+                    row = self.catalog.lookup(f_path, file_stats[f_path])
+                    if row and row.get("digest_algo") == algorithm:
+                        if row.get("digest"): cached_full[f_path] = row["digest"]
+                        if row.get("partial"):
+                            partial_groups.setdefault((entry.stat.st_size, row["partial"]), []).append(f_path)
+                            cached_count += 1
+                            continue
+                    fut = engine.submit_partial(f_path, entry.stat.st_size)
+                    fut.add_done_callback(lambda fut, p=f_path: on_partial_done(fut, p))
+                    submitted += 1
+
+                # Raccolta non bloccante dei digest parziali già pronti + totali progressivi
+                while True:
+                    try:
+                        f_path, partial = ready.get_nowait()
+                    except queue.Empty:
+                        break
+                    received += 1
+                    record_partial(f_path, partial)
+                if len(all_files) % BATCH_SIZE == 0:
+                    self.progress_phase1.emit(int((received / max(1, submitted)) * 50))
+                    self.status_update.emit(f"Fase 1: {len(all_files)} file trovati, {received + cached_count} hash parziali")
+
+            total_files = len(all_files) + sum(len(links) for links in hardlink_groups.values())
+            if total_files == 0:
+                self.finished.emit()
+                return
+
+            # Fine scoperta: attendiamo i digest parziali ancora in volo
+            while received < submitted:
+                if self._abort:
+                    engine.shutdown(cancel=True)
+                    return
+                try:
+                    f_path, partial = ready.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                received += 1
+                record_partial(f_path, partial)
+                if received % BATCH_SIZE == 0:
+                    self.progress_phase1.emit(int((received / submitted) * 50))
+            self.progress_phase1.emit(50)
+
+            to_full_hash = []
+            for (f_size, partial), group in partial_groups.items():
+                if len(group) < 2: continue
+                # File piccoli: l'hash parziale copre già l'intero contenuto
+                if covers_whole_file(f_size):
+                    for f_path in group: file_md5[f_path] = partial
+                else:
+                    for f_path in group:
+                        if f_path in cached_full: file_md5[f_path] = cached_full[f_path]
+                        else: to_full_hash.append(f_path)
+
+            done = 0
+            for f_path, f_md5 in engine.map_full(to_full_hash):
+                if self._abort:
+                    engine.shutdown(cancel=True)
+                    return
+                done += 1
+                if done % BATCH_SIZE == 0:
+                    self.progress_phase1.emit(50 + int((done / len(to_full_hash)) * 50))
+                if f_md5 is None:
+                    unreadable.add(f_path)
+                    continue
+                file_md5[f_path] = f_md5
+                self.catalog.update(f_path, file_stats[f_path], digest=f_md5, digest_algo=algorithm)
+        finally:
+            # Su eccezione del consumatore il produttore non resta bloccato sulla coda piena
+            scanner.stop()
+            engine.shutdown()
+        same_size = sum(len(g) for g in size_groups.values() if len(g) > 1)
 
         md5_map = {}
         moved_count = 0
+        linked_dup_count = 0
         remaining_images = []
         remaining_videos = []
         dup_folder = os.path.join(self.folder_path, "duplicati_certi")
+        # A parità di contenuto si tiene il file con hardlink: spostare la copia semplice libera spazio
+        for f_path in all_files:
+            f_md5 = file_md5.get(f_path)
+            if f_path in hardlink_groups and f_md5 is not None and f_path not in unreadable:
+                md5_map.setdefault(f_md5, f_path)
 
-        for i, f_path in enumerate(all_files):
+        for f_path in all_files:
             if self._abort: return
-            
-            # Aggiornamento UI controllato (BATCH_SIZE)
-            if i % BATCH_SIZE == 0:
-                prog_phase1 = int(((i + 1) / total_files) * 100)
-                self.progress_phase1.emit(prog_phase1)
-            
-            # Blindatura: get_md5 gestisce internamente permessi e file corrotti
-            f_md5 = self.get_md5(f_path)
-            if f_md5 is None: continue 
-
-            if f_md5 in md5_map:
+            # Blindatura: i file non leggibili vengono esclusi come in precedenza
+            if f_path in unreadable: continue
+            f_md5 = file_md5.get(f_path)
+
+            if f_md5 is not None and md5_map.get(f_md5, f_path) != f_path and f_path in hardlink_groups:
+                # Duplicato con altri link allo stesso inode: spostarlo non libera spazio e
+                # spezzerebbe i link, quindi resta al suo posto e viene riportato a parte
+                linked_dup_count += 1
+                self._log_event("PHASE1_HARDLINK_DUP", f"Duplicato con hardlink non spostato: {os.path.basename(f_path)} (= {os.path.basename(md5_map[f_md5])})")
+                self.auto_record.emit({"file_a": md5_map[f_md5], "file_b": f_path, "score": algorithm.upper(), "decision": "DUPLICATO_MD5_HARDLINK"})
+            elif f_md5 is not None and md5_map.get(f_md5, f_path) != f_path:
                 try:
                     if not os.path.exists(dup_folder): os.makedirs(dup_folder)
                     base_name = os.path.basename(f_path)
@@ -125,57 +345,160 @@ class AnalysisWorker(QThread):
                         dest = os.path.join(dup_folder, f"{name_part}({counter}){extension}")
                         counter += 1
                     shutil.move(f_path, dest)
+                    self.catalog.forget(f_path)
                     moved_count += 1
-                    self.auto_record.emit({"file_a": md5_map[f_md5], "file_b": dest, "score": "MD5", "decision": "DUPLICATO_CERTO_MD5"})
+                    self.auto_record.emit({"file_a": md5_map[f_md5], "file_b": dest, "score": algorithm.upper(), "decision": "DUPLICATO_CERTO_MD5"})
                 except: continue
             else:
-                md5_map[f_md5] = f_path
+                if f_md5 is not None:
+                    md5_map[f_md5] = f_path
                 if f_path.lower().endswith(video_exts):
                     remaining_videos.append(f_path)
                 else:
                     remaining_images.append(f_path)
 
+        hardlink_count = 0
+        for owner, links in hardlink_groups.items():
+            hardlink_count += len(links)
+            self._log_event("PHASE1_HARDLINK", f"Stesso inode: {os.path.basename(owner)} <-> {', '.join(os.path.basename(l) for l in links)}")
+            for link in links:
+                self.auto_record.emit({"file_a": owner, "file_b": link, "score": "INODE", "decision": "HARDLINK"})
+
+        self.catalog.commit()
+        self._log_event("PHASE1_END", f"File totali={total_files}, stessa dimensione={same_size}, MD5 completi={len(file_md5)}, da catalogo={cached_count}, duplicati={moved_count}, duplicati con hardlink={linked_dup_count}, hardlink={hardlink_count}")
+
         # Completiamo la progress bar di fase 1 al 100% per coerenza UX
         self.progress_phase1.emit(100)
-        self.phase1_done.emit({"total": total_files, "moved": moved_count})
+        self.phase1_done.emit({"total": total_files, "moved": moved_count, "hardlinks": hardlink_count})
         
         # --- FASE 2: pHash per IMMAGINI ---
         self.status_update.emit("Analisi visiva profonda (Immagini)...")
         self._log_event("PHASE2_START", f"Inizio Phase 2: {len(remaining_images)} immagini da analizzare")
-        hashes = {}
+        # Stadio A: hash di tutte le immagini nell'indice. Stadio B: coppie entro soglia dall'indice
+        # (indici di Hamming o kernel NumPy a blocchi) invece del confronto con tutte le precedenti
+        phash_engine = self.video_settings.get('phash_engine', 'mih')
+        # Impostazioni salvate con `bktree`/`linear`: sull'archivio equivalgono a `mih`
+        phash_engine = LEGACY_ENGINES.get(phash_engine, phash_engine)
+        hash_workers = int(max(1, min(64, int(self.video_settings.get('max_hash_workers', 4)))))
+        # Varianti ruotate/ribaltate nell'indice: copie ruotate o specchiate con una sola query
+        dihedral = bool(self.video_settings.get('phash_dihedral', True))
+        engine_options = {}
+        if phash_engine == 'lsh':
+            # Modalità approssimata: bande x bit per banda configurabili, entro i 64 bit dell'hash
+            # e i MAX_BAND_BITS bit per banda dell'indice compatto
+            bands = max(1, min(64, int(self.video_settings.get('lsh_bands', 5))))
+            rows = max(1, min(int(self.video_settings.get('lsh_rows', 12)), 64 // bands, MAX_BAND_BITS))
+            engine_options = {'bands': bands, 'rows': rows}
+        # Hash in un archivio mappato in memoria (record fissi, uno slot per immagine in ordine di scansione)
+        store = self.hash_store = create_store(self.folder_path)
+        store.reserve(len(remaining_images))
+        scan_pos = {f: i for i, f in enumerate(remaining_images)}
+        catalog_hits = 0
         total_rem = len(remaining_images)
-        
+        self._log_event("PHASE2_CONFIG", f"Motore pHash: {phash_engine}, soglia={PHASH_THRESHOLD}, max_hash_workers={hash_workers}, rotazioni/ribaltamenti={'si' if dihedral else 'no'}")
+
+        # Hash dal catalogo; le immagini mancanti vengono decodificate in parallelo su più processi
+        to_decode = []
         for i, f in enumerate(remaining_images):
-            if self._abort: return
-            
-            try:
-                # Blindatura pHash: saltiamo file che PIL/OpenCV non riescono a decodificare
-                h = AnalyzerEngine.get_perceptual_data(f)
-                if h is None: 
-                    self._log_event("PHASE2_SKIP", f"Saltato (non decodificabile): {os.path.basename(f)}")
-                    continue
-                
-                match_count = 0
-                for path_ref, h_ref in hashes.items():
-                    dist = h - h_ref
-                    if dist < PHASH_THRESHOLD:
-                        self.pair_found.emit(MediaPair(path_ref, f, dist))
-                        self._log_event("PHASE2_MATCH", f"Match trovato: {os.path.basename(path_ref)} <-> {os.path.basename(f)} (dist={dist})")
-                        match_count += 1
-                
-                hashes[f] = h
-                if match_count == 0:
-                    self._log_event("PHASE2_ANALYZE", f"Analizzato: {os.path.basename(f)} (hash={h})")
-            except Exception as e:
-                self._log_event("PHASE2_ERROR", f"Errore per {os.path.basename(f)}: {str(e)}")
-                continue
-            
-            # Progress Phase 2: 0-100%
-            prog_phase2 = int(((i + 1) / total_rem) * 100) if total_rem > 0 else 100
-            self.progress_phase2.emit(prog_phase2)
+            cached = self.catalog.lookup(f, file_stats.get(f))
+            if cached and all(cached.get(k) for k in RECORD_HASHES):
+                store.put(i, f, AnalyzerEngine.hash_codes(cached))
+                self._log_event("PHASE2_ANALYZE", f"Dal catalogo: {os.path.basename(f)} (hash={cached['phash']})")
+                catalog_hits += 1
+            else:
+                to_decode.append(f)
+
+        done = catalog_hits
+        records = self._iter_image_records(to_decode, hash_workers)
+        for f, record, error in records:
+            if self._abort:
+                records.close()
+                return
+            done += 1
+            # Blindatura pHash: saltiamo file che PIL/OpenCV non riescono a decodificare
+            if record is None:
+                self._log_event("PHASE2_ERROR", f"Errore per {os.path.basename(f)}: {error}")
+            else:
+                store.put(scan_pos[f], f, AnalyzerEngine.hash_codes(record))
+                self.catalog.update(f, file_stats.get(f), **record)
+                self._log_event("PHASE2_ANALYZE", f"Analizzato: {os.path.basename(f)} (hash={record['phash']})")
+            # Progress Phase 2: 0-90% hashing, 90-100% ricerca coppie
+            if done % 10 == 0 or done == total_rem:
+                self.progress_phase2.emit(int((done / total_rem) * 90))
+
+        del scan_pos
+        # Slot delle immagini non decodificabili rimossi; l'ordine di scansione rende le coppie deterministiche
+        store.compact()
+        store.flush()
+
+        # Verifica a posteriori: le coppie già entro soglia pHash passano prefiltro aHash/dHash e, se di confine, wHash;
+        # questi hash si calcolano solo per le immagini delle coppie candidate
+        cascade = HashCascade(
+            hash_loader=lambda path, names: self._load_cascade_hashes(path, names, file_stats),
+            phash_threshold=PHASH_THRESHOLD,
+            prefilter=self.video_settings.get('cascade_prefilter', 'dhash'),
+            prefilter_threshold=int(self.video_settings.get('cascade_prefilter_threshold', 20)),
+            whash_band=int(self.video_settings.get('cascade_whash_band', 3)),
+            whash_threshold=int(self.video_settings.get('cascade_whash_threshold', 12)),
+            # Verifica ORB opzionale per la zona grigia; descrittori in cache nel catalogo
+            verifier=OrbVerifier(self.catalog, min_matches=int(self.video_settings.get('orb_min_matches', 25)))
+            if self.video_settings.get('orb_verify', False) else None,
+            orb_zone=(int(self.video_settings.get('orb_zone_min', 8)), int(self.video_settings.get('orb_zone_max', 11))),
+        )
+        matches = []
+        scan_order = {}
+        # Indice e ricerca coppie protetti: una configurazione non valida non deve bloccare il worker
+        try:
+            hashes = build_index(store, phash_engine, dihedral=dihedral, **engine_options)
+            self.progress_phase2.emit(90)
+            if dihedral:
+                candidates = hashes.oriented_pairs(PHASH_THRESHOLD - 1)
+            else:
+                candidates = ((a, b, d, 0) for a, b, d in hashes.pairs(PHASH_THRESHOLD - 1))
+            for idx_ref, idx, dist, variant in cascade.filter_pairs(store, candidates):
+                if self._abort: return
+                path_ref, f = store.path(idx_ref), store.path(idx)
+                matches.append((path_ref, f, dist))
+                scan_order[path_ref], scan_order[f] = idx_ref, idx
+                orientation = f", orientamento={DIHEDRAL_VARIANTS[variant][0]}" if variant else ""
+                self._log_event("PHASE2_MATCH", f"Match trovato: {os.path.basename(path_ref)} <-> {os.path.basename(f)} (dist={dist}{orientation})")
+            if phash_engine == 'lsh':
+                # Richiamo dell'LSH rispetto alla ricerca esatta, stimato su un campione di immagini
+                base_index = hashes.base if dihedral else hashes
+                recall, exact, found = estimate_recall(base_index, PHASH_THRESHOLD - 1)
+                self._log_event("PHASE2_LSH", f"LSH bande={engine_options['bands']}x{engine_options['rows']} bit: richiamo stimato {recall:.1%} ({found}/{exact} vicini sul campione)")
+        except Exception as e:
+            self._log_event("PHASE2_EXCEPTION", f"Errore ricerca coppie Phase 2: {str(e)}")
+            self.status_update.emit(f"Errore in Phase 2: {str(e)}")
+        match_count = len(matches)
+
+        crop_count = 0
+        if self.video_settings.get('orb_crop_search', False):
+            # Ritagli e screenshot: indice ORB su tutta la libreria, una query per immagine
+            for idx_ref, idx, dist, votes in self._find_crop_matches(store, hash_workers, file_stats, matches):
+                if self._abort: return
+                path_ref, f = store.path(idx_ref), store.path(idx)
+                matches.append((path_ref, f, dist))
+                scan_order[path_ref], scan_order[f] = idx_ref, idx
+                crop_count += 1
+                self._log_event("PHASE2_CROP", f"Ritaglio/screenshot: {os.path.basename(path_ref)} <-> {os.path.basename(f)} (voti ORB={votes}, dist pHash={dist})")
+
+        # Union-find sul grafo dei match: una raffica di 20 scatti è un solo gruppo invece di 190 coppie
+        group_count = 0
+        for item in group_matches(matches, order=scan_order):
+            if isinstance(item, MediaGroup):
+                group_count += 1
+                self._log_event("PHASE2_GROUP", f"Gruppo di {len(item.paths)} immagini: {', '.join(os.path.basename(p) for p in item.paths)} (dist max={item.score})")
+            self.pair_found.emit(item)
+        self.progress_phase2.emit(100)
         
-        self._log_event("PHASE2_END", f"Fine Phase 2: totali immagini elaborate={len(hashes)}")
-        self.status_update.emit(f"Phase 2 conclusa: {len(hashes)} immagini analizzate")
+        self.catalog.commit()
+        self._log_event("PHASE2_CASCADE", f"Cascata hash: {cascade.summary()}")
+        if cascade.verifier is not None:
+            orb_stats = cascade.verifier.stats
+            self._log_event("PHASE2_ORB", f"Descrittori ORB: calcolati={orb_stats['computed']}, da memoria={orb_stats['memory_hits']}, da catalogo={orb_stats['disk_hits']}")
+        self._log_event("PHASE2_END", f"Fine Phase 2: totali immagini elaborate={len(store)}, da catalogo={catalog_hits}, match={match_count}, ritagli={crop_count}, gruppi={group_count}")
+        self.status_update.emit(f"Phase 2 conclusa: {len(store)} immagini analizzate")
         # Notifica il MainThread che la Phase 2 è finita
         try:
             self.phase2_done.emit()
@@ -186,43 +509,75 @@ class AnalysisWorker(QThread):
         if remaining_videos:
             try:
                 # Parallelizziamo i confronti video ma applichiamo filtri preliminari per ridurre O(N^2)
-                from video_analyzer import VideoAnalyzer, is_candidate_pair
+                from video_analyzer import (VideoAnalyzer, VideoMeta, HashProvider, probe_video, sweep_candidate_pairs,
+                                            fingerprint_videos_chunk, unpack_fingerprint, KeyframeIndex)
+                from functools import partial
                 from concurrent.futures import ThreadPoolExecutor, as_completed
                 import multiprocessing
 
                 duration_tol = float(self.video_settings.get('duration_tol', 0.02))
                 res_tol = float(self.video_settings.get('res_tol', 0.05))
                 score_thr = float(self.video_settings.get('score_threshold', 0.6))
+                use_keyframe_index = bool(self.video_settings.get('video_keyframe_index', False))
+                use_alignment = bool(self.video_settings.get('video_alignment', False))
                 max_workers = int(max(1, min(32, int(self.video_settings.get('max_workers', max(1, min(8, multiprocessing.cpu_count() or 2)))))))
 
                 self._log_event("PHASE3_START", f"Inizio Phase 3: {len(remaining_videos)} video da analizzare")
                 self._log_event("PHASE3_CONFIG", f"Filtri: duration_tol={duration_tol*100:.1f}%, res_tol={res_tol*100:.1f}%, score_thr={score_thr*100:.0f}%, max_workers={max_workers}")
 
+                # Digest della Fase 1 riusati, cache impronte su (dimensione, mtime, inode): nessun video
+                # viene riletto per intero in Fase 3 (i duplicati esatti sono già stati separati)
                 va = VideoAnalyzer(scene_threshold=self.video_settings.get('scene_threshold', 30),
-                                   match_hamming_thresh=int(self.video_settings.get('match_hamming_thresh', 10)))
+                                   match_hamming_thresh=int(self.video_settings.get('match_hamming_thresh', 10)),
+                                   hash_provider=HashProvider(known=file_md5, algorithm=algorithm, allow_full_read=False))
 
                 self.status_update.emit("Analisi video in corso (filtri + parallela)...")
                 nv = len(remaining_videos)
 
-                # Costruiamo la lista di candidate pair dopo i filtri rapidi
                 candidate_pairs = []
-                screened_count = 0
-                
-                # Pre-filtra: rimuovi video corrotti o non leggibili
-                valid_videos = []
+
+                # Metadati letti una sola volta per video: dal catalogo o, per i mancanti, sondati in parallelo
+                metas = {}
+                to_probe = []
                 for video_path in remaining_videos:
+                    cached = self.catalog.lookup(video_path, file_stats.get(video_path))
+                    if cached and all(cached.get(k) is not None for k in ("duration", "fps", "video_width", "video_height")):
+                        metas[video_path] = VideoMeta(video_path, cached["duration"], cached["fps"],
+                                                      cached["video_width"], cached["video_height"])
+                    else:
+                        to_probe.append(video_path)
+                if to_probe:
+                    ex = ThreadPoolExecutor(max_workers=max_workers)
                     try:
-                        from video_analyzer import get_duration_and_fps
-                        dur, fps = get_duration_and_fps(video_path)
-                        if dur > 0 and fps > 0:
-                            valid_videos.append(video_path)
-                        else:
-                            self._log_event("PHASE3_SKIP", f"Video invalido (dur={dur}, fps={fps}): {os.path.basename(video_path)}")
-                    except Exception as e:
-                        self._log_event("PHASE3_SKIP", f"Video corrotto/illeggibile: {os.path.basename(video_path)} ({str(e)[:50]})")
+                        futures = {ex.submit(probe_video, p): p for p in to_probe}
+                        for fut in as_completed(futures):
+                            if self._abort: break
+                            video_path = futures[fut]
+                            # Pre-filtra: rimuovi video corrotti o non leggibili
+                            try:
+                                meta = fut.result()
+                            except Exception as e:
+                                self._log_event("PHASE3_SKIP", f"Video corrotto/illeggibile: {os.path.basename(video_path)} ({str(e)[:50]})")
+                                continue
+                            self.catalog.update(video_path, file_stats.get(video_path), duration=meta.duration, fps=meta.fps,
+                                                video_width=meta.width, video_height=meta.height)
+                            metas[video_path] = meta
+                    finally:
+                        ex.shutdown(wait=True, cancel_futures=True)
+
+                valid_videos = []
+                for video_path in remaining_videos:
+                    meta = metas.get(video_path)
+                    if meta is None:
+                        continue
+                    if meta.duration > 0 and meta.fps > 0:
+                        valid_videos.append(video_path)
+                    else:
+                        self._log_event("PHASE3_SKIP", f"Video invalido (dur={meta.duration}, fps={meta.fps}): {os.path.basename(video_path)}")
                 
+                self.catalog.commit()
                 nv_valid = len(valid_videos)
-                self._log_event("PHASE3_VALIDATION", f"Video validi: {nv_valid}/{nv}")
+                self._log_event("PHASE3_VALIDATION", f"Video validi: {nv_valid}/{nv} (da catalogo={nv - len(to_probe)})")
                 
                 if nv_valid == 0:
                     self.status_update.emit("Nessun video valido per l'analisi.")
@@ -231,66 +586,127 @@ class AnalysisWorker(QThread):
                 else:
                     remaining_videos = valid_videos
                 
-                    # Costruiamo la lista di candidate pair dopo i filtri rapidi
-                    total_pairs_to_check = int(nv_valid * (nv_valid - 1) / 2) if nv_valid > 1 else 1
-                    
-                    for i in range(nv_valid):
+                    # Finestra scorrevole sulle durate ordinate: solo le coppie entro duration_tol,
+                    # risoluzione confrontata sui metadati in memoria (nessuna apertura dei file)
+                    scan_index = {p: i for i, p in enumerate(remaining_videos)}
+                    for meta_a, meta_b in sweep_candidate_pairs((metas[p] for p in remaining_videos), duration_tol, res_tol):
                         if self._abort: break
-                        a = remaining_videos[i]
-                        for j in range(i + 1, nv_valid):
-                            b = remaining_videos[j]
-                            try:
-                                if is_candidate_pair(a, b, duration_tol=duration_tol, res_tol=res_tol):
-                                    candidate_pairs.append((a, b))
-                                    self._log_event("PHASE3_CANDIDATE", f"Match criteri metadata: {os.path.basename(a)} <-> {os.path.basename(b)}")
-                            except Exception as e:
-                                self._log_event("PHASE3_CANDIDATE_ERROR", f"Errore screening: {os.path.basename(a)} vs {os.path.basename(b)}: {str(e)[:50]}")
-                            screened_count += 1
-                            # Progress Phase 3: Screening 0-20%
-                            prog = int((screened_count / total_pairs_to_check) * 20) if total_pairs_to_check > 0 else 20
-                            self.progress_phase3.emit(prog)
-                            if screened_count % 100 == 0:
-                                self.status_update.emit(f"Screening: {screened_count}/{total_pairs_to_check} coppie")
+                        candidate_pairs.append(tuple(sorted((meta_a.path, meta_b.path), key=scan_index.get)))
+                    # Ordine di scansione come nel confronto a coppie: log e risultati deterministici
+                    candidate_pairs.sort(key=lambda pair: (scan_index[pair[0]], scan_index[pair[1]]))
+                    for a, b in candidate_pairs:
+                        self._log_event("PHASE3_CANDIDATE", f"Match criteri metadata: {os.path.basename(a)} <-> {os.path.basename(b)}")
+                    # Progress Phase 3: Screening 0-20%
+                    self.progress_phase3.emit(20)
 
                 total_candidates = len(candidate_pairs)
                 self._log_event("PHASE3_SCREENING_DONE", f"Coppie candidate trovate: {total_candidates} su {int(nv * (nv - 1) / 2)}")
+                # Indice dei keyframe di inquadratura: tutti i video validi, senza filtri di durata/risoluzione
+                index_videos = valid_videos if use_keyframe_index and nv_valid > 1 else []
                 
-                if total_candidates == 0:
+                if total_candidates == 0 and not index_videos:
                     self.status_update.emit("Nessuna coppia candidata per i video.")
                     self._log_event("PHASE3_END", "Phase 3 completata: nessuna coppia da analizzare")
                 else:
-                    # Eseguiamo i confronti in parallelo con pool
-                    with ThreadPoolExecutor(max_workers=max_workers) as ex:
-                        futures = {ex.submit(va.compare_videos, a, b, [5,20,45,65,80], 60.0, self.video_settings.get('match_ratio_thresh', 0.6)): (a, b) for a, b in candidate_pairs}
-                        completed = 0
-                        matched_count = 0
+                    # Stadio A: un'impronta per video, non una per coppia, su un pool di processi
+                    # (decodifica, resize e hash senza contesa sul GIL)
+                    percents = [5, 20, 45, 65, 80]
+                    duration_cutoff = 60.0
+                    match_ratio = self.video_settings.get('match_ratio_thresh', 0.6)
+                    # Prima i video più lunghi: nessun video lungo resta da solo in coda alla fine
+                    to_fingerprint = sorted({p for pair in candidate_pairs for p in pair} | set(index_videos),
+                                            key=lambda p: (-metas[p].duration, scan_index[p]))
+                    fp_workers = min(max_workers, len(to_fingerprint))
+                    config = {"scene_threshold": va.scene_threshold, "frame_hash_size": va.frame_hash_size,
+                              "percents": percents, "duration_cutoff": duration_cutoff, "duration_tol": duration_tol,
+                              # Le coppie dell'indice keyframe si confermano sempre con l'allineamento: serve la sequenza densa
+                              "extra_modes": (["shots"] if index_videos else []) + (["dense"] if use_alignment or index_videos else []),
+                              # Thread OpenCV per processo: i core divisi tra i worker (nessun limite senza pool)
+                              "cv_threads": max(1, (multiprocessing.cpu_count() or 1) // fp_workers) if fp_workers > 1 else None}
+                    params = va.fingerprint_params(percents)
+                    fingerprints = {}
+                    records = self._iter_image_records(to_fingerprint, fp_workers,
+                                                       worker=partial(fingerprint_videos_chunk, config=config), chunk_size=1)
+                    try:
+                        for done, (video_path, packed, error) in enumerate(records, 1):
+                            if self._abort: break
+                            if error is None:
+                                fingerprints[video_path] = unpack_fingerprint(packed, params)
+                            else:
+                                self._log_event("PHASE3_ERROR", f"Errore impronta {os.path.basename(video_path)}: {error[:100]}")
+                            # Progress Phase 3: Impronte 20-90%
+                            self.progress_phase3.emit(20 + int((done / len(to_fingerprint)) * 70))
+                    finally:
+                        records.close()
+                    self._log_event("PHASE3_FINGERPRINTS", f"Impronte calcolate: {len(fingerprints)}/{len(to_fingerprint)} video in {total_candidates} coppie")
+
+                    # Stadio B: confronto dei soli vettori di hash, nessuna decodifica
+                    matched_count = 0
+                    for completed, (a, b) in enumerate(candidate_pairs, 1):
+                        if self._abort:
+                            break
+                        if a not in fingerprints or b not in fingerprints:
+                            continue
+                        try:
+                            fa, fb = fingerprints[a], fingerprints[b]
+                            res = va.compare_fingerprints(fa, fb, duration_cutoff, match_ratio)
+                            # Posizioni fisse insufficienti: allineamento della sequenza densa (intro, tagli, velocità)
+                            if use_alignment and res['score'] < score_thr and "dense" in fa and "dense" in fb:
+                                aligned = va.align_fingerprints(fa, fb, match_ratio)
+                                if aligned['score'] > res['score']:
+                                    res = aligned
+                            score = float(res.get('score', 0.0))
+                            matched_frames = res.get('matched', 0)
+                            total_frames = res.get('total', 0)
+                            
+                            if score >= score_thr:
+                                score_int = int(round(score * 100))
+                                self.pair_found.emit(MediaPair(a, b, score_int))
+                                matched_count += 1
+                                alignment = f", offset={res['offset']:+.1f}s, scala={res['scale']:.3f}, sovrapposizione={res['overlap_ratio']:.0%}" if 'offset' in res else ""
+                                self._log_event("PHASE3_MATCH", f"Match video: {os.path.basename(a)} <-> {os.path.basename(b)} (score={score:.2f}, matched={matched_frames}/{total_frames}{alignment})")
+                            else:
+                                self._log_event("PHASE3_NO_MATCH", f"No match: {os.path.basename(a)} <-> {os.path.basename(b)} (score={score:.2f}, soglia={score_thr:.2f})")
+                        except Exception as e:
+                            self._log_event("PHASE3_ERROR", f"Errore compare {os.path.basename(a)} vs {os.path.basename(b)}: {str(e)[:100]}")
                         
-                        for fut in as_completed(futures):
+                        # Progress Phase 3: Confronti 90-100%
+                        if completed % 100 == 0 or completed == total_candidates:
+                            self.progress_phase3.emit(90 + int((completed / total_candidates) * 10))
+                    
+                    # Stadio C: coppie trovate solo dall'indice dei keyframe (copie accorciate o rimontate)
+                    if index_videos and not self._abort:
+                        index = KeyframeIndex(max_dist=va.match_hamming_thresh,
+                                              min_shared=int(self.video_settings.get('video_index_min_shared', 2)),
+                                              bits=va.frame_hash_size ** 2)
+                        for video_path in index_videos:
+                            if "shots" in fingerprints.get(video_path, {}):
+                                index.add(video_path, [h for _, h in fingerprints[video_path]["shots"]])
+                        counts = dict(zip(index.keys, index.counts))
+                        already = set(candidate_pairs)
+                        index_pairs = [(a, b, shared) for a, b, shared in index.candidate_pairs()
+                                       if (a, b) not in already and (b, a) not in already]
+                        self._log_event("PHASE3_INDEX", f"Indice keyframe: {len(index)} video, {len(index_pairs)} coppie nuove per inquadrature condivise")
+                        for a, b, shared in index_pairs:
                             if self._abort:
                                 break
-                            a, b = futures[fut]
                             try:
-                                res = fut.result()
-                                score = float(res.get('score', 0.0))
-                                matched_frames = res.get('matched', 0)
-                                total_frames = res.get('total', 0)
-                                
+                                fa, fb = fingerprints[a], fingerprints[b]
+                                # Inquadrature condivise = solo candidati: lo score è la quota di fotogrammi
+                                # allineati (offset e scala) rispetto al video più corto
+                                aligned = va.align_fingerprints(fa, fb, match_ratio)
+                                score = aligned['score']
+                                detail = f"keyframe={shared}/{min(counts[a], counts[b])}, offset={aligned['offset']:+.1f}s, sovrapposizione={aligned['overlap_ratio']:.0%}"
                                 if score >= score_thr:
-                                    score_int = int(round(score * 100))
-                                    self.pair_found.emit(MediaPair(a, b, score_int))
+                                    self.pair_found.emit(MediaPair(a, b, int(round(score * 100))))
                                     matched_count += 1
-                                    self._log_event("PHASE3_MATCH", f"Match video: {os.path.basename(a)} <-> {os.path.basename(b)} (score={score:.2f}, matched={matched_frames}/{total_frames})")
+                                    self._log_event("PHASE3_REEDIT", f"Match video (inquadrature): {os.path.basename(a)} <-> {os.path.basename(b)} (score={score:.2f}, {detail})")
                                 else:
-                                    self._log_event("PHASE3_NO_MATCH", f"No match: {os.path.basename(a)} <-> {os.path.basename(b)} (score={score:.2f}, soglia={score_thr:.2f})")
+                                    self._log_event("PHASE3_NO_MATCH", f"No match (inquadrature): {os.path.basename(a)} <-> {os.path.basename(b)} (score={score:.2f}, {detail})")
                             except Exception as e:
-                                self._log_event("PHASE3_ERROR", f"Errore compare {os.path.basename(a)} vs {os.path.basename(b)}: {str(e)[:100]}")
-                                pass
-                            
-                            completed += 1
-                            # Progress Phase 3: Comparisons 20-100%
-                            prog = 20 + int((completed / total_candidates) * 80)
-                            self.progress_phase3.emit(prog)
-                    
+                                self._log_event("PHASE3_ERROR", f"Errore allineamento {os.path.basename(a)} vs {os.path.basename(b)}: {str(e)[:100]}")
+                        total_candidates += len(index_pairs)
+
                     self._log_event("PHASE3_END", f"Phase 3 completata: {matched_count} match su {total_candidates} coppie")
             except Exception as e:
                 self._log_event("PHASE3_EXCEPTION", f"Errore critico Phase 3: {str(e)}")
@@ -328,6 +744,27 @@ class MainWindow(QMainWindow):
             'res_tol': 0.20,           # 20% (da 5%)
             'score_threshold': 0.35,   # 35% (da 60%)
             'max_workers': max(1, min(8, os.cpu_count() or 2)),
+            'max_io_workers': 4,
+            'hash_algorithm': 'md5',
+            'phash_engine': 'mih',
+            'max_hash_workers': max(1, min(8, os.cpu_count() or 2)),
+            'cascade_prefilter': 'dhash',
+            'cascade_prefilter_threshold': 20,
+            'cascade_whash_band': 3,
+            'cascade_whash_threshold': 12,
+            'phash_dihedral': True,
+            'lsh_bands': 5,
+            'lsh_rows': 12,
+            'orb_verify': False,
+            'orb_zone_min': 8,
+            'orb_zone_max': 11,
+            'orb_min_matches': 25,
+            'orb_crop_search': False,
+            'orb_crop_min_votes': 30,
+            'orb_crop_max_distance': 40,
+            'video_keyframe_index': False,
+            'video_index_min_shared': 2,
+            'video_alignment': False,
             'scene_threshold': 30,
             'match_hamming_thresh': 20, # 20 (da 10)
             'match_ratio_thresh': 0.35  # 35% (da 60%)
@@ -610,7 +1047,8 @@ class MainWindow(QMainWindow):
         QMessageBox.information(self, "Fase 1: MD5 Completata", 
                                 f"Scansione binaria terminata.\n\n"
                                 f"File totali: {stats['total']}\n"
-                                f"Duplicati identici (MD5) isolati: {stats['moved']}")
+                                f"Duplicati identici (MD5) isolati: {stats['moved']}\n"
+                                f"Hardlink (stesso file, nessuno spazio da liberare): {stats.get('hardlinks', 0)}")
 
     def _load_video_settings(self):
         """Carica le impostazioni video da file, se presente."""
@@ -669,7 +1107,9 @@ class MainWindow(QMainWindow):
             a_ext = os.path.splitext(p.path_a)[1].lower()
             b_ext = os.path.splitext(p.path_b)[1].lower()
             video_exts = ('.mp4', '.mov', '.mkv', '.avi')
-            if a_ext in video_exts and b_ext in video_exts:
+            if isinstance(p, MediaGroup):
+                card = GroupComparisonCard(p, index=(curr_idx + i))
+            elif a_ext in video_exts and b_ext in video_exts:
                 card = VideoComparisonCard(p, index=(curr_idx + i))
             else:
                 card = ComparisonCard(p, index=(curr_idx + i))
@@ -690,8 +1130,10 @@ class MainWindow(QMainWindow):
             with open(path, "r") as f:
                 data = json.load(f)
             for item in data:
-                if item['decision'] == "DUPLICATO_CERTO_MD5":
+                if item['decision'] in ("DUPLICATO_CERTO_MD5", "DUPLICATO_MD5_HARDLINK", "HARDLINK"):
                     self.auto_duplicates.append(item)
+                elif 'files' in item:
+                    self.all_pairs.append(MediaGroup.from_record(item))
                 else:
                     pair = MediaPair(item['file_a'], item['file_b'], item['score'])
                     pair.decision = item['decision']
@@ -780,7 +1222,9 @@ class MainWindow(QMainWindow):
         results = self.auto_duplicates[:]
         for i in range(self.gallery_layout.count()):
             w = self.gallery_layout.itemAt(i).widget()
-            if w:
+            if w and isinstance(w.pair, MediaGroup):
+                results.append(w.pair.to_record())
+            elif w:
                 results.append({
                     "file_a": w.pair.path_a, "file_b": w.pair.path_b,
                     "score": w.pair.score, "decision": w.pair.decision
@@ -798,14 +1242,24 @@ class MainWindow(QMainWindow):
         dest_folder = os.path.join(self.current_folder, "ELABORATE_SIMILI")
         if not os.path.exists(dest_folder): os.makedirs(dest_folder)
         count = 0
+        skipped_links = 0
         for item in data:
             d = item['decision']
             to_move = []
-            if d == "KEEP_A": to_move.append(item['file_b'])
-            elif d == "KEEP_B": to_move.append(item['file_a'])
+            kept = []
+            if d == "KEEP_A": to_move.append(item['file_b']); kept.append(item['file_a'])
+            elif d == "KEEP_B": to_move.append(item['file_a']); kept.append(item['file_b'])
             elif d == "DISCARD_BOTH": to_move.extend([item['file_a'], item['file_b']])
+            elif d == "KEEP_ONE":
+                to_move.extend(p for p in item['files'] if p != item['keep'])
+                kept.append(item['keep'])
+            elif d == "DISCARD_ALL": to_move.extend(item['files'])
             
             for path in to_move:
+                # Stesso inode del file tenuto: spostarlo non libera spazio e spezza il link
+                if any(self._same_inode(path, k) for k in kept):
+                    skipped_links += 1
+                    continue
                 if os.path.exists(path):
                     try: 
                         # Logica di protezione sovrascrittura per nomi identici da cartelle diverse
@@ -820,7 +1274,18 @@ class MainWindow(QMainWindow):
                         shutil.move(path, final_dest)
                         count += 1
                     except: pass
-        QMessageBox.information(self, "Fine Lavoro", f"Operazione conclusa.\nSpostati {count} file in {dest_folder}")
+        msg = f"Operazione conclusa.\nSpostati {count} file in {dest_folder}"
+        if skipped_links:
+            msg += f"\nNon spostati {skipped_links} file con lo stesso inode del file tenuto (hardlink)"
+        QMessageBox.information(self, "Fine Lavoro", msg)
+
+    @staticmethod
+    def _same_inode(a, b):
+        # Blindatura: file spariti o non accessibili non sono considerati hardlink
+        try:
+            return os.path.samefile(a, b)
+        except OSError:
+            return False
 
     # --- UI UPDATES ---
 
@@ -841,10 +1306,11 @@ class MainWindow(QMainWindow):
             
             def info(p):
                 st = os.stat(p)
-                px = QPixmap(p)
+                # Dimensioni dall'header (in cache): nessuna decodifica dell'originale a ogni cambio card
+                w, h = cached_image_size(p)
                 exif = AnalyzerEngine.get_exif_data(p)
-                return {"name": os.path.basename(p), "w": px.width(), "h": px.height(), 
-                        "tot": px.width()*px.height(), "size": st.st_size, 
+                return {"name": os.path.basename(p), "w": w, "h": h, 
+                        "tot": w*h, "size": st.st_size, 
                         "h_size": f"{st.st_size/1024/1024:.2f} MB",
                         "date": exif.get('DateTime', 'N/D'), "mod": exif.get('Model', 'N/D')}
             
@@ -881,6 +1347,8 @@ class MainWindow(QMainWindow):
             s = self.video_settings
             txt = (f"Video: dur {s.get('duration_tol',0.02)*100:.1f}% • res {s.get('res_tol',0.05)*100:.1f}% "
                    f"• score {s.get('score_threshold',0.6)*100:.0f}% • workers {s.get('max_workers',4)} • "
+                   f"io {s.get('max_io_workers',4)} ({s.get('hash_algorithm','md5')}) • "
+                   f"phash {s.get('max_hash_workers',4)} proc • "
                    f"scene {s.get('scene_threshold',30)} • ham {s.get('match_hamming_thresh',10)} • "
                    f"match {s.get('match_ratio_thresh',0.6)*100:.0f}%")
             if hasattr(self, 'lbl_video_settings'):
@@ -889,6 +1357,8 @@ class MainWindow(QMainWindow):
             pass
 
 if __name__ == "__main__":
+    # Necessario per il pool di processi di Fase 2 negli eseguibili congelati (PyInstaller/Windows)
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
@@ -0,0 +1,213 @@
+"""orb_verifier.py
+
+Verifica ORB delle coppie "di confine" di Fase 2.
+
+Per le coppie con distanza pHash nella zona grigia configurata si confrontano i
+punti chiave ORB. I descrittori vengono calcolati una sola volta per immagine, su
+una decodifica ridotta in scala di grigi, e messi in cache a due livelli: LRU in
+memoria e colonna `orb` del catalogo SQLite, valida finché il file non cambia.
+Rilevatore ORB e matcher sono creati una volta e riutilizzati per tutte le coppie.
+
+`OrbLibraryIndex` usa gli stessi descrittori per la ricerca di ritagli e screenshot
+su tutta la libreria: un indice FLANN-LSH unico, interrogato una volta per immagine,
+al posto del confronto BFMatcher di ogni coppia (impraticabile su N² coppie).
+"""
+
+from __future__ import annotations
+
+from collections import Counter, OrderedDict
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from analyzer import AnalyzerEngine
+
+ORB_DECODE_SIZE = 512  # lato minimo della decodifica ridotta per i punti chiave
+DESCRIPTOR_BYTES = 32  # un descrittore ORB = 256 bit
+FLANN_INDEX_LSH = 6
+
+_PROCESS_ORB = {}  # rilevatore ORB per processo (worker del pool di Fase 2)
+
+
+def compute_descriptors(path: str, orb, decode_size: int = ORB_DECODE_SIZE) -> np.ndarray:
+    """Descrittori ORB di `path` su una decodifica ridotta in scala di grigi, orientata EXIF."""
+    with Image.open(path) as img:
+        gray = np.asarray(AnalyzerEngine.load_oriented_hash_image(img, path, min_side=decode_size))
+    # La decodifica ridotta può restare fino a 2x la dimensione richiesta: riportiamola al lato atteso
+    scale = decode_size / max(1, min(gray.shape[:2]))
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    _, des = orb.detectAndCompute(np.ascontiguousarray(gray), None)
+    if des is None:
+        des = np.empty((0, DESCRIPTOR_BYTES), dtype=np.uint8)
+    return des
+
+
+def orb_descriptors_chunk(paths, nfeatures: int = 500, decode_size: int = ORB_DECODE_SIZE):
+    """Worker per il ProcessPoolExecutor: (path, descrittori in bytes, errore) per ogni immagine."""
+    orb = _PROCESS_ORB.get(nfeatures)
+    if orb is None:
+        orb = _PROCESS_ORB[nfeatures] = cv2.ORB_create(nfeatures=nfeatures)
+    results = []
+    for path in paths:
+        try:
+            results.append((path, compute_descriptors(path, orb, decode_size).tobytes(), None))
+        except Exception as e:
+            results.append((path, None, str(e)))
+    return results
+
+
+def descriptors_from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, DESCRIPTOR_BYTES)
+
+
+class OrbVerifier:
+    """Calcola, memorizza e confronta i descrittori ORB; da usare da un solo thread."""
+
+    def __init__(self, catalog=None, nfeatures: int = 500, ratio: float = 0.75,
+                 min_matches: int = 25, min_fraction: float = 0.2, memory_items: int = 512, decode_size: int = ORB_DECODE_SIZE):
+        self.catalog = catalog
+        self.ratio = ratio
+        self.min_matches = min_matches
+        self.min_fraction = min_fraction
+        self.memory_items = memory_items
+        self.decode_size = decode_size
+        self._orb = cv2.ORB_create(nfeatures=nfeatures)
+        self._matcher = cv2.BFMatcher(cv2.NORM_HAMMING)
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.stats = {"computed": 0, "memory_hits": 0, "disk_hits": 0}
+
+    def _compute(self, path: str) -> np.ndarray:
+        des = compute_descriptors(path, self._orb, self.decode_size)
+        self.stats["computed"] += 1
+        return des
+
+    def descriptors(self, path: str) -> np.ndarray:
+        """Descrittori ORB di `path`: LRU in memoria -> catalogo su disco -> calcolo."""
+        des = self._memory.get(path)
+        if des is not None:
+            self._memory.move_to_end(path)
+            self.stats["memory_hits"] += 1
+            return des
+        cached = self.catalog.lookup(path) if self.catalog is not None else None
+        if cached and cached.get("orb") is not None:
+            des = descriptors_from_bytes(cached["orb"])
+            self.stats["disk_hits"] += 1
+        else:
+            des = self._compute(path)
+            if self.catalog is not None:
+                self.catalog.update(path, orb=des.tobytes())
+        self._memory[path] = des
+        if len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+        return des
+
+    def good_matches(self, path_a: str, path_b: str) -> Tuple[int, int]:
+        """(match che superano il ratio test di Lowe, descrittori dell'immagine più povera)."""
+        des_a, des_b = self.descriptors(path_a), self.descriptors(path_b)
+        if len(des_a) < 2 or len(des_b) < 2:
+            return 0, min(len(des_a), len(des_b))
+        good = 0
+        for pair in self._matcher.knnMatch(des_a, des_b, k=2):
+            if len(pair) == 2 and pair[0].distance < self.ratio * pair[1].distance:
+                good += 1
+        return good, min(len(des_a), len(des_b))
+
+    def verify(self, path_a: str, path_b: str) -> Optional[bool]:
+        """True/False se le immagini condividono abbastanza punti chiave (almeno `min_matches`
+        e almeno `min_fraction` dei descrittori dell'immagine più povera); None se ORB non può
+        decidere (immagini piatte, senza punti chiave) o se un file non è leggibile."""
+        try:
+            good, available = self.good_matches(path_a, path_b)
+        except (OSError, ValueError, cv2.error):
+            return None
+        if available < self.min_matches:
+            return None
+        return good >= self.min_matches and good >= self.min_fraction * available
+
+
+class OrbLibraryIndex:
+    """Indice FLANN-LSH sui descrittori ORB di tutte le immagini, con voto per immagine.
+
+    Ogni immagine interroga l'indice una sola volta: per ciascun suo descrittore si
+    prendono i `k` vicini più prossimi e ogni altra immagine con un vicino entro
+    `max_distance` bit riceve un voto (al più uno per descrittore). Come nel ratio test
+    di Lowe, il vicino deve essere anche più vicino di `ratio` volte il più lontano dei
+    `k`: i descrittori generici (bordi, testo, cielo) somigliano a tutta la libreria e
+    non votano. Sono candidate le coppie con almeno `min_votes` voti e almeno
+    `min_fraction` dei descrittori dell'immagine più povera: ritagli, screenshot, copie
+    ritoccate che il pHash non vede. Costo circa lineare nel numero di immagini.
+    """
+
+    def __init__(self, max_distance: int = 40, min_votes: int = 30, min_fraction: float = 0.15,
+                 ratio: float = 0.8, k: int = 8,
+                 features_per_image: Optional[int] = None, table_number: int = 6, key_size: int = 12,
+                 multi_probe_level: int = 1, checks: int = 64):
+        self.max_distance = max_distance
+        self.min_votes = min_votes
+        self.min_fraction = min_fraction
+        self.ratio = ratio
+        self.k = k
+        self.features_per_image = features_per_image
+        self._matcher = cv2.FlannBasedMatcher(
+            dict(algorithm=FLANN_INDEX_LSH, table_number=table_number, key_size=key_size,
+                 multi_probe_level=multi_probe_level),
+            dict(checks=checks))
+        self._keys: List[Hashable] = []
+        self._descriptors: List[np.ndarray] = []
+        self._trained = False
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: Hashable, descriptors: np.ndarray) -> None:
+        """Aggiunge un'immagine; quelle con meno di `min_votes` descrittori non possono raggiungere la soglia e sono escluse."""
+        if descriptors is None or len(descriptors) < self.min_votes:
+            return
+        # Limite opzionale per immagine (memoria ~32 byte per descrittore). I descrittori
+        # sono ordinati per livello della piramide: tagliarli penalizza i ritagli ingranditi
+        if self.features_per_image:
+            descriptors = descriptors[:self.features_per_image]
+        self._keys.append(key)
+        self._descriptors.append(np.ascontiguousarray(descriptors))
+        self._trained = False
+
+    def build(self) -> None:
+        self._matcher.clear()
+        if self._descriptors:
+            self._matcher.add(self._descriptors)
+            self._matcher.train()
+        self._trained = True
+
+    def votes(self, position: int) -> Dict[int, int]:
+        """Voti ricevuti dalle altre immagini (posizioni di inserimento) per l'immagine `position`."""
+        if not self._trained:
+            self.build()
+        counts: Counter = Counter()
+        for neighbours in self._matcher.knnMatch(self._descriptors[position], k=self.k):
+            others = [m for m in neighbours if m.imgIdx != position]
+            if not others:
+                continue
+            limit = min(self.max_distance, self.ratio * others[-1].distance)
+            counts.update({m.imgIdx for m in others if m.distance <= limit})
+        return counts
+
+    def candidate_pairs(self) -> Iterator[Tuple[Hashable, Hashable, int]]:
+        """Coppie (chiave_a, chiave_b, voti) sopra soglia, ciascuna una volta, in ordine di inserimento.
+
+        Il voto non è simmetrico (un ritaglio vota l'originale più di quanto l'originale
+        voti il ritaglio): si tiene il massimo delle due direzioni.
+        """
+        if len(self._keys) < 2:
+            return
+        best: Dict[Tuple[int, int], int] = {}
+        for i in range(len(self._keys)):
+            for j, count in self.votes(i).items():
+                needed = max(self.min_votes, self.min_fraction * min(len(self._descriptors[i]), len(self._descriptors[j])))
+                if count >= needed:
+                    pair = (min(i, j), max(i, j))
+                    best[pair] = max(best.get(pair, 0), count)
+        for (i, j), count in sorted(best.items()):
+            yield self._keys[i], self._keys[j], count
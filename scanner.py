@@ -0,0 +1,124 @@
+"""scanner.py
+
+Scansione in streaming della cartella di lavoro (Fase 1).
+
+Un thread produttore percorre l'albero con `os.scandir` e inserisce i file
+multimediali trovati, insieme al loro `stat`, in una coda limitata: chi consuma
+(l'hashing di Fase 1) può iniziare a lavorare sui primi file mentre la scoperta
+prosegue, cosa che sulle condivisioni di rete evita minuti di attesa a vuoto.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import threading
+from typing import Iterable, Iterator, NamedTuple
+
+
+class ScanEntry(NamedTuple):
+    path: str
+    stat: os.stat_result
+
+
+_DONE = object()
+
+
+class MediaScanner:
+    """Produttore `os.scandir` su thread dedicato con coda limitata.
+
+    Iterare lo scanner restituisce le `ScanEntry` in ordine di scoperta (stesso
+    ordine top-down di `os.walk`); `discovered` tiene il totale progressivo.
+    Un errore inatteso del produttore viene rilanciato nel consumatore a fine
+    coda; chi smette di consumare prima della fine deve chiamare `stop()`.
+    """
+
+    def __init__(self, root: str, extensions: Iterable[str], excluded_dirs: Iterable[str] = (),
+                 excluded_files: Iterable[str] = (), queue_size: int = 1024):
+        self.root = root
+        self.extensions = tuple(e.lower() for e in extensions)
+        self.excluded_dirs = set(excluded_dirs)
+        self.excluded_files = set(excluded_files)
+        self.discovered = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._produce, name="media-scanner", daemon=True)
+
+    def start(self) -> "MediaScanner":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Interrompe il produttore (es. analisi annullata) e svuota la coda."""
+        self._stop.set()
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def __iter__(self) -> Iterator[ScanEntry]:
+        while True:
+            item = self._queue.get()
+            if item is _DONE:
+                if self._error is not None:
+                    raise self._error
+                return
+            yield item
+
+    def _put(self, item) -> bool:
+        # Coda limitata: il produttore attende il consumatore ma resta interrompibile
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self) -> None:
+        try:
+            stack = [self.root]
+            while stack and not self._stop.is_set():
+                current = stack.pop()
+                subdirs = []
+                # Blindatura: cartelle non accessibili vengono saltate come in os.walk
+                try:
+                    with os.scandir(current) as it:
+                        for entry in it:
+                            try:
+                                if entry.is_dir(follow_symlinks=False):
+                                    if entry.name not in self.excluded_dirs:
+                                        subdirs.append(entry.path)
+                                    continue
+                                if entry.name in self.excluded_files:
+                                    continue
+                                if not entry.name.lower().endswith(self.extensions):
+                                    continue
+                                st = entry.stat()
+                                # Su Windows DirEntry.stat() non valorizza st_dev/st_ino: servono
+                                # per riconoscere hardlink e file con lo stesso inode
+                                if os.name == "nt" and not st.st_ino:
+                                    st = os.stat(entry.path)
+                            except OSError:
+                                continue
+                            self.discovered += 1
+                            if not self._put(ScanEntry(entry.path, st)):
+                                return
+                except OSError:
+                    continue
+                # Ordine top-down come os.walk: le sottocartelle vengono visitate nell'ordine trovato
+                stack.extend(reversed(subdirs))
+        except BaseException as e:
+            # Consegnato al consumatore insieme al sentinella
+            self._error = e
+        finally:
+            # Il sentinella viene sempre consegnato per sbloccare il consumatore
+            while True:
+                try:
+                    self._queue.put(_DONE, timeout=0.2)
+                    break
+                except queue.Full:
+                    if self._stop.is_set():
+                        self.stop()
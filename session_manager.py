@@ -6,6 +6,101 @@ class MediaPair:
         self.score = int(score)
         self.decision = "PENDING"
 
+class MediaGroup:
+    """Gruppo di immagini simili (componente connessa del grafo dei match) con decisione dell'utente.
+
+    Decisioni: KEEP_ONE (si tiene `keep`, le altre vengono spostate), DIFFERENT, DISCARD_ALL.
+    `path_a`/`path_b` espongono il file da tenere e il primo degli altri, così il
+    gruppo si usa dove è attesa una `MediaPair` (pannello tecnico, ordinamento).
+    """
+    def __init__(self, paths, score, keep=None):
+        self.paths = list(paths)
+        self.score = int(score)
+        self.decision = "PENDING"
+        self.keep = keep if keep in self.paths else self.paths[0]
+
+    @property
+    def path_a(self):
+        return self.keep
+
+    @property
+    def path_b(self):
+        return next(p for p in self.paths if p != self.keep)
+
+    def to_record(self):
+        """Record della sessione JSON (un solo record per l'intero gruppo)."""
+        return {"files": self.paths, "keep": self.keep, "score": self.score, "decision": self.decision}
+
+    @classmethod
+    def from_record(cls, item):
+        group = cls(item['files'], item['score'], keep=item.get('keep'))
+        group.decision = item['decision']
+        return group
+
+
+class UnionFind:
+    """Union-find con compressione dei cammini e unione per rango."""
+    def __init__(self):
+        self.parent = {}
+        self.rank = {}
+
+    def find(self, x):
+        parent = self.parent
+        if x not in parent:
+            parent[x] = x
+            self.rank[x] = 0
+            return x
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return ra
+        if self.rank[ra] < self.rank[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        if self.rank[ra] == self.rank[rb]:
+            self.rank[ra] += 1
+        return ra
+
+
+def group_matches(matches, order=None):
+    """Raggruppa i match (path_a, path_b, score) nelle componenti connesse.
+
+    Le componenti di due file restano `MediaPair`; quelle più grandi diventano un
+    unico `MediaGroup` con score pari alla distanza massima tra i suoi match.
+    `order` (path -> posizione) mantiene i file nell'ordine di scansione.
+    """
+    uf = UnionFind()
+    edges = []
+    for a, b, score in matches:
+        uf.union(a, b)
+        edges.append((a, b, score))
+    members = {}
+    worst = {}
+    for a, b, score in edges:
+        root = uf.find(a)
+        group = members.setdefault(root, {})
+        group[a] = None
+        group[b] = None
+        worst[root] = max(worst.get(root, score), score)
+    result = []
+    for root, group in members.items():
+        paths = list(group)
+        if order is not None:
+            paths.sort(key=lambda p: order.get(p, len(order)))
+        if len(paths) == 2:
+            result.append(MediaPair(paths[0], paths[1], worst[root]))
+        else:
+            result.append(MediaGroup(paths, worst[root]))
+    return result
+
+
 class SessionData:
     """Gestore centrale della sessione di analisi."""
     def __init__(self):
@@ -0,0 +1,216 @@
+"""Test della decodifica ridotta usata dagli hash percettivi (analyzer.py)"""
+
+import os
+import tempfile
+
+import imagehash
+import numpy as np
+from PIL import Image
+
+from analyzer import AnalyzerEngine, HashCascade, DIHEDRAL_VARIANTS
+
+
+def make_photo(width=2400, height=1800) -> Image.Image:
+    # Immagine strutturata (gradienti + forme) simile a una foto, con un po' di rumore
+    rng = np.random.default_rng(7)
+    y, x = np.mgrid[0:height, 0:width]
+    r = (np.sin(x / 180.0) * 80 + 120).astype(np.float32)
+    g = (y / height * 200 + 30).astype(np.float32)
+    b = ((x + y) % 600 / 600 * 255).astype(np.float32)
+    rgb = np.stack([r, g, b], axis=-1)
+    rgb[height // 4:height // 2, width // 3:width // 2] = (240, 40, 40)
+    rgb += rng.normal(0, 6, rgb.shape)
+    return Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8))
+
+
+def test_reduced_decode_keeps_phash_close():
+    photo = make_photo()
+    tmp = tempfile.mkdtemp()
+    for ext in ("jpg", "png"):
+        path = os.path.join(tmp, f"photo.{ext}")
+        photo.save(path)
+        with Image.open(path) as img:
+            full = imagehash.phash(img)
+        with Image.open(path) as img:
+            small = AnalyzerEngine.load_hash_image(img, path)
+            assert max(small.size) < max(photo.size)
+            assert (full - imagehash.phash(small)) <= 4
+        # il record del catalogo conserva le dimensioni originali
+        record = AnalyzerEngine.get_image_record(path)
+        assert (record["width"], record["height"]) == photo.size
+        os.remove(path)
+    os.rmdir(tmp)
+
+
+def test_cascade_counts_pruned_candidates():
+    cascade = HashCascade(phash_threshold=12, prefilter="dhash", prefilter_threshold=20, whash_band=3, whash_threshold=8)
+    base = {"dhash": 0, "phash": 0, "whash": 0}
+    # prefiltro: dHash troppo lontano
+    assert not cascade.accept(base, {"dhash": (1 << 21) - 1, "phash": 0, "whash": 0})
+    # coppia di confine (pHash 10) rifiutata dal wHash, poi accettata con wHash vicino
+    assert not cascade.accept(base, {"dhash": 0, "phash": (1 << 10) - 1, "whash": (1 << 9) - 1})
+    assert cascade.accept(base, {"dhash": 0, "phash": (1 << 10) - 1, "whash": 1})
+    # coppia sicura: il wHash non viene consultato
+    assert cascade.accept(base, {"dhash": 0, "phash": 1, "whash": (1 << 40) - 1})
+    assert cascade.stats == {"candidates": 4, "pruned_prefilter": 1, "pruned_whash": 1,
+                             "pruned_orb": 0, "accepted": 2}
+
+
+def test_cascade_prunes_index_pairs():
+    from hash_store import HashStore, build_index
+
+    def codes(phash, dhash):
+        return {"phash": phash, "dihedral": [phash] + [phash ^ (0xFFFF << (16 * (k % 4))) for k in range(1, 8)],
+                "ahash": 0, "dhash": dhash, "whash": 0}
+
+    store = HashStore(os.path.join(tempfile.mkdtemp(), "store"), create=True)
+    store.reserve(3)
+    store.put(0, "/foto/a.jpg", codes(0x0F0F0F0F0F0F0F0F, 1 << 40))
+    store.put(1, "/foto/b.jpg", codes(0x0F0F0F0F0F0F0F0E, (1 << 30) - 1))  # pHash vicino, struttura diversa
+    store.put(2, "/foto/c.jpg", codes(0x0F0F0F0F0F0F0F0C, (1 << 40) | 1))
+    cascade = HashCascade(phash_threshold=12, prefilter="dhash", prefilter_threshold=20)
+    candidates = build_index(store, "mih", dihedral=True).oriented_pairs(11)
+    # le tre coppie sono tutte entro soglia pHash: solo il prefiltro dHash le distingue
+    assert [(a, b) for a, b, _, _ in cascade.filter_pairs(store, candidates)] == [(0, 2)]
+    assert cascade.stats["candidates"] == 3
+    assert cascade.stats["pruned_prefilter"] == 2
+    store.close()
+
+
+def test_cascade_hashes_only_for_candidates():
+    from hash_store import HashStore, build_index
+    store = HashStore(os.path.join(tempfile.mkdtemp(), "store"), create=True)
+    store.reserve(4)
+    for i, h in enumerate((0x0F0F0F0F0F0F0F0F, 0x0F0F0F0F0F0F0F0E, 0xF0F0F0F0F0F0F0F0, 0x0F0F0F0F0F0F0F0F ^ 0x3FF)):
+        store.put(i, f"/foto/{i}.jpg", {"phash": h, "dihedral": [h] * 8})
+    calls = []
+
+    def loader(path, names):
+        calls.append((path, tuple(names)))
+        return {name: 1 for name in names}
+
+    cascade = HashCascade(phash_threshold=12, prefilter="dhash", whash_band=3, hash_loader=loader)
+    candidates = ((a, b, d, 0) for a, b, d in build_index(store, "mih").pairs(11))
+    assert [(a, b, d) for a, b, d, _ in cascade.filter_pairs(store, candidates)] == [(0, 1, 1), (0, 3, 10), (1, 3, 9)]
+    # l'immagine 2 non è in nessuna coppia: mai decodificata; il wHash solo per le coppie di confine
+    assert calls == [("/foto/0.jpg", ("dhash",)), ("/foto/1.jpg", ("dhash",)),
+                     ("/foto/0.jpg", ("whash",)), ("/foto/3.jpg", ("dhash", "whash")), ("/foto/1.jpg", ("whash",))]
+    assert cascade.hash_loads == 5 and store.codes(2).keys() == {"phash", "dihedral"}
+    # gli hash calcolati su richiesta coincidono con quelli della decodifica ridotta
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "photo.jpg")
+    make_photo(640, 480).save(path)
+    with Image.open(path) as img:
+        small = AnalyzerEngine.load_oriented_hash_image(img, path)
+    assert AnalyzerEngine.get_cascade_hashes(path) == {"ahash": str(imagehash.average_hash(small)),
+                                                       "dhash": str(imagehash.dhash(small)),
+                                                       "whash": str(imagehash.whash(small, image_scale=64))}
+    os.remove(path)
+    os.rmdir(tmp)
+    store.close()
+
+
+def test_dihedral_variants_and_exif_orientation():
+    photo = make_photo(640, 480)
+    variants = AnalyzerEngine.get_dihedral_phashes(photo)
+    assert variants[0] == str(imagehash.phash(photo))
+    # ogni variante coincide con il pHash dell'immagine trasformata davvero
+    for k, (name, *_) in enumerate(DIHEDRAL_VARIANTS[1:], start=1):
+        method = getattr(Image.Transpose, {"flip_h": "FLIP_LEFT_RIGHT", "flip_v": "FLIP_TOP_BOTTOM",
+                                           "rot180": "ROTATE_180", "rot90": "ROTATE_90",
+                                           "rot270": "ROTATE_270"}.get(name, name.upper()))
+        assert str(imagehash.phash(photo.transpose(method))) == variants[k], name
+    # JPEG "verticale" con Orientation=6: hash calcolato nell'orientamento visualizzato
+    tmp = tempfile.mkdtemp()
+    raw, upright = os.path.join(tmp, "raw.jpg"), os.path.join(tmp, "upright.jpg")
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    photo.save(raw, exif=exif)
+    photo.transpose(Image.Transpose.ROTATE_270).save(upright)
+    a, b = AnalyzerEngine.get_image_record(raw), AnalyzerEngine.get_image_record(upright)
+    assert (int(a["phash"], 16) ^ int(b["phash"], 16)).bit_count() <= 4
+    for path in (raw, upright):
+        os.remove(path)
+    os.rmdir(tmp)
+
+
+def test_dihedral_variant_applies_to_second_key():
+    from hash_index import make_index
+    photo = make_photo(640, 480)
+    upright = [int(h, 16) for h in AnalyzerEngine.get_dihedral_phashes(photo)]
+    rotated = [int(h, 16) for h in AnalyzerEngine.get_dihedral_phashes(photo.transpose(Image.Transpose.ROTATE_90))]
+    # stessa coppia nei due ordini di inserimento: la variante va sempre letta sulla seconda immagine
+    for first, second, expected in ((upright, rotated, "rot270"), (rotated, upright, "rot90")):
+        index = make_index("mih", dihedral=True)
+        index.add("a", first)
+        index.add("b", second)
+        [(a, b, dist, variant)] = list(index.oriented_pairs(11))
+        assert (a, b, DIHEDRAL_VARIANTS[variant][0]) == ("a", "b", expected)
+        assert (first[0] ^ second[variant]).bit_count() <= 4
+
+
+def make_edge_scene(seed, w=1200, h=900):
+    """Scena con molti spigoli (rettangoli casuali) per avere punti chiave ORB."""
+    from PIL import ImageDraw
+    rng = np.random.default_rng(seed)
+    photo = make_photo(w, h)
+    draw = ImageDraw.Draw(photo)
+    for _ in range(150):
+        x, y = rng.integers(0, w - 50), rng.integers(0, h - 50)
+        draw.rectangle([x, y, x + rng.integers(10, 60), y + rng.integers(10, 60)], fill=tuple(int(c) for c in rng.integers(0, 255, 3)))
+    return photo
+
+
+def test_orb_verifier_caches_descriptors():
+    from file_catalog import FileCatalog
+    from orb_verifier import OrbVerifier
+    photo = make_edge_scene(11)
+    tmp = tempfile.mkdtemp()
+    paths = [os.path.join(tmp, n) for n in ("a.jpg", "a_q40.jpg")]
+    photo.save(paths[0])
+    photo.save(paths[1], quality=40)
+    catalog = FileCatalog(":memory:")
+    verifier = OrbVerifier(catalog)
+    assert verifier.verify(paths[0], paths[1]) is True
+    assert verifier.verify(paths[1], paths[0]) is True
+    assert verifier.stats == {"computed": 2, "memory_hits": 2, "disk_hits": 0}
+    # nuova istanza: i descrittori arrivano dal catalogo senza ricalcolo
+    fresh = OrbVerifier(catalog)
+    assert fresh.verify(paths[0], paths[1]) is True
+    assert fresh.stats == {"computed": 0, "memory_hits": 0, "disk_hits": 2}
+    catalog.close()
+    for path in paths:
+        os.remove(path)
+    os.rmdir(tmp)
+
+
+def test_orb_library_index_finds_crops():
+    from orb_verifier import OrbLibraryIndex, orb_descriptors_chunk, descriptors_from_bytes
+    tmp = tempfile.mkdtemp()
+    paths = []
+    for seed in range(8):
+        paths.append(os.path.join(tmp, f"scene{seed}.jpg"))
+        make_edge_scene(100 + seed).save(paths[-1])
+    # ritaglio pesante della prima scena: il pHash non lo riconosce
+    paths.append(os.path.join(tmp, "crop.png"))
+    make_edge_scene(100).crop((300, 150, 1000, 650)).save(paths[-1])
+    index = OrbLibraryIndex()
+    for i, (path, data, error) in enumerate(orb_descriptors_chunk(paths)):
+        assert error is None
+        index.add(i, descriptors_from_bytes(data))
+    assert [(a, b) for a, b, _ in index.candidate_pairs()] == [(0, 8)]
+    for path in paths:
+        os.remove(path)
+    os.rmdir(tmp)
+
+
+if __name__ == '__main__':
+    test_reduced_decode_keeps_phash_close()
+    test_cascade_counts_pruned_candidates()
+    test_cascade_prunes_index_pairs()
+    test_cascade_hashes_only_for_candidates()
+    test_dihedral_variants_and_exif_orientation()
+    test_dihedral_variant_applies_to_second_key()
+    test_orb_verifier_caches_descriptors()
+    test_orb_library_index_finds_crops()
+    print('test OK')
@@ -0,0 +1,34 @@
+"""Test di base per il catalogo persistente in file_catalog.py"""
+
+import os
+import tempfile
+
+from file_catalog import FileCatalog
+
+
+def test_lookup_invalidated_when_file_changes():
+    folder = tempfile.mkdtemp()
+    media = os.path.join(folder, "foto.jpg")
+    with open(media, "wb") as f:
+        f.write(b"prima")
+    with FileCatalog(os.path.join(folder, "catalog.sqlite")) as catalog:
+        catalog.update(media, digest="abc", digest_algo="md5")
+        catalog.update(media, phash="ff00ff00ff00ff00")
+        row = catalog.lookup(media)
+        assert row["digest"] == "abc" and row["phash"] == "ff00ff00ff00ff00"
+
+        # dimensione diversa -> la riga non è più valida
+        with open(media, "wb") as f:
+            f.write(b"dopo la modifica")
+        assert catalog.lookup(media) is None
+        catalog.update(media, phash="0000000000000000")
+        assert catalog.lookup(media)["digest"] is None
+
+    # riapertura: i dati sono persistiti su disco
+    with FileCatalog(os.path.join(folder, "catalog.sqlite")) as catalog:
+        assert catalog.lookup(media)["phash"] == "0000000000000000"
+
+
+if __name__ == '__main__':
+    test_lookup_invalidated_when_file_changes()
+    print('test OK')
@@ -0,0 +1,81 @@
+"""Test di base per gli indici di Hamming in hash_index.py"""
+
+import random
+
+from hash_index import make_index, hamming_distance, estimate_recall
+
+
+def make_hashes(n=2000, seed=7):
+    rng = random.Random(seed)
+    data = [rng.getrandbits(64) for _ in range(n)]
+    # quasi-duplicati pianificati a distanza 1..11
+    for i in range(0, n, 10):
+        h = data[i]
+        for b in rng.sample(range(64), rng.randint(1, 11)):
+            h ^= 1 << b
+        data.append(h)
+    return data
+
+
+def test_indexes_match_brute_force():
+    data = make_hashes()
+    queries = data[::37]
+    for name in ("mih", "bktree", "numpy"):
+        index = make_index(name)
+        for i, h in enumerate(data):
+            index.add(i, h)
+        for q in queries:
+            expected = [(i, hamming_distance(q, h)) for i, h in enumerate(data) if hamming_distance(q, h) <= 11]
+            assert index.query(q, 11) == expected, name
+
+
+def test_blocked_pairs_match_index_pairs():
+    data = make_hashes(n=1500)
+    expected = sorted((i, j, hamming_distance(data[i], data[j]))
+                      for j in range(len(data)) for i in range(j) if hamming_distance(data[i], data[j]) <= 11)
+    for name in ("mih", "numpy"):
+        index = make_index(name)
+        if name == "numpy":
+            index.tile = 256  # più tile, compresi quelli sulla diagonale
+        for i, h in enumerate(data):
+            index.add(i, h)
+        assert sorted(index.pairs(11)) == expected, name
+
+
+def test_dihedral_index_finds_transformed_copies():
+    rng = random.Random(3)
+    # 8 "varianti" casuali per immagine; l'immagine 2 è la 0 vista nella variante 5 (rot270),
+    # la 4 è la 3 vista nella variante 6 (rot90): la variante restituita si applica sempre alla seconda
+    variants = [[rng.getrandbits(64) for _ in range(8)] for _ in range(200)]
+    variants[2][0] = variants[0][5] ^ 0b111
+    variants[4][6] = variants[3][0] ^ 0b11
+    for name in ("mih", "bktree", "numpy"):
+        index = make_index(name, dihedral=True)
+        for i, v in enumerate(variants):
+            index.add(i, v)
+        pairs = list(index.oriented_pairs(11))
+        assert [p for p in pairs if p[:2] == (0, 2)] == [(0, 2, 3, 6)], name
+        assert [p for p in pairs if p[:2] == (3, 4)] == [(3, 4, 2, 6)], name
+
+
+def test_lsh_recall_estimate():
+    data = make_hashes()
+    exact, lsh = make_index("linear"), make_index("lsh", bands=5, rows=12)
+    for i, h in enumerate(data):
+        exact.add(i, h)
+        lsh.add(i, h)
+    # con 5 bande nessun vicino entro distanza 4 viene perso (principio dei cassetti)
+    for q in data[::53]:
+        expected = [m for m in exact.query(q, 4)]
+        assert lsh.query(q, 4) == expected
+    assert estimate_recall(exact, 11)[0] == 1.0
+    recall, n_exact, n_found = estimate_recall(lsh, 11, sample=len(data))
+    assert 0.5 < recall <= 1.0 and n_found <= n_exact
+
+
+if __name__ == '__main__':
+    test_indexes_match_brute_force()
+    test_blocked_pairs_match_index_pairs()
+    test_dihedral_index_finds_transformed_copies()
+    test_lsh_recall_estimate()
+    print('test OK')
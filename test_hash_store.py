@@ -0,0 +1,112 @@
+"""Test dell'archivio hash mappato in memoria (hash_store.py)"""
+
+import os
+import random
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+from hash_index import make_index
+from hash_store import HashStore, build_index, store_engine, PATH_COL
+
+
+def codes_for(h):
+    return {"phash": h, "dihedral": [h] + [h ^ (0xFF << (8 * k)) for k in range(1, 8)],
+            "ahash": h ^ 1, "dhash": h ^ 2, "whash": h ^ 4}
+
+
+def test_store_roundtrip_and_index_on_mmap():
+    base = os.path.join(tempfile.mkdtemp(), "store")
+    store = HashStore(base, create=True)
+    store.reserve(4)
+    store.put(0, "/foto/a.jpg", codes_for(0x0F0F0F0F0F0F0F0F))
+    store.put(2, "/foto/è.jpg", codes_for(0x0F0F0F0F0F0F0F0E))  # vicino ad a
+    store.put(3, "/foto/c.jpg", codes_for(0xF0F0F0F0F0F0F0F0))
+    # lo slot 1 non è mai stato scritto (immagine non decodificabile)
+    assert store.compact() == 3
+    store.close()
+
+    store = HashStore.open(base)
+    assert len(store) == 3
+    assert [store.path(i) for i in range(3)] == ["/foto/a.jpg", "/foto/è.jpg", "/foto/c.jpg"]
+    assert store.codes(1) == codes_for(0x0F0F0F0F0F0F0F0E)
+    assert store_engine("bktree") == store_engine("linear") == "mih"
+    for engine in ("numpy", "mih", "bktree"):
+        pairs = list(build_index(store, engine, dihedral=True).oriented_pairs(11))
+        assert pairs == [(0, 1, 1, 0)], engine
+    store.close()
+
+
+def test_store_engines_match_python_indexes():
+    rng = random.Random(5)
+    rows = [[rng.getrandbits(64) for _ in range(8)] for _ in range(600)]
+    for i in range(0, 600, 9):
+        rows[i + 1][0] = rows[i][rng.randrange(8)] ^ 0b1011  # copia (anche ruotata) a distanza 3
+    store = HashStore(os.path.join(tempfile.mkdtemp(), "store"), create=True)
+    store.reserve(len(rows))
+    for i, row in enumerate(rows):
+        store.put(i, f"/foto/{i}.jpg", {"dihedral": row})
+    # 2 x 24 bit: bande larghe cercate per valori ordinati invece che con la tabella degli offset
+    for engine, options in (("mih", {}), ("lsh", {"bands": 5, "rows": 12}), ("lsh", {"bands": 2, "rows": 24})):
+        for dihedral in (False, True):
+            expected = make_index(engine, dihedral=dihedral, **options)
+            for i, row in enumerate(rows):
+                expected.add(i, row if dihedral else row[0])
+            index = build_index(store, engine, dihedral=dihedral, **options)
+            assert list(index.pairs(11)) == list(expected.pairs(11)), (engine, dihedral)
+    store.close()
+
+
+def test_dialog_settings_build_an_index():
+    from PySide6.QtWidgets import QApplication
+    from ui_components import VideoSettingsDialog
+    app = QApplication.instance() or QApplication([])
+    rows = [[(0x0123456789ABCDEF * (i + 1)) & (1 << 64) - 1] * 8 for i in range(50)]
+    rows[1] = [rows[0][0] ^ (0b101 << 61)] * 8  # stessa prima banda per ogni configurazione LSH
+    store = HashStore(os.path.join(tempfile.mkdtemp(), "store"), create=True)
+    store.reserve(len(rows))
+    for i, row in enumerate(rows):
+        store.put(i, f"/foto/{i}.jpg", {"dihedral": row})
+    dialog = VideoSettingsDialog()
+    for engine in [dialog.phash_engine_combo.itemText(k) for k in range(dialog.phash_engine_combo.count())]:
+        dialog.phash_engine_combo.setCurrentText(engine)
+        for bands in (1, 2, 3, 5, 8, 21, 64):
+            for lsh_rows in (1, 12, 17, 24, 32, 64):
+                dialog.lsh_bands_spin.setValue(bands)
+                dialog.lsh_rows_spin.setValue(lsh_rows)
+                settings = dialog.get_settings()
+                index = build_index(store, settings['phash_engine'], dihedral=settings['phash_dihedral'],
+                                    bands=settings['lsh_bands'], rows=settings['lsh_rows'])
+                pairs = list(index.oriented_pairs(11)) if settings['phash_dihedral'] else list(index.pairs(11))
+                assert pairs[0][:2] == (0, 1), (engine, bands, lsh_rows)
+    dialog.deleteLater()
+    store.close()
+
+
+def test_index_memory_on_large_store():
+    n = 200_000
+    store = HashStore(os.path.join(tempfile.mkdtemp(), "store"), create=True)
+    store.reserve(n)
+    store.records[:, :8] = np.random.default_rng(3).integers(0, 1 << 62, size=(n, 8), dtype=np.int64).view(np.uint64)
+    store.records[:, PATH_COL] = 1
+    tracemalloc.start()
+    try:
+        index = build_index(store, "mih", dihedral=True)
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # tabelle uint32 per 4 bande x 8 varianti: ~128 byte per immagine (le liste Python superavano 1 KB)
+    assert retained < 160 * n
+    assert peak < 320 * n
+    assert len(index) == n
+    del index
+    store.close()
+
+
+if __name__ == '__main__':
+    test_store_roundtrip_and_index_on_mmap()
+    test_store_engines_match_python_indexes()
+    test_dialog_settings_build_an_index()
+    test_index_memory_on_large_store()
+    print('test OK')
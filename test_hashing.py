@@ -0,0 +1,44 @@
+"""Test di base per il motore di hashing condiviso in hashing.py"""
+
+import hashlib
+import os
+import tempfile
+
+from hashing import HashEngine, hash_file, hash_head_tail, covers_whole_file
+
+
+def write_temp(data: bytes) -> str:
+    fd, path = tempfile.mkstemp()
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return path
+
+
+def test_hash_file_matches_hashlib():
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    path = write_temp(data)
+    try:
+        assert hash_file(path, "md5") == hashlib.md5(data).hexdigest()
+        assert hash_file(path, "blake2b", buffer_size=4096) == hashlib.blake2b(data).hexdigest()
+    finally:
+        os.remove(path)
+
+
+def test_engine_partial_and_missing_files():
+    small = write_temp(b"abc" * 100)
+    try:
+        # per i file piccoli l'hash parziale coincide con il digest completo
+        assert covers_whole_file(300)
+        assert hash_head_tail(small, 300) == hashlib.md5(b"abc" * 100).hexdigest()
+        with HashEngine(max_workers=2) as engine:
+            results = dict(engine.map_full([small, small + ".missing"]))
+        assert results[small] == hashlib.md5(b"abc" * 100).hexdigest()
+        assert results[small + ".missing"] is None
+    finally:
+        os.remove(small)
+
+
+if __name__ == '__main__':
+    test_hash_file_matches_hashlib()
+    test_engine_partial_and_missing_files()
+    print('test OK')
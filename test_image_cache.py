@@ -0,0 +1,93 @@
+"""Test della cache LRU delle immagini decodificate (image_cache.py) e dello zoom a finestre"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from image_cache import ImageCache, IMAGE_CACHE
+
+
+def test_lru_evicts_by_bytes_and_counts_hits():
+    tmp = tempfile.mkdtemp()
+    paths = []
+    for name in ("a.bin", "b.bin", "c.bin"):
+        paths.append(os.path.join(tmp, name))
+        with open(paths[-1], "wb") as f:
+            f.write(b"x")
+    loads = []
+
+    def loader(path):
+        loads.append(os.path.basename(path))
+        return np.zeros(400, dtype=np.uint8)
+
+    cache = ImageCache(max_bytes=1000)
+    cache.get(paths[0], "v", loader)
+    cache.get(paths[1], "v", loader)
+    cache.get(paths[0], "v", loader)          # hit: a diventa la più recente
+    cache.get(paths[2], "v", loader)          # 1200 byte > 1000: esce b
+    assert cache.bytes == 800 and len(cache) == 2
+    cache.get(paths[0], "v", loader)
+    cache.get(paths[1], "v", loader)          # b ricaricata
+    assert loads == ["a.bin", "b.bin", "c.bin", "b.bin"]
+    assert cache.stats == {"hits": 2, "misses": 4, "evictions": 2}
+    # varianti diverse dello stesso file sono voci distinte
+    cache.get(paths[0], "small", loader)
+    assert loads[-1] == "a.bin"
+    for path in paths:
+        os.remove(path)
+    os.rmdir(tmp)
+
+
+def test_changed_file_is_reloaded():
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "a.bin")
+    with open(path, "wb") as f:
+        f.write(b"x")
+    cache = ImageCache()
+    assert cache.get(path, "v", lambda p: np.ones(3)).sum() == 3
+    with open(path, "wb") as f:
+        f.write(b"xyz")                       # dimensione diversa: chiave diversa
+    assert cache.get(path, "v", lambda p: np.ones(5)).sum() == 5
+    assert cache.stats["misses"] == 2
+    # oggetti più grandi dell'intera cache non vengono memorizzati
+    cache.resize(10)
+    cache.get(path, "big", lambda p: np.ones(100))
+    assert cache.get(path, "big", lambda p: None) is None
+    os.remove(path)
+    os.rmdir(tmp)
+
+
+def test_zoom_uses_bounded_tiles():
+    from PIL import Image
+    from PySide6.QtGui import QGuiApplication
+    from ui_components import cached_zoom_tile, ZOOM_TILE
+    app = QGuiApplication.instance() or QGuiApplication([])
+    rng = np.random.default_rng(1)
+    pixels = rng.integers(0, 255, size=(3000, 5000, 3), dtype=np.uint8)
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "big.png")
+    Image.fromarray(pixels).save(path, compress_level=1)
+    IMAGE_CACHE.clear()
+    image, x0, y0 = cached_zoom_tile(path, 2600, 1700)
+    assert (image.width(), image.height()) == (ZOOM_TILE, 3000 - y0)
+    assert x0 <= 2600 and 2600 + 400 <= x0 + ZOOM_TILE and y0 <= 1700
+    # il pixel della finestra coincide con quello dell'originale
+    color = image.pixelColor(2600 - x0, 1700 - y0)
+    assert (color.red(), color.green(), color.blue()) == tuple(pixels[1700, 2600])
+    # pan di pochi pixel: stessa finestra, nessuna nuova decodifica
+    misses = IMAGE_CACHE.stats["misses"]
+    assert cached_zoom_tile(path, 2650, 1720)[1:] == (x0, y0)
+    assert IMAGE_CACHE.stats["misses"] == misses
+    # in cache solo la finestra (e la dimensione dall'header), mai l'originale intero
+    assert IMAGE_CACHE.bytes <= ZOOM_TILE * ZOOM_TILE * 4 + 1024
+    IMAGE_CACHE.clear()
+    os.remove(path)
+    os.rmdir(tmp)
+
+
+if __name__ == '__main__':
+    test_lru_evicts_by_bytes_and_counts_hits()
+    test_changed_file_is_reloaded()
+    test_zoom_uses_bounded_tiles()
+    print('test OK')
@@ -0,0 +1,48 @@
+"""Test della scansione in streaming di Fase 1 (scanner.py)"""
+
+import os
+import shutil
+import tempfile
+
+from scanner import MediaScanner
+
+
+def make_tree(n=50) -> str:
+    root = tempfile.mkdtemp()
+    os.makedirs(os.path.join(root, "sub"))
+    for i in range(n):
+        with open(os.path.join(root, "sub" if i % 2 else "", f"f{i}.jpg"), "wb") as f:
+            f.write(b"x" * i)
+    return root
+
+
+def test_stop_releases_blocked_producer():
+    root = make_tree()
+    scanner = MediaScanner(root, [".jpg"], queue_size=2).start()
+    next(iter(scanner))
+    # il consumatore smette (es. eccezione): il produttore sulla coda piena deve terminare
+    scanner.stop()
+    scanner._thread.join(timeout=5)
+    assert not scanner._thread.is_alive()
+    shutil.rmtree(root)
+
+
+def test_producer_error_reaches_consumer():
+    class BrokenScanner(MediaScanner):
+        def _put(self, item):
+            raise RuntimeError("disco scollegato")
+
+    root = make_tree(3)
+    try:
+        list(BrokenScanner(root, [".jpg"]).start())
+    except RuntimeError as e:
+        assert "disco scollegato" in str(e)
+    else:
+        raise AssertionError("errore del produttore non propagato")
+    shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    test_stop_releases_blocked_producer()
+    test_producer_error_reaches_consumer()
+    print('test OK')
@@ -0,0 +1,26 @@
+"""Test del raggruppamento union-find dei match (session_manager.py)"""
+
+from session_manager import MediaGroup, MediaPair, group_matches
+
+
+def test_group_matches_merges_connected_components():
+    # raffica a-b-c-d collegata a catena + una coppia isolata x-y
+    matches = [("b", "a", 1), ("c", "b", 3), ("d", "c", 2), ("y", "x", 5)]
+    order = {p: i for i, p in enumerate("abcdxy")}
+    items = group_matches(matches, order=order)
+    groups = [i for i in items if isinstance(i, MediaGroup)]
+    pairs = [i for i in items if isinstance(i, MediaPair)]
+    assert len(groups) == 1 and len(pairs) == 1
+    assert groups[0].paths == ["a", "b", "c", "d"] and groups[0].score == 3
+    assert (pairs[0].path_a, pairs[0].path_b, pairs[0].score) == ("x", "y", 5)
+    # il record di sessione conserva gruppo, file da tenere e decisione
+    groups[0].keep = "c"
+    groups[0].decision = "KEEP_ONE"
+    restored = MediaGroup.from_record(groups[0].to_record())
+    assert restored.paths == groups[0].paths and restored.keep == "c" and restored.decision == "KEEP_ONE"
+    assert restored.path_a == "c" and restored.path_b == "a"
+
+
+if __name__ == '__main__':
+    test_group_matches_merges_connected_components()
+    print('test OK')
@@ -1,6 +1,12 @@
 """Test di base per alcune utilità in video_analyzer.py"""
 
-from video_analyzer import average_hash, hamming_distance
+from video_analyzer import (average_hash, hamming_distance, VideoMeta, metadata_compatible, sweep_candidate_pairs,
+                            VideoAnalyzer, required_modes, HashProvider, is_exact_duplicate, identity_key,
+                            FrameReader, _get_frame_at_time, fingerprint_videos_chunk, unpack_fingerprint,
+                            _cache_path_for_file, KeyframeIndex, align_hash_sequences)
+import os
+import tempfile
+
 import numpy as np
 import cv2
 
@@ -18,10 +24,210 @@ def test_average_hash_and_hamming():
     h2 = average_hash(img2, hash_size=8)
     assert isinstance(h1, int)
     assert isinstance(h2, int)
-    # immagini molto diverse dovrebbero avere hamming > 0
-    assert hamming_distance(h1, h2) > 0
+    # l'aHash confronta ogni pixel con la media: immagini costanti hanno lo stesso hash a ogni luminosità
+    assert hamming_distance(h1, h2) == 0
+    # immagini con struttura opposta (gradiente e gradiente invertito) differiscono su tutti i bit
+    gradient = np.tile(np.arange(0, 256, 32, dtype=np.uint8), (8, 1))
+    h3 = average_hash(gradient, hash_size=8)
+    h4 = average_hash(255 - gradient, hash_size=8)
+    assert hamming_distance(h3, h4) == 64
+
+
+def test_sweep_matches_pairwise_screening():
+    rng = np.random.default_rng(3)
+    metas = [VideoMeta(f"v{i}.mp4", float(rng.choice([0.0, *rng.uniform(5, 120, 5)])), 25.0,
+                       int(rng.choice([0, 640, 1280, 1300])), 720) for i in range(60)]
+    for tol in (0.0, 0.02, 0.15):
+        expected = {frozenset((a.path, b.path)) for i, a in enumerate(metas) for b in metas[i + 1:]
+                    if metadata_compatible(a, b, tol, 0.05)}
+        found = [frozenset((a.path, b.path)) for a, b in sweep_candidate_pairs(metas, tol, 0.05)]
+        assert len(found) == len(set(found))
+        assert set(found) == expected
+
+
+def test_fingerprints_compare_without_decoding():
+    # vicino al cutoff servono entrambe le modalità (la coppia può cadere da una parte o dall'altra)
+    assert required_modes(30.0, 60.0, 0.1) == ["percent"]
+    assert required_modes(58.0, 60.0, 0.1) == ["percent", "variable"]
+    assert required_modes(90.0, 60.0, 0.1) == ["variable"]
+    va = VideoAnalyzer(match_hamming_thresh=4)
+    fa = {"duration": 30.0, "percent": [[5.0, 0b1111], [45.0, 0], [80.0, 0xFF]]}
+    fb = {"duration": 31.0, "percent": [[5.0, 0b1110], [45.0, 0xFFFF], [80.0, 0xFF]]}
+    res = va.compare_fingerprints(fa, fb, duration_cutoff=60.0, match_ratio_thresh=0.6)
+    assert (res["matched"], res["total"], res["result"]) == (2, 3, "similar")
+
+
+def test_hash_provider_avoids_full_reads():
+    tmp = tempfile.mkdtemp()
+    a, b, link = (os.path.join(tmp, n) for n in ("a.mp4", "b.mp4", "link.mp4"))
+    for path in (a, b):
+        with open(path, "wb") as f:
+            f.write(b"\0" * 1024)
+    os.link(a, link)
+    no_reads = HashProvider(allow_full_read=False)
+    assert is_exact_duplicate(a, link, no_reads)           # stesso inode
+    assert not is_exact_duplicate(a, b, no_reads)          # digest ignoti: nessuna lettura
+    assert is_exact_duplicate(a, b, HashProvider(known={a: "x", b: "x"}, allow_full_read=False))
+    assert is_exact_duplicate(a, b, HashProvider())        # lettura completa, una volta per file
+    key = identity_key(a)
+    with open(a, "ab") as f:
+        f.write(b"1")
+    assert identity_key(a) != key
+    for path in (a, b, link):
+        os.remove(path)
+    os.rmdir(tmp)
+
+
+def make_test_video(path, frames=120, fps=25.0, size=(96, 64), pattern=None):
+    # di default ogni fotogramma ha il proprio numero codificato nella luminosità delle bande
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    for i in range(frames):
+        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        if pattern is None:
+            img[:, : size[0] // 2] = (i * 2) % 256
+            img[:, size[0] // 2:] = 255 - (i * 2) % 256
+        else:
+            img[:] = pattern(i, size)[..., None]
+        writer.write(img)
+    writer.release()
+
+
+def test_frame_reader_matches_per_frame_access():
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "clip.avi")
+    make_test_video(path)
+    times = [0.0, 0.3, 0.32, 1.0, 4.5, 2.0, 2.0, 10.0]
+    with FrameReader(path, max_grab=25) as reader:
+        for t in times:
+            expected = _get_frame_at_time(path, t)
+            frame = reader.frame_at(t)
+            if expected is None:
+                assert frame is None
+            else:
+                assert np.array_equal(frame, expected), t
+        # avanti entro max_grab: grab; salto lungo o all'indietro: seek
+        assert reader.stats["seeks"] == 3
+        assert reader.stats["grabs"] > 0
+    os.remove(path)
+    os.rmdir(tmp)
+
+
+def shot_pattern(i, size):
+    # inquadratura A fino al fotogramma 36, poi B con un lampo di 10 fotogrammi (60-69)
+    w, h = size
+    if i < 37:
+        return np.full((h, w), 40, dtype=np.uint8)
+    if 60 <= i < 70:
+        return np.tile(np.linspace(0, 255, h, dtype=np.uint8)[:, None], (1, w))
+    return np.tile(np.linspace(255, 0, w, dtype=np.uint8)[None, :], (h, 1))
+
+
+def test_shot_boundaries_streaming():
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "shots.avi")
+    make_test_video(path, pattern=shot_pattern)
+    va = VideoAnalyzer(scene_threshold=30.0)
+    scan = va.detect_shot_boundaries(path, sample_step=4)
+    # tagli al primo campione di ogni inquadratura (campioni ogni 4 fotogrammi a 25 fps)
+    assert scan.boundaries == [40 / 25, 60 / 25, 72 / 25]
+    assert scan.frames_read == 30 and scan.realtime_factor > 1
+    # il campionamento a 1 secondo non vede il lampo
+    assert va.detect_scene_changes_simple(path) == [2.0]
+    # i selettori riusano i tagli: keyframe sul primo taglio dopo l'ancora
+    frames = va.find_variable_keyframes(path, [30], boundaries=scan.boundaries)
+    assert frames[30] == average_hash(_get_frame_at_time(path, 1.6))
+    os.remove(path)
+    os.rmdir(tmp)
+
+
+def test_process_worker_returns_compact_fingerprints():
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "clip.avi")
+    make_test_video(path, pattern=shot_pattern)
+    va = VideoAnalyzer(frame_hash_size=16)
+    config = {"scene_threshold": va.scene_threshold, "frame_hash_size": 16, "percents": [10, 50, 90]}
+    [(done, packed, error)] = fingerprint_videos_chunk([path], config)
+    assert done == path and error is None
+    assert len(packed["percent"][1]) == 3 * 32  # tre hash da 256 bit
+    fp = unpack_fingerprint(packed, va.fingerprint_params([10, 50, 90]))
+    assert fp == va.fingerprint(path, [10, 50, 90], use_cache=False)
+    # durata e keyframe di tutte le modalità da una sola apertura del file
+    opened = []
+    capture = cv2.VideoCapture
+    cv2.VideoCapture = lambda *args: opened.append(args[0]) or capture(*args)
+    try:
+        va.fingerprint(path, [10, 50, 90], modes=["percent", "variable"], use_cache=False, extra_modes=("dense",))
+    finally:
+        cv2.VideoCapture = capture
+    assert opened == [path]
+    os.remove(_cache_path_for_file(path))
+    os.remove(path)
+    os.rmdir(tmp)
+
+
+def test_keyframe_index_pairs_videos_sharing_shots():
+    rng = np.random.default_rng(5)
+    shots = [int(h) for h in rng.integers(0, 2 ** 63, 30, dtype=np.int64)]
+    flip = lambda h, bits: h ^ sum(1 << int(b) for b in bits)
+    index = KeyframeIndex(max_dist=10, min_shared=2)
+    index.add("orig", shots[:8])
+    # copia con intro nuova, finale tagliato e ricodifica (pochi bit diversi)
+    index.add("reedit", shots[20:23] + [flip(h, rng.choice(64, 4, replace=False)) for h in shots[2:6]])
+    index.add("other", shots[10:18])
+    # un solo keyframe in comune non basta; i fotogrammi uniformi non vengono indicizzati
+    assert index.add("one_shared", [shots[12], shots[25], 0, 2 ** 64 - 1]) == 2
+    # un video con una sola inquadratura non raggiunge min_shared, anche se quella coincide
+    index.add("single_shot", [shots[3]])
+    assert list(index.candidate_pairs()) == [("orig", "reedit", 4)]
+
+
+def test_alignment_finds_offset_and_scale():
+    rng = np.random.default_rng(9)
+    # 60 s di contenuto, un hash al secondo; inquadrature da 3 s (hash ripetuti)
+    shots = [int(h) for h in rng.integers(0, 2 ** 63, 20, dtype=np.int64)]
+    seq = [shots[t // 3] for t in range(60)]
+    times = np.arange(60.0)
+    # copia con 10 s di intro diversa e gli ultimi 15 s tagliati
+    intro = [int(h) for h in rng.integers(0, 2 ** 63, 10, dtype=np.int64)]
+    res = align_hash_sequences(times, seq, np.arange(55.0), intro + seq[:45])
+    assert (res["offset"], res["scale"], res["matched"]) == (10.0, 1.0, 45)
+    assert abs(res["overlap_ratio"] - 45 / 55) < 1e-9 and abs(res["score"] - 45 / 55) < 1e-9
+    # stessa copia accelerata 24 -> 25 fps: t_b = t_a * 24/25
+    res = align_hash_sequences(times, seq, times * 24 / 25, seq, scales=(1.0, 24 / 25))
+    assert res["scale"] == 24 / 25 and res["score"] == 1.0
+    # video diversi: nessun allineamento
+    assert align_hash_sequences(times, seq, times, intro * 6)["matched"] == 0
+
+
+def test_alignment_memory_on_static_footage():
+    import tracemalloc
+    rng = np.random.default_rng(4)
+    base = int(rng.integers(0, 2 ** 63))
+    times = np.arange(3600.0)
+    # un'ora di ripresa statica: hash identici, o con 1-2 bit di rumore per campione
+    static = [base] * 3600
+    noisy = [base ^ (1 << int(rng.integers(64))) ^ (1 << int(rng.integers(64))) for _ in range(3600)]
+    tracemalloc.start()
+    try:
+        res = align_hash_sequences(times, static, times + 5.0, static)
+        align_hash_sequences(times, noisy, times, noisy[::-1])
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert (res["score"], res["offset"]) == (1.0, 5.0)
+    # tutte le coppie entro soglia sarebbero 3600 x 3600: qui al più 32 per campione
+    assert peak < 64 * 1024 * 1024
 
 
 if __name__ == '__main__':
     test_average_hash_and_hamming()
+    test_sweep_matches_pairwise_screening()
+    test_fingerprints_compare_without_decoding()
+    test_hash_provider_avoids_full_reads()
+    test_frame_reader_matches_per_frame_access()
+    test_shot_boundaries_streaming()
+    test_process_worker_returns_compact_fingerprints()
+    test_keyframe_index_pairs_videos_sharing_shots()
+    test_alignment_finds_offset_and_scale()
+    test_alignment_memory_on_static_footage()
     print('test OK')
\ No newline at end of file
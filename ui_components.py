@@ -1,8 +1,92 @@
 import os
-from PySide6.QtWidgets import QFrame, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QMenu, QWidget, QMessageBox, QDialog, QFormLayout, QDoubleSpinBox, QSpinBox, QDialogButtonBox, QComboBox
-from PySide6.QtGui import QPixmap, QCursor, QAction, QImage, QPainter, QColor, QPen, QFont
+from PySide6.QtWidgets import QFrame, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QMenu, QWidget, QMessageBox, QDialog, QFormLayout, QDoubleSpinBox, QSpinBox, QDialogButtonBox, QComboBox, QScrollArea, QCheckBox
+from PySide6.QtGui import QPixmap, QCursor, QAction, QImage, QImageReader, QPainter, QColor, QPen, QFont
 from PySide6.QtCore import Qt, QRect, QPoint, QPointF, QSize
 
+from hash_index import MAX_BAND_BITS
+from hash_store import LEGACY_ENGINES, STORE_ENGINES
+from image_cache import IMAGE_CACHE
+
+PREVIEW_SIZE = 400     # lato delle anteprime nelle card (vista intera)
+DIFF_MAP_SIZE = 1024   # lato massimo delle immagini usate per la mappa differenze
+ZOOM_SIZE = 1200       # lato della decodifica ridotta per lo zoom 150% (2/3 dell'immagine su 400 px)
+ZOOM_TILE = 2048       # lato delle finestre a piena risoluzione per lo zoom 1:1 (16 MB in ARGB32)
+
+
+def cached_qimage(path, max_side=None):
+    """QImage di `path` dalla cache condivisa; `max_side=None` = risoluzione piena.
+
+    Con `max_side` il lettore decodifica già ridotto (per i JPEG direttamente nel
+    dominio DCT) invece di caricare l'originale e poi scalarlo. None se illeggibile.
+    """
+    def load(p):
+        reader = QImageReader(p)
+        if max_side:
+            size = reader.size()
+            if size.isValid() and max(size.width(), size.height()) > max_side:
+                reader.setScaledSize(size.scaled(max_side, max_side, Qt.KeepAspectRatio))
+        img = reader.read()
+        return None if img.isNull() else img
+    return IMAGE_CACHE.get(path, ("qimage", max_side), load)
+
+
+def cached_zoom_tile(path, x, y):
+    """Finestra a piena risoluzione per lo zoom 1:1 che contiene il riquadro 400x400 in (x, y).
+
+    Restituisce (QImage, x0, y0) con l'origine della finestra nell'immagine, o None se
+    illeggibile. Le finestre stanno su una griglia di passo ZOOM_TILE / 2: durante il pan la
+    stessa finestra serve tutti i riquadri che le cadono dentro, e in cache entra una finestra
+    da ZOOM_TILE px invece dell'originale (160 MB per una foto da 40 MP, due non starebbero
+    nella cache e verrebbero ridecodificate a ogni movimento del mouse).
+    """
+    src_w, src_h = cached_image_size(path)
+    if not src_w or not src_h:
+        return None
+    step = ZOOM_TILE // 2
+    x0 = max(0, min(x // step * step, src_w - ZOOM_TILE))
+    y0 = max(0, min(y // step * step, src_h - ZOOM_TILE))
+
+    def load(p):
+        reader = QImageReader(p)
+        reader.setClipRect(QRect(x0, y0, min(ZOOM_TILE, src_w - x0), min(ZOOM_TILE, src_h - y0)))
+        img = reader.read()
+        return None if img.isNull() else img
+    tile = IMAGE_CACHE.get(path, ("zoom_tile", ZOOM_TILE, x0, y0), load)
+    return None if tile is None else (tile, x0, y0)
+
+
+def cached_image_size(path):
+    """(larghezza, altezza) di `path` letti dall'header, senza decodificare i pixel."""
+    def load(p):
+        size = QImageReader(p).size()
+        return (size.width(), size.height()) if size.isValid() else (0, 0)
+    return IMAGE_CACHE.get(path, "size", load)
+
+
+def cached_bgr(path, max_side=DIFF_MAP_SIZE):
+    """Immagine BGR (OpenCV) ridotta a `max_side`, per la mappa differenze. None se illeggibile."""
+    import cv2
+    import numpy as np
+
+    def load(p):
+        flag = cv2.IMREAD_COLOR
+        w, h = cached_image_size(p)
+        # Decodifica ridotta di OpenCV quando l'originale è molto più grande del necessario
+        for factor, reduced in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2)):
+            if max(w, h) // factor >= max_side:
+                flag = reduced
+                break
+        # np.fromfile + imdecode: supporta anche i percorsi non ASCII su Windows
+        img = cv2.imdecode(np.fromfile(p, dtype=np.uint8), flag)
+        if img is None:
+            return None
+        scale = max_side / max(img.shape[:2])
+        if scale < 1.0:
+            img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return img
+    return IMAGE_CACHE.get(path, ("bgr", max_side), load)
+
+
 class ComparisonCard(QFrame):
     # --- MATTONCINO: Colori Decisioni ---
     DECISION_COLORS = {
@@ -236,29 +320,39 @@ class ComparisonCard(QFrame):
         if not os.path.exists(self.pair.path_a) or not os.path.exists(self.pair.path_b): return
             
         def render_canvas(path, mode):
-            pixmap = QPixmap(path)
-            src_w, src_h = pixmap.width(), pixmap.height()
-
             if mode <= 1.0:
-                return pixmap.scaled(400, 400, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-
-            cx = src_w / 2 + (self.norm_offset.x() * src_w)
-            cy = src_h / 2 + (self.norm_offset.y() * src_h)
+                preview = cached_qimage(path, PREVIEW_SIZE)
+                if preview is None: return QPixmap()
+                return QPixmap.fromImage(preview).scaled(400, 400, Qt.KeepAspectRatio, Qt.SmoothTransformation)
 
+            # Zoom e pan ridisegnano a ogni movimento del mouse: si disegna da decodifiche limitate in cache
+            # (ridotta per il 150%, finestre a piena risoluzione per l'1:1), mai dall'originale intero
             if mode == 1.5:
+                image = cached_qimage(path, ZOOM_SIZE)
+                if image is None: return QPixmap()
+                src_w, src_h = image.width(), image.height()
                 crop_w, crop_h = src_w / 1.5, src_h / 1.5
             else: # 1:1 Pixel Reali
+                src_w, src_h = cached_image_size(path)
                 crop_w, crop_h = 400, 400
 
+            cx = src_w / 2 + (self.norm_offset.x() * src_w)
+            cy = src_h / 2 + (self.norm_offset.y() * src_h)
+
             tx = max(0, min(int(cx - crop_w / 2), int(src_w - crop_w)))
             ty = max(0, min(int(cy - crop_h / 2), int(src_h - crop_h)))
+            if mode != 1.5:
+                tile = cached_zoom_tile(path, tx, ty)
+                if tile is None: return QPixmap()
+                image, x0, y0 = tile
+                tx, ty = tx - x0, ty - y0
             
             final_view = QPixmap(400, 400)
             final_view.fill(QColor("#1a1a1a"))
             
             painter = QPainter(final_view)
             painter.setRenderHint(QPainter.SmoothPixmapTransform)
-            painter.drawPixmap(QRect(0, 0, 400, 400), pixmap, QRect(tx, ty, int(crop_w), int(crop_h)))
+            painter.drawImage(QRect(0, 0, 400, 400), image, QRect(tx, ty, int(crop_w), int(crop_h)))
             painter.end()
             return final_view
 
@@ -323,8 +417,9 @@ class ComparisonCard(QFrame):
         import cv2
         self.is_diff_mode = True
         try:
-            img_a = cv2.imread(self.pair.path_a)
-            img_b = cv2.imread(self.pair.path_b)
+            # Immagini ridotte dalla cache condivisa: la mappa viene comunque mostrata a 400 px
+            img_a = cached_bgr(self.pair.path_a)
+            img_b = cached_bgr(self.pair.path_b)
             if img_a is None or img_b is None: 
                 print(f"[DIFF_MAP] Errore caricamento: img_a={img_a is not None}, img_b={img_b is not None}")
                 self.is_diff_mode = False
@@ -344,8 +439,8 @@ class ComparisonCard(QFrame):
             q_img = QImage(gray_data, gray.shape[1], gray.shape[0], gray.shape[1], QImage.Format_Grayscale8)
             pix = QPixmap.fromImage(q_img).scaled(400, 400, Qt.KeepAspectRatio, Qt.SmoothTransformation)
             
-            self.lbl_img_a.setPixmap(pix)
-            self.lbl_img_b.setPixmap(pix)
+            self.canvas_a.setPixmap(pix)
+            self.canvas_b.setPixmap(pix)
             self.lbl_score.setText("<b style='color:red;'>MAPPA DIFFERENZE</b>")
         except Exception as e:
             print(f"[DIFF_MAP] Errore: {str(e)}")
@@ -598,6 +693,174 @@ class VideoComparisonCard(QFrame):
         super().mousePressEvent(event)
 
 
+class GroupComparisonCard(QFrame):
+    """Scheda di revisione per un gruppo di immagini simili (componente del grafo dei match).
+
+    Miniature cliccabili (o tasti 1-9) per scegliere l'immagine da tenere; decisioni:
+    TIENI SELEZIONATA (KEEP_ONE), DIVERSE, ELIMINA TUTTE (DISCARD_ALL).
+    """
+    DECISION_COLORS = {
+        "PENDING":     ("#dcdcdc", "#ffffff", "#000000"),
+        "KEEP_ONE":    ("#2ecc71", "#e8f8f5", "#000000"),
+        "DIFFERENT":   ("#9b59b6", "#f5eef8", "#ffffff"),
+        "DISCARD_ALL": ("#e74c3c", "#fdedec", "#ffffff"),
+    }
+    THUMB_SIZE = 180
+
+    def __init__(self, media_group, index=0):
+        super().__init__()
+        self.pair = media_group  # stesso nome delle altre card: MainWindow usa card.pair
+        self.index = index + 1
+        self.is_active = False
+        self.setFocusPolicy(Qt.StrongFocus)
+
+        self.init_ui()
+        self.update_card_style()
+
+    def init_ui(self):
+        self.main_layout = QVBoxLayout(self)
+        self.main_layout.setContentsMargins(10, 10, 10, 10)
+        self.main_layout.setSpacing(10)
+
+        # --- Miniature in una striscia scorrevole orizzontalmente ---
+        strip = QWidget()
+        strip_layout = QHBoxLayout(strip)
+        strip_layout.setContentsMargins(0, 0, 0, 0)
+        self.thumb_buttons = []
+        for i, path in enumerate(self.pair.paths):
+            btn = QPushButton()
+            btn.setCursor(Qt.PointingHandCursor)
+            btn.setFixedSize(self.THUMB_SIZE + 12, self.THUMB_SIZE + 12)
+            btn.setIconSize(QSize(self.THUMB_SIZE, self.THUMB_SIZE))
+            btn.setToolTip(f"{i + 1}: {os.path.basename(path)}")
+            btn.clicked.connect(lambda checked=False, p=path: self.select_keep(p))
+            strip_layout.addWidget(btn)
+            self.thumb_buttons.append(btn)
+        strip_layout.addStretch()
+        self.scroll = QScrollArea()
+        self.scroll.setWidget(strip)
+        self.scroll.setWidgetResizable(True)
+        self.scroll.setFixedHeight(self.THUMB_SIZE + 40)
+        self.scroll.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.main_layout.addWidget(self.scroll)
+
+        # --- Barra Controlli ---
+        self.controls_layout = QHBoxLayout()
+        self.lbl_score = QLabel()
+        self.lbl_score.setStyleSheet("""
+            background-color: #2c3e50;
+            color: #f1c40f;
+            font-family: 'Segoe UI', sans-serif;
+            font-size: 15px;
+            font-weight: bold;
+            border-radius: 6px;
+            padding: 8px 15px;
+            border: 2px solid #34495e;
+        """)
+        self.controls_layout.addWidget(self.lbl_score)
+        self.controls_layout.addStretch()
+
+        self.btn_keep_one = QPushButton("TIENI SELEZIONATA")
+        self.btn_different = QPushButton("DIVERSE")
+        self.btn_discard = QPushButton("ELIMINA TUTTE")
+        for btn_id, btn in [("KEEP_ONE", self.btn_keep_one), ("DIFFERENT", self.btn_different), ("DISCARD_ALL", self.btn_discard)]:
+            btn.setCursor(Qt.PointingHandCursor)
+            btn.setMinimumHeight(40)
+            btn.setMinimumWidth(110)
+            btn.clicked.connect(lambda checked=False, d=btn_id: self.make_decision(d))
+            self.controls_layout.addWidget(btn)
+
+        self.main_layout.addLayout(self.controls_layout)
+        self.refresh_previews()
+
+    def refresh_previews(self):
+        for btn, path in zip(self.thumb_buttons, self.pair.paths):
+            if not os.path.exists(path): continue
+            # Stessa anteprima delle card a coppie: nessuna nuova decodifica dell'originale
+            preview = cached_qimage(path, PREVIEW_SIZE)
+            if preview is not None:
+                btn.setIcon(QPixmap.fromImage(preview).scaled(self.THUMB_SIZE, self.THUMB_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+
+    def update_card_style(self):
+        """Aggiorna l'estetica basata su decisione, focus e immagine selezionata."""
+        state = self.pair.decision
+        sat_color, past_color, text_color = self.DECISION_COLORS.get(state, self.DECISION_COLORS["PENDING"])
+        border_color = "#f1c40f" if self.is_active else sat_color
+        border_width = "5px" if self.is_active else "2px"
+        self.setStyleSheet(f"""
+            GroupComparisonCard {{
+                background-color: {past_color};
+                border: {border_width} solid {border_color};
+                border-radius: 12px;
+            }}
+            QPushButton {{
+                background-color: white; border: 1px solid #bdc3c7;
+                border-radius: 4px; padding: 5px 15px; font-weight: bold;
+            }}
+        """)
+        for key, btn in [("KEEP_ONE", self.btn_keep_one), ("DIFFERENT", self.btn_different), ("DISCARD_ALL", self.btn_discard)]:
+            if key == state:
+                btn.setStyleSheet(f"background-color: {sat_color}; color: {text_color}; border: 1px solid {sat_color};")
+            else:
+                btn.setStyleSheet("background-color: white; color: #2c3e50;")
+        for btn, path in zip(self.thumb_buttons, self.pair.paths):
+            if path == self.pair.keep:
+                btn.setStyleSheet("background-color: #1a1a1a; border: 4px solid #2ecc71; border-radius: 4px;")
+            else:
+                btn.setStyleSheet("background-color: #1a1a1a; border: 1px solid #7f8c8d; border-radius: 4px;")
+        self.lbl_score.setText(f" #{self.index}  |  GRUPPO: {len(self.pair.paths)} immagini  |  SCORE: {self.pair.score} ")
+
+    def select_keep(self, path):
+        self.pair.keep = path
+        self.update_card_style()
+        main_win = self.window()
+        if hasattr(main_win, 'set_active_card'): main_win.set_active_card(self)
+
+    def keyPressEvent(self, event):
+        """Scorciatoie: Selezione (1-9), Decisioni (A = tieni selezionata, D, E), Navigazione (Frecce)."""
+        key = event.key()
+        if Qt.Key_1 <= key <= Qt.Key_9:
+            pos = key - Qt.Key_1
+            if pos < len(self.pair.paths):
+                self.select_keep(self.pair.paths[pos])
+        elif key == Qt.Key_A:
+            self.make_decision("KEEP_ONE")
+        elif key == Qt.Key_D:
+            self.make_decision("DIFFERENT")
+        elif key == Qt.Key_E:
+            self.make_decision("DISCARD_ALL")
+        elif key in [Qt.Key_Left, Qt.Key_Right]:
+            main_win = self.window()
+            if main_win and hasattr(main_win, 'gallery_layout'):
+                layout = main_win.gallery_layout
+                new_idx = layout.indexOf(self) + (-1 if key == Qt.Key_Left else 1)
+                if 0 <= new_idx < layout.count():
+                    target_card = layout.itemAt(new_idx).widget()
+                    if target_card:
+                        target_card.setFocus()
+                        main_win.set_active_card(target_card)
+                        main_win.scroll.ensureWidgetVisible(target_card)
+            event.accept()
+        else:
+            super().keyPressEvent(event)
+
+    def make_decision(self, decision_type):
+        self.pair.decision = "PENDING" if self.pair.decision == decision_type else decision_type
+        self.update_card_style()
+        main_win = self.window()
+        if hasattr(main_win, 'refresh_global_stats'): main_win.refresh_global_stats()
+
+    def set_focus(self, active):
+        self.is_active = active
+        self.update_card_style()
+
+    def mousePressEvent(self, event):
+        self.setFocus()
+        main_win = self.window()
+        if hasattr(main_win, 'set_active_card'): main_win.set_active_card(self)
+        super().mousePressEvent(event)
+
+
 class VideoSettingsDialog(QDialog):
     """Dialog per modificare le soglie e parametri dell'analisi video."""
     
@@ -607,6 +870,27 @@ class VideoSettingsDialog(QDialog):
         'res_tol': 0.05,           # 5%
         'score_threshold': 0.6,    # 60%
         'max_workers': 4,
+        'max_io_workers': 4,
+        'hash_algorithm': 'md5',
+        'phash_engine': 'mih',
+        'max_hash_workers': 4,
+        'cascade_prefilter': 'dhash',
+        'cascade_prefilter_threshold': 20,
+        'cascade_whash_band': 3,
+        'cascade_whash_threshold': 12,
+        'phash_dihedral': True,
+        'lsh_bands': 5,
+        'lsh_rows': 12,
+        'orb_verify': False,
+        'orb_zone_min': 8,
+        'orb_zone_max': 11,
+        'orb_min_matches': 25,
+        'orb_crop_search': False,
+        'orb_crop_min_votes': 30,
+        'orb_crop_max_distance': 40,
+        'video_keyframe_index': False,
+        'video_index_min_shared': 2,
+        'video_alignment': False,
         'scene_threshold': 30,
         'match_hamming_thresh': 10,
         'match_ratio_thresh': 0.6  # 60%
@@ -649,6 +933,124 @@ class VideoSettingsDialog(QDialog):
         self.workers_spin.setValue(int(self.settings.get('max_workers', 4)))
         form.addRow("Max worker:", self.workers_spin)
 
+        # Max I/O workers (thread lettori per l'hashing di Fase 1)
+        self.io_workers_spin = QSpinBox()
+        self.io_workers_spin.setRange(1, 64)
+        self.io_workers_spin.setValue(int(self.settings.get('max_io_workers', self.DEFAULTS['max_io_workers'])))
+        form.addRow("Max worker I/O (hash):", self.io_workers_spin)
+
+        # Algoritmo di hash per i duplicati certi
+        self.hash_combo = QComboBox()
+        self.hash_combo.addItems(["md5", "blake2b"])
+        hash_init = self.settings.get('hash_algorithm', self.DEFAULTS['hash_algorithm'])
+        if hash_init in ["md5", "blake2b"]:
+            self.hash_combo.setCurrentText(hash_init)
+        form.addRow("Algoritmo hash (Fase 1):", self.hash_combo)
+
+        # Motore di ricerca coppie pHash (Fase 2)
+        self.phash_engine_combo = QComboBox()
+        self.phash_engine_combo.addItems(list(STORE_ENGINES))
+        engine_init = self.settings.get('phash_engine', self.DEFAULTS['phash_engine'])
+        engine_init = LEGACY_ENGINES.get(engine_init, engine_init)
+        if engine_init in STORE_ENGINES:
+            self.phash_engine_combo.setCurrentText(engine_init)
+        form.addRow("Motore pHash (Fase 2):", self.phash_engine_combo)
+
+        # Parametri della modalità approssimata LSH (bande x bit per banda <= 64, al più MAX_BAND_BITS bit per banda)
+        self.lsh_bands_spin = QSpinBox()
+        self.lsh_bands_spin.setRange(1, 64)
+        self.lsh_bands_spin.setValue(int(self.settings.get('lsh_bands', self.DEFAULTS['lsh_bands'])))
+        form.addRow("Bande LSH:", self.lsh_bands_spin)
+
+        self.lsh_rows_spin = QSpinBox()
+        self.lsh_rows_spin.setRange(1, MAX_BAND_BITS)
+        self.lsh_rows_spin.setValue(int(self.settings.get('lsh_rows', self.DEFAULTS['lsh_rows'])))
+        form.addRow("Bit per banda LSH:", self.lsh_rows_spin)
+
+        # Processi paralleli per decodifica + pHash (Fase 2)
+        self.hash_workers_spin = QSpinBox()
+        self.hash_workers_spin.setRange(1, 64)
+        self.hash_workers_spin.setValue(int(self.settings.get('max_hash_workers', self.DEFAULTS['max_hash_workers'])))
+        form.addRow("Processi pHash (Fase 2):", self.hash_workers_spin)
+
+        # Cascata hash (Fase 2): prefiltro economico e verifica wHash delle coppie di confine
+        self.prefilter_combo = QComboBox()
+        self.prefilter_combo.addItems(["dhash", "ahash", "none"])
+        prefilter_init = self.settings.get('cascade_prefilter', self.DEFAULTS['cascade_prefilter'])
+        if prefilter_init in ["dhash", "ahash", "none"]:
+            self.prefilter_combo.setCurrentText(prefilter_init)
+        form.addRow("Prefiltro cascata (Fase 2):", self.prefilter_combo)
+
+        self.prefilter_spin = QSpinBox()
+        self.prefilter_spin.setRange(0, 64)
+        self.prefilter_spin.setValue(int(self.settings.get('cascade_prefilter_threshold', self.DEFAULTS['cascade_prefilter_threshold'])))
+        form.addRow("Soglia prefiltro (bit):", self.prefilter_spin)
+
+        self.whash_band_spin = QSpinBox()
+        self.whash_band_spin.setRange(0, 64)
+        self.whash_band_spin.setValue(int(self.settings.get('cascade_whash_band', self.DEFAULTS['cascade_whash_band'])))
+        form.addRow("Fascia di confine wHash (bit):", self.whash_band_spin)
+
+        self.whash_spin = QSpinBox()
+        self.whash_spin.setRange(0, 64)
+        self.whash_spin.setValue(int(self.settings.get('cascade_whash_threshold', self.DEFAULTS['cascade_whash_threshold'])))
+        form.addRow("Soglia wHash (bit):", self.whash_spin)
+
+        # Indicizzazione delle varianti ruotate/ribaltate del pHash (Fase 2)
+        self.dihedral_check = QCheckBox("Trova copie ruotate o specchiate")
+        self.dihedral_check.setChecked(bool(self.settings.get('phash_dihedral', self.DEFAULTS['phash_dihedral'])))
+        form.addRow("Rotazioni (Fase 2):", self.dihedral_check)
+
+        # Verifica ORB delle coppie nella zona grigia di distanza pHash (Fase 2)
+        self.orb_check = QCheckBox("Verifica ORB delle coppie incerte")
+        self.orb_check.setChecked(bool(self.settings.get('orb_verify', self.DEFAULTS['orb_verify'])))
+        form.addRow("ORB (Fase 2):", self.orb_check)
+
+        self.orb_zone_min_spin = QSpinBox()
+        self.orb_zone_min_spin.setRange(0, 64)
+        self.orb_zone_min_spin.setValue(int(self.settings.get('orb_zone_min', self.DEFAULTS['orb_zone_min'])))
+        form.addRow("Zona grigia ORB da (bit):", self.orb_zone_min_spin)
+
+        self.orb_zone_max_spin = QSpinBox()
+        self.orb_zone_max_spin.setRange(0, 64)
+        self.orb_zone_max_spin.setValue(int(self.settings.get('orb_zone_max', self.DEFAULTS['orb_zone_max'])))
+        form.addRow("Zona grigia ORB a (bit):", self.orb_zone_max_spin)
+
+        self.orb_matches_spin = QSpinBox()
+        self.orb_matches_spin.setRange(1, 500)
+        self.orb_matches_spin.setValue(int(self.settings.get('orb_min_matches', self.DEFAULTS['orb_min_matches'])))
+        form.addRow("Match ORB minimi:", self.orb_matches_spin)
+
+        # Ricerca di ritagli/screenshot con l'indice ORB di libreria
+        self.orb_crop_check = QCheckBox("Cerca ritagli e screenshot (indice ORB)")
+        self.orb_crop_check.setChecked(bool(self.settings.get('orb_crop_search', self.DEFAULTS['orb_crop_search'])))
+        form.addRow("Ritagli (Fase 2):", self.orb_crop_check)
+
+        self.orb_crop_votes_spin = QSpinBox()
+        self.orb_crop_votes_spin.setRange(1, 500)
+        self.orb_crop_votes_spin.setValue(int(self.settings.get('orb_crop_min_votes', self.DEFAULTS['orb_crop_min_votes'])))
+        form.addRow("Voti ORB minimi (ritagli):", self.orb_crop_votes_spin)
+
+        self.orb_crop_distance_spin = QSpinBox()
+        self.orb_crop_distance_spin.setRange(1, 128)
+        self.orb_crop_distance_spin.setValue(int(self.settings.get('orb_crop_max_distance', self.DEFAULTS['orb_crop_max_distance'])))
+        form.addRow("Distanza descrittori ORB max (bit):", self.orb_crop_distance_spin)
+
+        # Indice dei keyframe di inquadratura: copie rimontate o accorciate (Fase 3)
+        self.keyframe_index_check = QCheckBox("Cerca video rimontati (indice keyframe)")
+        self.keyframe_index_check.setChecked(bool(self.settings.get('video_keyframe_index', self.DEFAULTS['video_keyframe_index'])))
+        form.addRow("Rimontaggi (Fase 3):", self.keyframe_index_check)
+
+        self.index_shared_spin = QSpinBox()
+        self.index_shared_spin.setRange(1, 50)
+        self.index_shared_spin.setValue(int(self.settings.get('video_index_min_shared', self.DEFAULTS['video_index_min_shared'])))
+        form.addRow("Inquadrature in comune min:", self.index_shared_spin)
+
+        # Allineamento temporale delle sequenze dense di hash (Fase 3)
+        self.alignment_check = QCheckBox("Allinea video con intro o tagli (offset/scala)")
+        self.alignment_check.setChecked(bool(self.settings.get('video_alignment', self.DEFAULTS['video_alignment'])))
+        form.addRow("Allineamento (Fase 3):", self.alignment_check)
+
         # Scene threshold
         self.scene_spin = QSpinBox()
         self.scene_spin.setRange(0, 255)
@@ -700,6 +1102,27 @@ class VideoSettingsDialog(QDialog):
         self.res_spin.setValue(self.DEFAULTS['res_tol'] * 100)
         self.score_spin.setValue(self.DEFAULTS['score_threshold'] * 100)
         self.workers_spin.setValue(self.DEFAULTS['max_workers'])
+        self.io_workers_spin.setValue(self.DEFAULTS['max_io_workers'])
+        self.hash_combo.setCurrentText(self.DEFAULTS['hash_algorithm'])
+        self.phash_engine_combo.setCurrentText(self.DEFAULTS['phash_engine'])
+        self.hash_workers_spin.setValue(self.DEFAULTS['max_hash_workers'])
+        self.prefilter_combo.setCurrentText(self.DEFAULTS['cascade_prefilter'])
+        self.prefilter_spin.setValue(self.DEFAULTS['cascade_prefilter_threshold'])
+        self.whash_band_spin.setValue(self.DEFAULTS['cascade_whash_band'])
+        self.whash_spin.setValue(self.DEFAULTS['cascade_whash_threshold'])
+        self.dihedral_check.setChecked(self.DEFAULTS['phash_dihedral'])
+        self.lsh_bands_spin.setValue(self.DEFAULTS['lsh_bands'])
+        self.lsh_rows_spin.setValue(self.DEFAULTS['lsh_rows'])
+        self.orb_check.setChecked(self.DEFAULTS['orb_verify'])
+        self.orb_zone_min_spin.setValue(self.DEFAULTS['orb_zone_min'])
+        self.orb_zone_max_spin.setValue(self.DEFAULTS['orb_zone_max'])
+        self.orb_matches_spin.setValue(self.DEFAULTS['orb_min_matches'])
+        self.orb_crop_check.setChecked(self.DEFAULTS['orb_crop_search'])
+        self.orb_crop_votes_spin.setValue(self.DEFAULTS['orb_crop_min_votes'])
+        self.orb_crop_distance_spin.setValue(self.DEFAULTS['orb_crop_max_distance'])
+        self.keyframe_index_check.setChecked(self.DEFAULTS['video_keyframe_index'])
+        self.index_shared_spin.setValue(self.DEFAULTS['video_index_min_shared'])
+        self.alignment_check.setChecked(self.DEFAULTS['video_alignment'])
         self.scene_spin.setValue(self.DEFAULTS['scene_threshold'])
         self.hamming_spin.setValue(self.DEFAULTS['match_hamming_thresh'])
         self.match_ratio_spin.setValue(self.DEFAULTS['match_ratio_thresh'] * 100)
@@ -710,6 +1133,27 @@ class VideoSettingsDialog(QDialog):
             'res_tol': max(0.0, min(1.0, self.res_spin.value() / 100.0)),
             'score_threshold': max(0.0, min(1.0, self.score_spin.value() / 100.0)),
             'max_workers': int(self.workers_spin.value()),
+            'max_io_workers': int(self.io_workers_spin.value()),
+            'hash_algorithm': self.hash_combo.currentText(),
+            'phash_engine': self.phash_engine_combo.currentText(),
+            'max_hash_workers': int(self.hash_workers_spin.value()),
+            'cascade_prefilter': self.prefilter_combo.currentText(),
+            'cascade_prefilter_threshold': int(self.prefilter_spin.value()),
+            'cascade_whash_band': int(self.whash_band_spin.value()),
+            'cascade_whash_threshold': int(self.whash_spin.value()),
+            'phash_dihedral': self.dihedral_check.isChecked(),
+            'lsh_bands': int(self.lsh_bands_spin.value()),
+            'lsh_rows': max(1, min(int(self.lsh_rows_spin.value()), 64 // int(self.lsh_bands_spin.value()), MAX_BAND_BITS)),
+            'orb_verify': self.orb_check.isChecked(),
+            'orb_zone_min': int(self.orb_zone_min_spin.value()),
+            'orb_zone_max': int(self.orb_zone_max_spin.value()),
+            'orb_min_matches': int(self.orb_matches_spin.value()),
+            'orb_crop_search': self.orb_crop_check.isChecked(),
+            'orb_crop_min_votes': int(self.orb_crop_votes_spin.value()),
+            'orb_crop_max_distance': int(self.orb_crop_distance_spin.value()),
+            'video_keyframe_index': self.keyframe_index_check.isChecked(),
+            'video_index_min_shared': int(self.index_shared_spin.value()),
+            'video_alignment': self.alignment_check.isChecked(),
             'scene_threshold': int(self.scene_spin.value()),
             'match_hamming_thresh': int(self.hamming_spin.value()),
             'match_ratio_thresh': max(0.0, min(1.0, self.match_ratio_spin.value() / 100.0))
@@ -3,9 +3,17 @@
 Analisi di duplicati e similitudini per file video.
 
 Funzionalità principali:
-- identificazione duplicati esatti via MD5 + size + estensione
-- estrazione keyframes percent-based e ricerca di cambi scena (semplice)
+- identificazione duplicati esatti via size + estensione + digest (da un `HashProvider` iniettabile)
+- estrazione keyframes percent-based e ricerca di cambi scena (semplice), con un solo
+  `FrameReader` (una sessione di decodifica) per video
+- rilevamento dei tagli in streaming (`detect_shot_boundaries`) su tutto il video in una passata
+- indice invertito degli hash dei keyframe di inquadratura (`KeyframeIndex`) per trovare
+  copie rimontate o accorciate indipendentemente dalla durata
+- sequenza densa di hash (uno ogni `dense_interval` secondi) e allineamento temporale
+  vettoriale con ricerca di offset e scala (`align_hash_sequences`)
 - hashing dei fotogrammi (aHash) e confronto via Hamming
+- impronta per video (`fingerprint`, in cache su disco) e confronto delle impronte;
+  `fingerprint_videos_chunk` è il worker per il calcolo su un pool di processi
 - pipeline `compare_videos` che restituisce score e dettagli
 
 Note: richiede OpenCV (cv2). ffprobe/ffmpeg opzionali ma utili per metadati più accurati.
@@ -15,10 +23,16 @@ from __future__ import annotations
 
 import os
 import math
+import bisect
 import json
 import hashlib
 import tempfile
-from typing import List, Tuple, Dict, Optional
+import threading
+import time
+from typing import Iterable, Iterator, List, NamedTuple, Tuple, Dict, Optional
+
+from hashing import hash_file, DEFAULT_BUFFER_SIZE
+from hash_index import MultiIndexHashTable, pack_hashes, popcount64, hamming_nearest_blocked
 
 # Lazy import di cv2 - evita errore al module load time
 cv2 = None
@@ -33,7 +47,9 @@ def _ensure_cv2():
             import numpy as np_module
             cv2 = cv2_module
             np = np_module
-            cv2.setLogLevel(0)  # Disabilita logging ffmpeg
+            # Disabilita logging ffmpeg (non tutte le build di OpenCV espongono setLogLevel)
+            if hasattr(cv2, "setLogLevel"):
+                cv2.setLogLevel(0)
             return True
         except ImportError as e:
             raise RuntimeError("OpenCV (cv2) è richiesto: pip install opencv-python") from e
@@ -43,22 +59,77 @@ CACHE_DIR = os.path.join(os.path.dirname(__file__), ".video_fingerprints")
 os.makedirs(CACHE_DIR, exist_ok=True)
 
 
-def compute_md5(path: str, block_size: int = 65536) -> str:
-    h = hashlib.md5()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(block_size), b""):
-            h.update(chunk)
-    return h.hexdigest()
+def compute_md5(path: str, block_size: int = DEFAULT_BUFFER_SIZE) -> str:
+    return hash_file(path, "md5", block_size)
+
+
+def identity_key(path: str) -> str:
+    """Chiave economica di un file: (dimensione, mtime, device, inode), senza leggerlo.
+
+    Cambia se il file viene riscritto; resta valida dopo una rinomina o uno
+    spostamento nello stesso volume.
+    """
+    st = os.stat(path)
+    return hashlib.md5(f"{st.st_size}:{st.st_mtime_ns}:{st.st_dev}:{st.st_ino}".encode("ascii")).hexdigest()
+
+
+class HashProvider:
+    """Fonte iniettabile dei digest usati da video_analyzer.
+
+    - `digest(path)`: digest del contenuto. Prima si cerca in `known` (es. i digest
+      completi della Fase 1); altrimenti, se `allow_full_read`, viene calcolato una
+      sola volta per file e memorizzato; se no, None.
+    - `cache_key(path)`: chiave della cache impronte, l'identità economica del file.
+
+    In Fase 3 si usa con `allow_full_read=False`: nessun video viene letto per intero.
+    """
+
+    def __init__(self, known: Optional[Dict[str, str]] = None, algorithm: str = "md5", allow_full_read: bool = True):
+        self.known = known if known is not None else {}
+        self.algorithm = algorithm
+        self.allow_full_read = allow_full_read
+        self._computed: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+
+    def digest(self, path: str) -> Optional[str]:
+        known = self.known.get(path)
+        if known is not None:
+            return known
+        if not self.allow_full_read:
+            return None
+        memo_key = (path, identity_key(path))
+        with self._lock:
+            cached = self._computed.get(memo_key)
+        if cached is None:
+            cached = hash_file(path, self.algorithm, DEFAULT_BUFFER_SIZE)
+            with self._lock:
+                self._computed[memo_key] = cached
+        return cached
+
+    def cache_key(self, path: str) -> str:
+        return identity_key(path)
 
 
-def is_exact_duplicate(a: str, b: str) -> bool:
+# Provider di default (analisi manuali dalla UI, CLI): digest calcolati al più una volta per file
+DEFAULT_HASH_PROVIDER = HashProvider()
+
+
+def is_exact_duplicate(a: str, b: str, hash_provider: Optional[HashProvider] = None) -> bool:
     if not os.path.exists(a) or not os.path.exists(b):
         return False
     if os.path.splitext(a)[1].lower() != os.path.splitext(b)[1].lower():
         return False
-    if os.path.getsize(a) != os.path.getsize(b):
+    st_a, st_b = os.stat(a), os.stat(b)
+    if st_a.st_size != st_b.st_size:
+        return False
+    # Stesso inode (hardlink): identici senza leggere nulla
+    if st_a.st_ino and (st_a.st_dev, st_a.st_ino) == (st_b.st_dev, st_b.st_ino):
+        return True
+    provider = hash_provider or DEFAULT_HASH_PROVIDER
+    digest_a, digest_b = provider.digest(a), provider.digest(b)
+    if digest_a is None or digest_b is None:
         return False
-    return compute_md5(a) == compute_md5(b)
+    return digest_a == digest_b
 
 
 def get_duration_and_fps(path: str) -> Tuple[float, float]:
@@ -88,35 +159,91 @@ def get_video_resolution(path: str) -> Tuple[int, int]:
         return 0, 0
 
 
+class VideoMeta(NamedTuple):
+    """Metadati di screening di un video, letti una sola volta per file."""
+    path: str
+    duration: float
+    fps: float
+    width: int
+    height: int
+
+
+def probe_video(path: str) -> VideoMeta:
+    """Durata, fps e risoluzione con una sola apertura del container."""
+    _ensure_cv2()
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Impossibile aprire il file video: {path}")
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0.0
+        w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0)
+        h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0)
+    finally:
+        cap.release()
+    duration = frame_count / fps if fps > 0 else 0.0
+    return VideoMeta(path, duration, fps, w, h)
+
+
+def resolution_compatible(a: VideoMeta, b: VideoMeta, res_tol: float = 0.05) -> bool:
+    """Differenza relativa su larghezza e altezza entro `res_tol`; permissivo se ignota."""
+    if a.width <= 0 or b.width <= 0:
+        return True
+    if abs(a.width - b.width) / max(a.width, b.width) > res_tol:
+        return False
+    if a.height > 0 and b.height > 0 and abs(a.height - b.height) / max(a.height, b.height) > res_tol:
+        return False
+    return True
+
+
+def metadata_compatible(a: VideoMeta, b: VideoMeta, duration_tol: float = 0.02, res_tol: float = 0.05) -> bool:
+    if a.duration <= 0 or b.duration <= 0:
+        return True  # non possiamo escludere - fallback permissivo
+    if abs(a.duration - b.duration) / max(a.duration, b.duration) > duration_tol:
+        return False
+    return resolution_compatible(a, b, res_tol)
+
+
 def is_candidate_pair(a: str, b: str, duration_tol: float = 0.02, res_tol: float = 0.05) -> bool:
     """Verifica rapidamente se due video sono candidati a confronto dettagliato.
 
     - duration_tol: tolleranza relativa (es. 0.02 = 2%)
     - res_tol: tolleranza relativa sulla dimensione (es. 0.05 = 5%)
+
+    Apre entrambi i file: per molti video usare `probe_video` + `sweep_candidate_pairs`.
     """
     try:
-        da, _ = get_duration_and_fps(a)
-        db, _ = get_duration_and_fps(b)
-        if da <= 0 or db <= 0:
-            return True  # non possiamo escludere - fallback permissivo
-        if abs(da - db) / max(da, db) > duration_tol:
-            return False
-
-        wa, ha = get_video_resolution(a)
-        wb, hb = get_video_resolution(b)
-        if wa <= 0 or wb <= 0:
-            return True
-        # confronto risoluzione: verifica differenza relativa su larghezza e altezza
-        if abs(wa - wb) / max(wa, wb) > res_tol:
-            return False
-        if abs(ha - hb) / max(ha, hb) > res_tol:
-            return False
-
-        return True
+        return metadata_compatible(probe_video(a), probe_video(b), duration_tol, res_tol)
     except Exception:
         return True
 
 
+def sweep_candidate_pairs(metas: Iterable[VideoMeta], duration_tol: float = 0.02,
+                          res_tol: float = 0.05) -> Iterator[Tuple[VideoMeta, VideoMeta]]:
+    """Coppie candidate con una finestra scorrevole sulle durate ordinate.
+
+    Con i video ordinati per durata, per ogni video basta avanzare finché la
+    differenza relativa resta entro `duration_tol`: si esaminano solo le coppie
+    vicine (O(N log N + candidati) invece di N²/2). La risoluzione si confronta sui
+    metadati già letti. Video con durata ignota restano candidati con tutti, come
+    in `is_candidate_pair`. Ogni coppia è restituita una volta, in ordine di durata.
+    """
+    metas = list(metas)
+    unknown = [m for m in metas if m.duration <= 0]
+    timed = sorted((m for m in metas if m.duration > 0), key=lambda m: m.duration)
+    for i, a in enumerate(timed):
+        for j in range(i + 1, len(timed)):
+            b = timed[j]
+            # durate crescenti: (db - da) / db cresce con b, oltre la tolleranza ci si ferma
+            if (b.duration - a.duration) / b.duration > duration_tol:
+                break
+            if resolution_compatible(a, b, res_tol):
+                yield a, b
+    for i, a in enumerate(unknown):
+        for b in unknown[i + 1:] + timed:
+            yield a, b
+
+
 def _get_frame_at_time(path: str, time_sec: float, prefer_bgr: bool = True) -> Optional[np.ndarray]:
     _ensure_cv2()
     cap = cv2.VideoCapture(path)
@@ -132,10 +259,179 @@ def _get_frame_at_time(path: str, time_sec: float, prefer_bgr: bool = True) -> O
     return frame if prefer_bgr else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
 
+class FrameReader:
+    """Lettura di più fotogrammi dello stesso video con una sola sessione `VideoCapture`.
+
+    `_get_frame_at_time` apre il container, fa seek (che riparte dal keyframe
+    precedente e decodifica fino al bersaglio) e chiude a ogni fotogramma. Qui il
+    file resta aperto: per timestamp crescenti vicini al punto corrente si avanza
+    con `grab()` (demux + decodifica senza conversione colore), e si fa seek solo
+    all'indietro o quando il salto supera `max_grab` fotogrammi, cioè quando
+    ripartire dal keyframe costa meno che decodificare tutto il tratto.
+    Pensato per richieste in ordine crescente; funziona anche fuori ordine, solo più lento.
+    """
+
+    # Distanza tipica tra keyframe (GOP) in secondi: oltre conviene il seek
+    DEFAULT_GOP_SEC = 2.0
+
+    def __init__(self, path: str, max_grab: Optional[int] = None):
+        _ensure_cv2()
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Impossibile aprire il video: {path}")
+        fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        # Stessa durata di get_duration_and_fps; fps di ripiego solo per convertire i tempi
+        self.duration = self.frame_count / fps if fps > 0 else 0.0
+        self.fps = fps or 25.0
+        self.max_grab = max_grab if max_grab is not None else int(round(self.fps * self.DEFAULT_GOP_SEC))
+        self._next = 0  # indice del fotogramma che il prossimo grab()/read() restituirà
+        self._last: Tuple[int, Optional[np.ndarray]] = (-1, None)
+        self.stats = {"reads": 0, "grabs": 0, "seeks": 0}
+
+    def frame_at(self, time_sec: float, prefer_bgr: bool = True) -> Optional[np.ndarray]:
+        """Fotogramma al tempo `time_sec` (stesso arrotondamento di `_get_frame_at_time`)."""
+        return self.frame_at_index(max(int(round(time_sec * self.fps)), 0), prefer_bgr)
+
+    def frame_at_index(self, index: int, prefer_bgr: bool = True) -> Optional[np.ndarray]:
+        if index == self._last[0]:
+            frame = self._last[1]
+        else:
+            frame = self._decode(index)
+            self._last = (index, frame)
+        if frame is None or prefer_bgr:
+            return frame
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    def _decode(self, index: int) -> Optional[np.ndarray]:
+        if index < self._next or index - self._next > self.max_grab:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            self.stats["seeks"] += 1
+            self._next = index
+        while self._next < index:
+            if not self.cap.grab():
+                # Blindatura: posizione ignota dopo un errore, il prossimo accesso rifà il seek
+                self._next = math.inf
+                return None
+            self._next += 1
+            self.stats["grabs"] += 1
+        ret, frame = self.cap.read()
+        self.stats["reads"] += 1
+        if not ret:
+            self._next = math.inf
+            return None
+        self._next = index + 1
+        return frame
+
+    def iter_frames(self, step: int = 1, start: int = 0) -> Iterator[Tuple[int, np.ndarray]]:
+        """Scorre il video in sequenza da `start` restituendo (indice, fotogramma BGR) ogni `step` fotogrammi.
+
+        I fotogrammi intermedi vengono solo `grab()`-ati: decodificati ma mai
+        convertiti né copiati in un array numpy.
+        """
+        step = max(1, int(step))
+        if start != self._next:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            self.stats["seeks"] += 1
+            self._next = start
+        index = start
+        while True:
+            if (index - start) % step == 0:
+                ret, frame = self.cap.read()
+                self.stats["reads"] += 1
+            else:
+                ret, frame = self.cap.grab(), None
+                self.stats["grabs"] += 1
+            if not ret:
+                self._next = math.inf
+                return
+            self._next = index + 1
+            if frame is not None:
+                self._last = (index, frame)
+                yield index, frame
+            index += 1
+
+    def close(self) -> None:
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def __enter__(self) -> "FrameReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class _PerFrameReader:
+    """Stessa interfaccia di `FrameReader` ma con `_get_frame_at_time` (apertura + seek per fotogramma).
+
+    Solo per `benchmark_frame_access`: riproduce il percorso di accesso precedente.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.duration, self.fps = get_duration_and_fps(path)
+        self.stats = {"reads": 0, "grabs": 0, "seeks": 0}
+
+    def frame_at(self, time_sec: float, prefer_bgr: bool = True) -> Optional[np.ndarray]:
+        self.stats["reads"] += 1
+        self.stats["seeks"] += 1
+        return _get_frame_at_time(self.path, time_sec, prefer_bgr)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "_PerFrameReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+class _BorrowedReader:
+    """Context manager che presta un lettore esistente senza chiuderlo all'uscita."""
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def __enter__(self):
+        return self.reader
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+class SceneScan(NamedTuple):
+    """Esito di `detect_shot_boundaries`: tagli (secondi) e costo della scansione."""
+    boundaries: List[float]
+    duration: float
+    seconds: float
+    frames_read: int
+
+    @property
+    def realtime_factor(self) -> float:
+        """Multiplo del tempo reale (durata del video / tempo di scansione)."""
+        return self.duration / self.seconds if self.seconds > 0 else 0.0
+
+
+def _shot_signature(frame: np.ndarray, size: int = 64) -> np.ndarray:
+    # Prima il ridimensionamento, poi la conversione: si converte solo la miniatura
+    small = cv2.resize(frame, (size, size), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+
+def _histogram(gray: np.ndarray, bins: int = 32) -> np.ndarray:
+    hist = np.bincount((gray >> (8 - int(math.log2(bins)))).ravel(), minlength=bins).astype(np.float32)
+    return hist / max(hist.sum(), 1.0)
+
+
 def average_hash(image: np.ndarray, hash_size: int = 8) -> int:
     # image expected BGR or grayscale
     if image is None:
         raise ValueError("Image is None")
+    _ensure_cv2()
     if image.ndim == 3:
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     else:
@@ -154,167 +450,604 @@ def hamming_distance(h1: int, h2: int) -> int:
     return (h1 ^ h2).bit_count()
 
 
-def _cache_path_for_file(path: str) -> str:
-    md5 = compute_md5(path)
-    return os.path.join(CACHE_DIR, f"{md5}.json")
+def _cache_path_for_file(path: str, key: Optional[str] = None) -> str:
+    # Chiave fornita dal chiamante (HashProvider.cache_key) o identità economica: mai un digest dell'intero file
+    return os.path.join(CACHE_DIR, f"{key or identity_key(path)}.json")
 
 
-def save_fingerprint_cache(path: str, data: Dict) -> None:
-    with open(_cache_path_for_file(path), "w", encoding="utf-8") as f:
+def save_fingerprint_cache(path: str, data: Dict, key: Optional[str] = None) -> None:
+    with open(_cache_path_for_file(path, key), "w", encoding="utf-8") as f:
         json.dump(data, f)
 
 
-def load_fingerprint_cache(path: str) -> Optional[Dict]:
-    p = _cache_path_for_file(path)
+def load_fingerprint_cache(path: str, key: Optional[str] = None) -> Optional[Dict]:
+    p = _cache_path_for_file(path, key)
     if os.path.exists(p):
         with open(p, "r", encoding="utf-8") as f:
             return json.load(f)
     return None
 
 
+# Versione del formato delle impronte: cambiarla invalida la cache su disco
+FINGERPRINT_VERSION = 2
+# Su richiesta, come [secondi, hash]: "shots" primo fotogramma e fotogramma di ogni taglio (per
+# `KeyframeIndex`), "dense" un fotogramma ogni `dense_interval` secondi (per `align_hash_sequences`)
+FINGERPRINT_MODES = ("percent", "variable", "shots", "dense")
+SEQUENTIAL_MODES = ("shots", "dense")
+# Hash con al più tanti bit a 1 (o a 0) vengono da fotogrammi quasi uniformi: neri, bianchi, dissolvenze
+UNIFORM_HASH_BITS = 4
+
+
+def fingerprint_mode(duration_a: float, duration_b: float, duration_cutoff: float = 60.0) -> str:
+    """Keyframe da confrontare per una coppia: a percentuale, o a cambio scena se un video supera il cutoff."""
+    return "variable" if max(duration_a, duration_b) > duration_cutoff else "percent"
+
+
+def required_modes(duration: float, duration_cutoff: float = 60.0, duration_tol: float = 0.0) -> List[str]:
+    """Modalità di keyframe che possono servire a un video di durata `duration`.
+
+    Vicino al cutoff un video può essere in coppia con uno più lungo o più corto
+    (entro `duration_tol`), quindi servono entrambe le modalità.
+    """
+    modes = []
+    if duration <= duration_cutoff:
+        modes.append("percent")
+    if duration > duration_cutoff * (1.0 - duration_tol):
+        modes.append("variable")
+    return modes
+
+
+def _hash_runs(hashes: np.ndarray, idx: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Tratti di campioni consecutivi con hash identico: (inizi, lunghezze) come posizioni in `idx`."""
+    values = hashes[idx]
+    new = np.ones(len(idx), dtype=bool)
+    new[1:] = (values[1:] != values[:-1]) | (np.diff(idx) != 1)
+    starts = np.nonzero(new)[0]
+    return starts, np.diff(np.append(starts, len(idx)))
+
+
+def align_hash_sequences(times_a, hashes_a, times_b, hashes_b, max_dist: int = 10, interval: float = 1.0,
+                         scales: Iterable[float] = (1.0, 24 / 25, 25 / 24), bits: int = 64,
+                         max_matches: int = 32) -> Dict:
+    """Allineamento temporale di due sequenze di hash: miglior offset e scala.
+
+    I campioni consecutivi con hash identico formano un tratto; ogni tratto di A si
+    accoppia ai `max_matches` tratti di B più vicini entro `max_dist` bit. Ogni coppia
+    di campioni vota l'offset `t_b - scala * t_a` a passi di `interval`; vince la
+    finestra di due passi con più voti. Scale di default: 1 e 24 <-> 25 fps.
+
+    Restituisce `score` (campioni allineati / sequenza più corta), `matched`, `total`,
+    `offset` (t_b = scale * t_a + offset), `scale` e `overlap_ratio`.
+    Gli hash quasi uniformi (neri, dissolvenze) non votano.
+    """
+    _ensure_cv2()
+    if bits > 64:
+        raise ValueError("L'allineamento richiede hash fino a 64 bit (frame_hash_size <= 8)")
+    ta, tb = np.asarray(times_a, dtype=np.float64), np.asarray(times_b, dtype=np.float64)
+    ha, hb = pack_hashes(hashes_a), pack_hashes(hashes_b)
+    best = {"score": 0.0, "matched": 0, "total": int(min(len(ta), len(tb))), "offset": 0.0, "scale": 1.0,
+            "overlap_ratio": 0.0}
+    if not len(ta) or not len(tb):
+        return best
+
+    def informative(h):
+        ones = popcount64(h).astype(np.int64)
+        return np.nonzero((ones > UNIFORM_HASH_BITS) & (ones < bits - UNIFORM_HASH_BITS))[0]
+
+    ia, ib = informative(ha), informative(hb)
+    if not len(ia) or not len(ib):
+        return best
+    starts_a, lengths_a = _hash_runs(ha, ia)
+    starts_b, lengths_b = _hash_runs(hb, ib)
+    ri, rj, _ = hamming_nearest_blocked(ha[ia[starts_a]], hb[ib[starts_b]], max_matches, max_dist)
+    if not len(ri):
+        return best
+    # Coppia di tratti -> coppie di campioni (inizio con inizio, fino al più corto dei due)
+    span = np.minimum(lengths_a[ri], lengths_b[rj])
+    step = np.arange(int(span.sum())) - np.repeat(np.cumsum(span) - span, span)
+    pi = ia[np.repeat(starts_a[ri], span) + step]
+    pj = ib[np.repeat(starts_b[rj], span) + step]
+    for scale in scales:
+        offsets = tb[pj] - scale * ta[pi]
+        bins = np.floor((offsets - offsets.min()) / interval).astype(np.int64)
+        votes = np.bincount(bins)
+        window = votes[:-1] + votes[1:] if len(votes) > 1 else votes
+        k = int(np.argmax(window))
+        sel = (bins == k) | (bins == k + 1)
+        # Un campione statico può coincidere con più campioni dell'altro video: si contano campioni distinti
+        matched = int(min(len(np.unique(pi[sel])), len(np.unique(pj[sel]))))
+        if matched > best["matched"]:
+            best.update(matched=matched, scale=float(scale), offset=float(np.median(offsets[sel])))
+    span_a = best["scale"] * (ta[-1] + interval)
+    span_b = tb[-1] + interval
+    overlap = min(best["offset"] + span_a, span_b) - max(best["offset"], 0.0)
+    best["overlap_ratio"] = float(max(0.0, overlap) / min(span_a, span_b))
+    best["score"] = min(1.0, best["matched"] / best["total"])
+    return best
+
+
 class VideoAnalyzer:
-    def __init__(self, scene_threshold: float = 30.0, frame_hash_size: int = 8, match_hamming_thresh: int = 10):
+    def __init__(self, scene_threshold: float = 30.0, frame_hash_size: int = 8, match_hamming_thresh: int = 10,
+                 hash_provider: Optional[HashProvider] = None, dense_interval: float = 1.0):
         self.scene_threshold = scene_threshold
         self.frame_hash_size = frame_hash_size
         self.match_hamming_thresh = match_hamming_thresh
+        self.hash_provider = hash_provider or DEFAULT_HASH_PROVIDER
+        self.dense_interval = dense_interval
 
-    def extract_percent_keyframes(self, path: str, percents: List[float] = [5, 20, 45, 65, 80]) -> Dict[float, int]:
-        _ensure_cv2()
+    def _open_reader(self, path: str, reader: Optional[FrameReader]):
+        # Lettore del chiamante (non va chiuso qui) oppure uno nuovo, chiuso all'uscita del `with`
+        return _BorrowedReader(reader) if reader is not None else FrameReader(path)
+
+    def extract_percent_keyframes(self, path: str, percents: List[float] = [5, 20, 45, 65, 80],
+                                  reader: Optional[FrameReader] = None) -> Dict[float, int]:
         """Estrae keyframes alle percentuali fornite e ritorna una mappa percent->hash
         Usa come fallback frame al tempo esatto della percentuale.
         """
-        duration, fps = get_duration_and_fps(path)
+        _ensure_cv2()
         result: Dict[float, int] = {}
-        for p in percents:
-            t = max(0.0, duration * (p / 100.0))
-            frame = _get_frame_at_time(path, t)
-            if frame is None:
-                continue
-            result[p] = average_hash(frame, self.frame_hash_size)
+        with self._open_reader(path, reader) as r:
+            # In ordine di tempo: il lettore avanza senza tornare indietro
+            for p in sorted(percents):
+                t = max(0.0, r.duration * (p / 100.0))
+                frame = r.frame_at(t)
+                if frame is None:
+                    continue
+                result[p] = average_hash(frame, self.frame_hash_size)
         return result
 
-    def detect_scene_changes_simple(self, path: str, sample_interval: float = 1.0) -> List[float]:
-        _ensure_cv2()
+    def detect_scene_changes_simple(self, path: str, sample_interval: float = 1.0,
+                                    reader: Optional[FrameReader] = None) -> List[float]:
         """Rileva cambi scena campionando ogni sample_interval secondi e misurando differenza media.
         Restituisce i timestamps dove la differenza supera scene_threshold.
         """
-        duration, fps = get_duration_and_fps(path)
-        times = [i * sample_interval for i in range(0, max(1, int(duration // sample_interval)) + 1)]
+        _ensure_cv2()
         prev_frame = None
         changes: List[float] = []
-        for t in times:
-            frame = _get_frame_at_time(path, t, prefer_bgr=False)
-            if frame is None:
-                continue
-            small = cv2.resize(frame, (64, 64), interpolation=cv2.INTER_AREA)
-            if prev_frame is not None:
-                diff = cv2.absdiff(small, prev_frame)
-                mean_diff = float(diff.mean())
-                if mean_diff >= self.scene_threshold:
-                    changes.append(t)
-            prev_frame = small
+        with self._open_reader(path, reader) as r:
+            times = [i * sample_interval for i in range(0, max(1, int(r.duration // sample_interval)) + 1)]
+            for t in times:
+                frame = r.frame_at(t, prefer_bgr=False)
+                if frame is None:
+                    continue
+                small = cv2.resize(frame, (64, 64), interpolation=cv2.INTER_AREA)
+                if prev_frame is not None:
+                    diff = cv2.absdiff(small, prev_frame)
+                    mean_diff = float(diff.mean())
+                    if mean_diff >= self.scene_threshold:
+                        changes.append(t)
+                prev_frame = small
         return changes
 
-    def find_variable_keyframes(self, path: str, percents: List[float] = [5, 20, 45, 65, 80], search_window_sec: float = 3.0, step_sec: float = 0.5) -> Dict[float, int]:
+    def detect_shot_boundaries(self, path: str, sample_step: Optional[int] = None, hist_threshold: Optional[float] = None,
+                               reader: Optional[FrameReader] = None) -> SceneScan:
+        """Tagli di inquadratura dell'intero video in una sola passata sequenziale.
+
+        A differenza di `detect_scene_changes_simple` (un seek per secondo) il video
+        viene decodificato in ordine: si analizza un fotogramma ogni `sample_step`
+        (di default ~6 al secondo) e gli altri sono solo `grab()`-ati. Il confronto
+        tra campioni consecutivi usa la differenza media delle miniature 64x64 in
+        scala di grigi (soglia `scene_threshold`) e, se `hist_threshold` è indicato,
+        anche la distanza tra istogrammi (variazione totale, 0..1), che coglie i tagli
+        tra inquadrature con luminosità media simile. Il taglio è datato al primo
+        campione della nuova inquadratura.
+
+        I tagli possono essere passati a `find_variable_keyframes(boundaries=...)`.
+        """
+        _ensure_cv2()
+        start = time.perf_counter()
+        boundaries: List[float] = []
+        frames_read = 0
+        with self._open_reader(path, reader) as r:
+            for index, _, cut in self._iter_shot_samples(r, sample_step, hist_threshold):
+                frames_read += 1
+                if cut:
+                    boundaries.append(index / r.fps)
+            duration = r.duration
+        return SceneScan(boundaries, duration, time.perf_counter() - start, frames_read)
+
+    def _iter_shot_samples(self, r: FrameReader, sample_step: Optional[int] = None,
+                           hist_threshold: Optional[float] = None) -> Iterator[Tuple[int, np.ndarray, bool]]:
+        """(indice, fotogramma, è_taglio) per ogni campione della scansione di `detect_shot_boundaries`."""
+        step = sample_step or max(1, int(round(r.fps / 6.0)))
+        prev_small = prev_hist = None
+        for index, frame in r.iter_frames(step):
+            small = _shot_signature(frame)
+            hist = _histogram(small) if hist_threshold is not None else None
+            cut = False
+            if prev_small is not None:
+                cut = float(cv2.absdiff(small, prev_small).mean()) >= self.scene_threshold
+                if not cut and hist is not None:
+                    cut = 0.5 * float(np.abs(hist - prev_hist).sum()) >= hist_threshold
+            yield index, frame, cut
+            prev_small, prev_hist = small, hist
+
+    def sequential_keyframes(self, path: str, sample_step: Optional[int] = None,
+                             reader: Optional[FrameReader] = None) -> Dict[str, List[Tuple[float, int]]]:
+        """Modalità `shots` e `dense` dell'impronta in una sola decodifica sequenziale.
+
+        `shots` è il primo fotogramma di ogni inquadratura (vedi `KeyframeIndex`); `dense`
+        prende il primo campione della scansione dei tagli a ogni multiplo di `dense_interval`
+        secondi: una sequenza regolare di hash per l'allineamento.
+        """
+        _ensure_cv2()
+        out: Dict[str, List[Tuple[float, int]]] = {"shots": [], "dense": []}
+        next_tick = 0.0
+        with self._open_reader(path, reader) as r:
+            for index, frame, cut in self._iter_shot_samples(r, sample_step):
+                t = index / r.fps
+                h = None
+                if cut or not out["shots"]:
+                    h = average_hash(frame, self.frame_hash_size)
+                    out["shots"].append((t, h))
+                if t + 1e-6 >= next_tick:
+                    out["dense"].append((t, h if h is not None else average_hash(frame, self.frame_hash_size)))
+                    while next_tick <= t + 1e-6:
+                        next_tick += self.dense_interval
+        return out
+
+    def find_variable_keyframes(self, path: str, percents: List[float] = [5, 20, 45, 65, 80], search_window_sec: float = 3.0,
+                                step_sec: float = 0.5, reader: Optional[FrameReader] = None,
+                                boundaries: Optional[List[float]] = None) -> Dict[float, int]:
         """Per ogni posizione percentuale cerca il primo cambiamento di scena all'interno di una finestra.
         Se non trova un cambio scena, usa il frame al tempo percentuale.
+
+        Con `boundaries` (da `detect_shot_boundaries`) il cambio scena è il primo taglio
+        già noto nella finestra, senza campionare la finestra.
         """
-        duration, fps = get_duration_and_fps(path)
+        _ensure_cv2()
         result: Dict[float, int] = {}
-        for p in percents:
-            anchor = max(0.0, duration * (p / 100.0))
-            end = min(duration, anchor + search_window_sec)
-            prev_frame = _get_frame_at_time(path, max(0.0, anchor - step_sec), anchor is not None)
-            found = False
-            t = anchor
-            while t <= end:
-                frame = _get_frame_at_time(path, t)
-                if frame is None:
-                    t += step_sec
+        with self._open_reader(path, reader) as r:
+            duration = r.duration
+            cuts = sorted(boundaries) if boundaries is not None else None
+            for p in sorted(percents):
+                anchor = max(0.0, duration * (p / 100.0))
+                end = min(duration, anchor + search_window_sec)
+                if cuts is not None:
+                    k = bisect.bisect_left(cuts, anchor)
+                    t = cuts[k] if k < len(cuts) and cuts[k] <= end else anchor
+                    frame = r.frame_at(t)
+                    if frame is None and t != anchor:
+                        frame = r.frame_at(anchor)
+                    if frame is not None:
+                        result[p] = average_hash(frame, self.frame_hash_size)
                     continue
-                # compare small grayscale difference
-                gcurr = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                gcurr_s = cv2.resize(gcurr, (64, 64), interpolation=cv2.INTER_AREA)
+                prev_frame = r.frame_at(max(0.0, anchor - step_sec))
+                gprev_s = None
                 if prev_frame is not None:
-                    gprev = cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY)
-                    gprev_s = cv2.resize(gprev, (64, 64), interpolation=cv2.INTER_AREA)
-                    diff = cv2.absdiff(gcurr_s, gprev_s)
-                    if float(diff.mean()) >= self.scene_threshold:
-                        # treat gcurr as keyframe
+                    gprev_s = cv2.resize(cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY), (64, 64), interpolation=cv2.INTER_AREA)
+                found = False
+                t = anchor
+                while t <= end:
+                    frame = r.frame_at(t)
+                    if frame is None:
+                        t += step_sec
+                        continue
+                    # compare small grayscale difference
+                    gcurr = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                    gcurr_s = cv2.resize(gcurr, (64, 64), interpolation=cv2.INTER_AREA)
+                    if gprev_s is not None:
+                        diff = cv2.absdiff(gcurr_s, gprev_s)
+                        if float(diff.mean()) >= self.scene_threshold:
+                            # treat gcurr as keyframe
+                            result[p] = average_hash(frame, self.frame_hash_size)
+                            found = True
+                            break
+                    gprev_s = gcurr_s
+                    t += step_sec
+                if not found:
+                    frame = r.frame_at(anchor)
+                    if frame is not None:
                         result[p] = average_hash(frame, self.frame_hash_size)
-                        found = True
-                        break
-                prev_frame = frame
-                t += step_sec
-            if not found:
-                frame = _get_frame_at_time(path, anchor)
-                if frame is not None:
-                    result[p] = average_hash(frame, self.frame_hash_size)
         return result
 
-    def compare_videos(self, a: str, b: str, percent_positions: List[float] = [5, 20, 45, 65, 80], duration_cutoff: float = 60.0, match_ratio_thresh: float = 0.6) -> Dict:
+    def fingerprint_params(self, percent_positions: List[float]) -> Dict:
+        return {"version": FINGERPRINT_VERSION, "percents": [float(p) for p in percent_positions],
+                "hash_size": self.frame_hash_size, "scene_threshold": float(self.scene_threshold),
+                "dense_interval": float(self.dense_interval)}
+
+    def fingerprint(self, path: str, percent_positions: List[float] = [5, 20, 45, 65, 80], duration_cutoff: float = 60.0,
+                    duration_tol: float = 0.0, modes: Optional[List[str]] = None, use_cache: bool = True,
+                    extra_modes: Iterable[str] = ()) -> Dict:
+        """Impronta di un video: durata + hash dei keyframe, calcolata una volta per tutte le coppie.
+
+        Modalità da `required_modes` (o `modes`), più `extra_modes` (`shots`, `dense`).
+        In cache con i parametri di estrazione: se cambiano viene ricalcolata.
+        """
+        _ensure_cv2()
+        params = self.fingerprint_params(percent_positions)
+        fp = None
+        key = self.hash_provider.cache_key(path) if use_cache else None
+        if use_cache:
+            try:
+                fp = load_fingerprint_cache(path, key)
+            except (OSError, ValueError):
+                fp = None
+        if not fp or fp.get("params") != params:
+            fp = {"params": params}
+        changed = False
+        # Un solo lettore per durata e modalità: il file viene aperto una volta, e solo se serve
+        reader = None
+        try:
+            if "duration" not in fp:
+                reader = FrameReader(path)
+                fp["duration"] = reader.duration
+                changed = True
+            wanted = list(modes if modes is not None else required_modes(fp["duration"], duration_cutoff, duration_tol))
+            missing = [m for m in dict.fromkeys(wanted + list(extra_modes)) if m not in fp]
+            if missing:
+                if reader is None:
+                    reader = FrameReader(path)
+                if any(m in SEQUENTIAL_MODES for m in missing):
+                    # Liste già in ordine di tempo (non indicizzate per percentuale), una sola passata
+                    sequences = self.sequential_keyframes(path, reader=reader)
+                for mode in missing:
+                    if mode in SEQUENTIAL_MODES:
+                        fp[mode] = [[float(t), h] for t, h in sequences[mode]]
+                        continue
+                    if mode == "variable":
+                        frames = self.find_variable_keyframes(path, percent_positions, reader=reader)
+                    else:
+                        frames = self.extract_percent_keyframes(path, percent_positions, reader=reader)
+                    # Lista [percentuale, hash]: le chiavi numeriche non sopravvivono al JSON
+                    fp[mode] = [[float(p), h] for p, h in sorted(frames.items())]
+                changed = True
+        finally:
+            if reader is not None:
+                reader.close()
+        if changed and use_cache:
+            # Blindatura: una cache non scrivibile non deve fermare l'analisi
+            try:
+                save_fingerprint_cache(path, fp, key)
+            except OSError:
+                pass
+        return fp
+
+    def compare_fingerprints(self, fa: Dict, fb: Dict, duration_cutoff: float = 60.0, match_ratio_thresh: float = 0.6) -> Dict:
+        """Confronta due impronte (solo vettori di hash, nessuna decodifica). Stesso formato di `compare_videos`."""
+        mode = fingerprint_mode(fa["duration"], fb["duration"], duration_cutoff)
+        if mode not in fa or mode not in fb:
+            raise ValueError(f"Impronta senza keyframe '{mode}'")
+        frames_a = {p: h for p, h in fa[mode]}
+        frames_b = {p: h for p, h in fb[mode]}
+        matched = 0
+        total = 0
+        details = []
+        for p in sorted(set(frames_a) & set(frames_b)):
+            total += 1
+            hd = hamming_distance(frames_a[p], frames_b[p])
+            matched_flag = hd <= self.match_hamming_thresh
+            details.append({"percent": p, "hamming": hd, "match": matched_flag})
+            if matched_flag:
+                matched += 1
+
+        score = (matched / total) if total > 0 else 0.0
+        result = "similar" if score >= match_ratio_thresh else "different"
+        return {"result": result, "score": score, "matched": matched, "total": total, "details": details}
+
+    def align_fingerprints(self, fa: Dict, fb: Dict, match_ratio_thresh: float = 0.6) -> Dict:
+        """Confronto con allineamento temporale delle sequenze `dense` (copie con intro, tagli, velocità diversa).
+
+        Come `compare_fingerprints` lavora solo sugli hash; in più restituisce
+        `offset`, `scale` e `overlap_ratio` (vedi `align_hash_sequences`).
+        """
+        if "dense" not in fa or "dense" not in fb:
+            raise ValueError("Impronta senza sequenza 'dense'")
+        res = align_hash_sequences([t for t, _ in fa["dense"]], [h for _, h in fa["dense"]],
+                                   [t for t, _ in fb["dense"]], [h for _, h in fb["dense"]],
+                                   max_dist=self.match_hamming_thresh, interval=self.dense_interval,
+                                   bits=self.frame_hash_size ** 2)
+        res["result"] = "similar" if res["score"] >= match_ratio_thresh else "different"
+        return res
+
+    def compare_videos(self, a: str, b: str, percent_positions: List[float] = [5, 20, 45, 65, 80], duration_cutoff: float = 60.0,
+                       match_ratio_thresh: float = 0.6, align: bool = False) -> Dict:
         _ensure_cv2()
         """Confronta due video. Restituisce un dict con esito, score e dettagli.
 
         Strategia:
-        - se duplicati esatti -> duplicato
+        - se duplicati esatti (stesso inode o stesso digest dal `hash_provider`) -> duplicato
         - altrimenti:
           - se entrambi <= duration_cutoff sec -> percent-based sampling
           - se uno o entrambi > duration_cutoff -> per ogni percent pos cerca primo cambio scena
         - confronta i frame hash per le posizioni corrispondenti e valuta percentuale di match
+
+        Con `align` le posizioni fisse sono sostituite, se non bastano, dall'allineamento
+        della sequenza densa (`align_fingerprints`): una copia con 10 secondi di intro in
+        più non ha fotogrammi alle stesse percentuali ma si allinea con un offset.
+
+        Le impronte passano dalla cache: per molti video conviene calcolare `fingerprint`
+        una volta per file e confrontarle con `compare_fingerprints` (vedi Fase 3).
         """
-        import os
-        
-        if is_exact_duplicate(a, b):
+        if is_exact_duplicate(a, b, self.hash_provider):
             return {"result": "duplicate", "score": 1.0, "details": "md5/size match"}
 
         duration_a, _ = get_duration_and_fps(a)
         duration_b, _ = get_duration_and_fps(b)
+        mode = fingerprint_mode(duration_a, duration_b, duration_cutoff)
+        extra = ["dense"] if align else []
+        fa = self.fingerprint(a, percent_positions, modes=[mode], extra_modes=extra)
+        fb = self.fingerprint(b, percent_positions, modes=[mode], extra_modes=extra)
+        res = self.compare_fingerprints(fa, fb, duration_cutoff, match_ratio_thresh)
+        if align and res["result"] != "similar":
+            aligned = self.align_fingerprints(fa, fb, match_ratio_thresh)
+            if aligned["score"] > res["score"]:
+                return aligned
+        return res
 
-        use_scene = (duration_a > duration_cutoff) or (duration_b > duration_cutoff)
-        
-        if use_scene:
-            fa = self.find_variable_keyframes(a, percent_positions)
-            fb = self.find_variable_keyframes(b, percent_positions)
-        else:
-            fa = self.extract_percent_keyframes(a, percent_positions)
-            fb = self.extract_percent_keyframes(b, percent_positions)
 
-        # compare hashes
-        matched = 0
-        total = 0
-        details = []
-        for p in sorted(set(list(fa.keys()) + list(fb.keys()))):
-            ha = fa.get(p)
-            hb = fb.get(p)
-            if ha is None or hb is None:
+class KeyframeIndex:
+    """Indice invertito degli hash dei keyframe: video candidati perché condividono inquadrature.
+
+    Ogni keyframe (tipicamente la modalità `shots` dell'impronta) entra in una
+    `MultiIndexHashTable` a blocchi da 16 bit: per il principio dei cassetti ogni
+    hash entro `max_dist` bit condivide almeno un blocco a distanza
+    <= max_dist // 4, quindi la ricerca è esatta e tocca solo i bucket vicini.
+    Due video sono candidati se almeno `min_shared` keyframe di ciascuno hanno un
+    corrispondente nell'altro, a prescindere da durata e risoluzione: un video con
+    meno di `min_shared` keyframe informativi (es. un'unica inquadratura) non viene
+    mai accoppiato, un solo fotogramma simile non basta. I fotogrammi quasi uniformi
+    (neri, bianchi, dissolvenze) non vengono indicizzati: coinciderebbero tra video qualsiasi.
+    I candidati vanno confermati con `align_hash_sequences` (vedi `VideoAnalyzer.align_fingerprints`).
+    """
+
+    def __init__(self, max_dist: int = 10, min_shared: int = 2, bits: int = 64):
+        self.max_dist = max_dist
+        self.min_shared = min_shared
+        self.bits = bits
+        self.keys: List = []
+        self.counts: List[int] = []
+        self._table = MultiIndexHashTable(bits=bits)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def informative(self, h: int) -> bool:
+        ones = int(h).bit_count()
+        return UNIFORM_HASH_BITS < ones < self.bits - UNIFORM_HASH_BITS
+
+    def add(self, key, hashes: Iterable[int]) -> int:
+        """Indicizza i keyframe di un video; restituisce quanti sono stati tenuti."""
+        vid = len(self.keys)
+        kept = 0
+        for h in hashes:
+            if self.informative(h):
+                self._table.add((vid, kept), int(h))
+                kept += 1
+        self.keys.append(key)
+        self.counts.append(kept)
+        return kept
+
+    def candidate_pairs(self) -> Iterator[Tuple[object, object, int]]:
+        """(key_a, key_b, keyframe condivisi) con key_a inserita prima di key_b."""
+        matched: Dict[Tuple[int, int], set] = {}
+        table = self._table
+        for (vid, frame), h in zip(table.keys, table.hashes):
+            for (other, _), _ in table.query(h, self.max_dist):
+                if other != vid:
+                    matched.setdefault((vid, other), set()).add(frame)
+        for (a, b), frames_a in sorted(matched.items()):
+            if a > b:
                 continue
-            total += 1
-            hd = hamming_distance(ha, hb)
-            matched_flag = hd <= self.match_hamming_thresh
-            details.append({"percent": p, "hamming": hd, "match": matched_flag})
-            if matched_flag:
-                matched += 1
+            shared = min(len(frames_a), len(matched.get((b, a), ())))
+            if shared >= self.min_shared:
+                yield self.keys[a], self.keys[b], shared
 
-        score = (matched / total) if total > 0 else 0.0
-        result = "similar" if score >= match_ratio_thresh else "different"
-        return {"result": result, "score": score, "matched": matched, "total": total, "details": details}
+
+def pack_fingerprint(fp: Dict, hash_size: int = 8) -> Dict:
+    """Forma compatta di un'impronta per il passaggio tra processi.
+
+    Per ogni modalità: percentuali in un array float32 e hash concatenati in un
+    unico `bytes` (hash_size^2 bit ciascuno) invece di liste di interi Python.
+    """
+    _ensure_cv2()
+    nbytes = (hash_size * hash_size + 7) // 8
+    packed = {"duration": float(fp["duration"])}
+    for mode in FINGERPRINT_MODES:
+        if mode in fp:
+            packed[mode] = (np.array([p for p, _ in fp[mode]], dtype=np.float32),
+                            b"".join(int(h).to_bytes(nbytes, "big") for _, h in fp[mode]))
+    return packed
+
+
+def unpack_fingerprint(packed: Dict, params: Dict) -> Dict:
+    """Inverso di `pack_fingerprint`: impronta nel formato di `fingerprint` (parametri dal chiamante)."""
+    nbytes = (params["hash_size"] * params["hash_size"] + 7) // 8
+    fp = {"params": params, "duration": packed["duration"]}
+    for mode in FINGERPRINT_MODES:
+        if mode in packed:
+            percents, hashes = packed[mode]
+            fp[mode] = [[float(p), int.from_bytes(hashes[i * nbytes:(i + 1) * nbytes], "big")]
+                        for i, p in enumerate(percents)]
+    return fp
+
+
+# Analizzatore per processo del pool di Fase 3, uno per configurazione
+_PROCESS_ANALYZERS: Dict[Tuple, "VideoAnalyzer"] = {}
+
+
+def fingerprint_videos_chunk(paths: List[str], config: Dict) -> List[Tuple[str, Optional[Dict], Optional[str]]]:
+    """Worker per il ProcessPoolExecutor: (path, impronta compatta, errore) per ogni video.
+
+    `config` contiene i parametri di `VideoAnalyzer` (scene_threshold, frame_hash_size, dense_interval)
+    e di `fingerprint` (percents, duration_cutoff, duration_tol, extra_modes); `cv_threads`, se
+    presente, limita i thread interni di OpenCV del processo, per non avere
+    processi x thread in competizione sugli stessi core. L'analizzatore resta vivo
+    nel processo tra un blocco e l'altro; la cache su disco è la stessa della Fase 3
+    (chiave = identità del file, nessuna lettura completa).
+    """
+    _ensure_cv2()
+    key = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in config.items()))
+    va = _PROCESS_ANALYZERS.get(key)
+    if va is None:
+        if config.get("cv_threads"):
+            cv2.setNumThreads(int(config["cv_threads"]))
+        va = _PROCESS_ANALYZERS[key] = VideoAnalyzer(
+            scene_threshold=config.get("scene_threshold", 30.0), frame_hash_size=config.get("frame_hash_size", 8),
+            hash_provider=HashProvider(allow_full_read=False), dense_interval=config.get("dense_interval", 1.0))
+    percents = config.get("percents", [5, 20, 45, 65, 80])
+    results = []
+    for path in paths:
+        try:
+            fp = va.fingerprint(path, percents, config.get("duration_cutoff", 60.0), config.get("duration_tol", 0.0),
+                                extra_modes=config.get("extra_modes", ()))
+            results.append((path, pack_fingerprint(fp, va.frame_hash_size), None))
+        except Exception as e:
+            results.append((path, None, str(e)))
+    return results
+
+
+def benchmark_frame_access(path: str, analyzer: Optional[VideoAnalyzer] = None,
+                           percents: List[float] = [5, 20, 45, 65, 80]) -> Dict[str, Dict]:
+    """Tempi dei selettori di keyframe con accesso per fotogramma (`_get_frame_at_time`) e con `FrameReader`.
+
+    Entrambe le varianti eseguono lo stesso codice (`extract_percent_keyframes`,
+    `find_variable_keyframes`, `detect_scene_changes_simple`): cambia solo il lettore.
+    Restituisce per ciascuna secondi, contatori del lettore e risultati (devono coincidere).
+    """
+    va = analyzer or VideoAnalyzer()
+    report: Dict[str, Dict] = {}
+    for name, factory in (("per_frame", _PerFrameReader), ("reader", FrameReader)):
+        start = time.perf_counter()
+        with factory(path) as reader:
+            results = {
+                "percent": va.extract_percent_keyframes(path, percents, reader=reader),
+                "variable": va.find_variable_keyframes(path, percents, reader=reader),
+                "scenes": va.detect_scene_changes_simple(path, reader=reader),
+            }
+            stats = dict(reader.stats)
+        report[name] = {"seconds": time.perf_counter() - start, "stats": stats, "results": results}
+    report["speedup"] = {"x": report["per_frame"]["seconds"] / max(report["reader"]["seconds"], 1e-9)}
+    return report
 
 
 if __name__ == '__main__':
     import argparse
 
     parser = argparse.ArgumentParser(description="VideoAnalyzer quick CLI")
-    parser.add_argument("action", choices=["compare", "rate"], help="action")
+    parser.add_argument("action", choices=["compare", "rate", "bench", "scenes"], help="action")
     parser.add_argument("a", help="video A")
     parser.add_argument("b", nargs="?", help="video B (for compare)")
+    parser.add_argument("--align", action="store_true", help="compare: allinea le sequenze dense (intro, tagli)")
     args = parser.parse_args()
 
     va = VideoAnalyzer()
     if args.action == "compare":
         if not args.b:
             parser.error("compare requires two videos")
-        res = va.compare_videos(args.a, args.b)
+        res = va.compare_videos(args.a, args.b, align=args.align)
         print(json.dumps(res, indent=2))
     elif args.action == "rate":
         print("Duration and fps for", args.a, get_duration_and_fps(args.a))
+    elif args.action == "bench":
+        report = benchmark_frame_access(args.a, va)
+        for name in ("per_frame", "reader"):
+            r = report[name]
+            print(f"{name:10s} {r['seconds']:.3f}s  {r['stats']}")
+        same = report["per_frame"]["results"] == report["reader"]["results"]
+        print(f"speedup x{report['speedup']['x']:.1f}  risultati identici: {same}")
+    elif args.action == "scenes":
+        scan = va.detect_shot_boundaries(args.a)
+        print(json.dumps({"boundaries": [round(t, 3) for t in scan.boundaries], "duration": scan.duration,
+                          "seconds": round(scan.seconds, 3), "frames_read": scan.frames_read,
+                          "realtime_x": round(scan.realtime_factor, 1)}, indent=2))